@@ -99,7 +99,8 @@ def resolve_request_body() -> None:
     ds = [request.args, request.form]
 
     body = request.get_json()
-    if body:
+    if body and isinstance(body, dict):
+        # Non-dict JSON bodies (e.g. JSON Patch) are handled by the view
         ds.append(MultiDict(body.items()))
 
     # Replace immutable Request.args with the combined args dict
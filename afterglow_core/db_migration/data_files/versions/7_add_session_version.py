@@ -0,0 +1,26 @@
+"""Add session version"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7'
+down_revision = '6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sessions', sa.Column(
+        'version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table(
+            'sessions',
+            table_args=(
+                sa.CheckConstraint('length(name) <= 80'),
+                sa.CheckConstraint('data is null or length(data) <= 1048576'),
+            ),
+            table_kwargs=dict(sqlite_autoincrement=True)) as batch_op:
+        batch_op.drop_column('version')
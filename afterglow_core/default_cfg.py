@@ -69,6 +69,26 @@ DATA_FILE_UPLOAD = False
 # https://docs.scipy.org/doc/numpy/reference/generated/numpy.histogram.html)
 HISTOGRAM_BINS = 1024
 
+# At-rest tile compression of data files, separately for integer and
+# floating-point images; values are dicts of astropy.io.fits.CompImageHDU
+# keyword arguments, e.g.
+#     DATA_FILE_COMPRESSION = {
+#         'int': {'compression_type': 'RICE_1'},
+#         'float': {'compression_type': 'GZIP_2', 'quantize_level': 0},
+#     }
+# for lossless compression or
+#         'float': {'compression_type': 'RICE_1', 'quantize_level': 16},
+# for quantized floating-point data; None or missing key = no compression
+DATA_FILE_COMPRESSION = None
+
+# Per-user overrides of DATA_FILE_COMPRESSION: {user_id: {...}, ...}
+DATA_FILE_COMPRESSION_PER_USER = {}
+
+# Number of blank FITS header cards reserved when saving a data file; header
+# updates (e.g. photometric calibration) that fit into the reserve rewrite only
+# the header instead of the whole file; 36 cards = one 2880-byte FITS block
+DATA_FILE_HEADER_RESERVE = 36
+
 
 ################################################################################
 # Catalog options
@@ -110,16 +130,167 @@ ANET_INDEX_PATH = []
 # Job server options
 ################################################################################
 
+# Transport used for the message exchange between Flask and job server:
+# "unix" = Unix domain socket accessible to the Afterglow user only, with binary
+# messages; "tcp" = localhost TCP socket with JSON messages; None = "unix" where
+# available, "tcp" on Windows
+JOB_SERVER_TRANSPORT = None
+
+# Job server Unix socket path; by default, the socket is created in a private
+# temporary directory
+JOB_SERVER_SOCKET = None
+
+# Maximum number of idle persistent job server connections kept open by each
+# Flask process; 0 = connect on every request
+JOB_SERVER_POOL_SIZE = 8
+
 # Use encryption (if available) in the message exchange between Flask and job
-# server
+# server; applies to TCP transport only
 JOB_SERVER_ENCRYPTION = True
 
+# (host, port) to accept connections from standalone job worker processes
+# started by scripts/start_job_worker.py on the same or other hosts, e.g.
+# ('0.0.0.0', 2718); remote workers must use the same configuration and have
+# access to DATA_ROOT and DATA_FILE_ROOT via a shared filesystem; remote workers
+# are added to the job pool in addition to JOB_POOL_MAX local workers; None =
+# local workers only
+JOB_SERVER_WORKER_ADDRESS = None
+
+# Shared secret used to authenticate remote job workers; must be set on both
+# sides if JOB_SERVER_WORKER_ADDRESS is set
+JOB_SERVER_WORKER_KEY = None
+
 # Initial job pool size
 JOB_POOL_MIN = 1
 
 # Maximum job pool size; 0 = no limit
 JOB_POOL_MAX = 16
 
+# Stop job worker processes that stayed idle for this number of seconds, while
+# keeping at least JOB_POOL_MIN workers; 0 = never
+JOB_POOL_IDLE_TIMEOUT = 600
+
+# Restart a job worker process after it has run this number of jobs; 0 = never
+JOB_WORKER_MAX_JOBS = 0
+
+# Restart a job worker process after a job if its resident memory size exceeds
+# this number of megabytes; 0 = no limit
+JOB_WORKER_MAX_RSS = 0
+
+# Modules imported by a job worker process before it starts accepting jobs
+JOB_WORKER_PRELOAD = [
+    'astropy.coordinates', 'astropy.io.fits', 'astropy.units', 'astropy.wcs',
+    'scipy.ndimage', 'scipy.spatial', 'skylib.extraction', 'skylib.photometry',
+]
+
 # Maximum RAM in megabytes allowed to be allocated by certain memory-intensive
 # jobs
 JOB_MAX_RAM = 100.0
+
+# Maximum address space in megabytes a job may allocate on top of that already
+# used by the job worker process; allocations beyond the limit fail, and the job
+# reports an error instead of exhausting the host memory; 0 = no limit; Unix only
+JOB_MAX_ADDRESS_SPACE = 0
+
+# Maximum CPU time in seconds a job may use in its worker process; 0 = no limit;
+# Unix only
+JOB_MAX_CPU_TIME = 0
+
+# Per-job type overrides of JOB_MAX_ADDRESS_SPACE and JOB_MAX_CPU_TIME, e.g.
+#     JOB_RESOURCE_LIMITS = {
+#         'pixel_ops': {'address_space': 4096, 'cpu_time': 600},
+#     }
+JOB_RESOURCE_LIMITS = {}
+
+# Call stack sampling interval in seconds of CPU time used when profiling jobs
+# submitted with profile=true (or all jobs if PROFILE is enabled); the samples
+# are saved in the "profile_stacks" job file for building flame graphs;
+# 0 = record the deterministic cProfile profile only; Unix only
+JOB_PROFILE_SAMPLING_INTERVAL = 0.01
+
+# Submitted jobs are dispatched to worker processes by priority class
+# ("interactive" for jobs processing at most one data file, "normal" for other
+# jobs, "batch" if requested by the client), then by weighted fair share between
+# users; relative user weights: {user_id: weight, ...}, default weight is 1
+JOB_USER_WEIGHTS = {}
+
+# Maximum number of simultaneously running jobs per user; 0 = no limit
+JOB_USER_MAX_RUNNING = 0
+
+# Maximum number of user's jobs waiting to be run; submitting more jobs fails
+# with HTTP 429 and the estimated time until the next user's job starts in
+# the Retry-After header; 0 = no limit
+JOB_USER_MAX_PENDING = 0
+
+# Maximum total number of jobs waiting to be run; submitting more jobs fails
+# with HTTP 503 and the estimated time until the next job starts in
+# the Retry-After header; 0 = no limit
+JOB_MAX_PENDING = 0
+
+# Allow jobs processing multiple data files (source extraction, photometry, WCS
+# calibration) to run per-file subtasks in parallel on idle worker processes
+JOB_SUBTASKS = True
+
+# Share image data loaded by a job with the other processes running the same
+# job (subtasks, subsequent pipeline stages) via POSIX shared memory instead of
+# reading the data file in each process; requires POSIX shared memory exposed
+# in /dev/shm (Linux); not supported by remote job workers
+JOB_SHARED_MEMORY = True
+
+# Free shared memory in megabytes (/dev/shm on Linux) left to the rest of
+# the system; jobs load images directly when sharing them would go below this
+JOB_SHARED_MEMORY_RESERVE = 1024
+
+# Minimum interval in seconds between intermediate job state/progress updates
+# sent by a running job; status changes and completion are always reported
+# immediately; 0 = no rate limiting
+JOB_UPDATE_INTERVAL = 1.0
+
+# Save the results of the completed per-file subtasks of a job, so that a job
+# interrupted by a job server restart skips the already processed files when
+# resumed
+JOB_CHECKPOINTS = True
+
+# Jobs persist across job server restarts; pending and interrupted jobs are
+# resumed on startup, and completed or canceled jobs older than this number of
+# seconds are periodically deleted along with their job files; 0 = keep forever
+JOB_RETENTION = 7*86400
+
+# Per-job type overrides of JOB_RETENTION, e.g.
+#     JOB_RETENTION_PER_TYPE = {'batch_download': 86400, 'pipeline': 0}
+JOB_RETENTION_PER_TYPE = {}
+
+# Maximum disk space in megabytes occupied by the job files of each user; when
+# exceeded, the oldest completed and canceled jobs of the user are deleted
+# along with their files; 0 = no limit
+JOB_FILE_QUOTA = 0
+
+# Per-user overrides of JOB_FILE_QUOTA: {user_id: quota, ...}
+JOB_FILE_QUOTA_PER_USER = {}
+
+# Interval in seconds between checks for expired jobs and job file quotas
+JOB_RETENTION_INTERVAL = 3600
+
+# Maximum number of jobs deleted in a single job db transaction; if there are
+# more jobs to delete, the next batch is deleted after a short pause
+JOB_RETENTION_BATCH_SIZE = 100
+
+# Maximum time in seconds a GET /jobs/state long polling request waits for job
+# state changes; also the keepalive interval of Server-Sent Events streams
+JOB_STATE_WATCH_TIMEOUT = 30
+
+# Maximum number of completed and running jobs remembered for reuse: submitting
+# a job identical to one of them (same type, client session, parameters, and
+# input data file versions) returns the existing job instead of running a new
+# one; applies to job types without side effects (source extraction,
+# photometry, source merge); 0 = always run a new job
+JOB_CACHE_SIZE = 1000
+
+# Number of threads used by batch asset download jobs to retrieve ZIP archive
+# entries in parallel; 0 = number of CPUs
+JOB_ZIP_THREADS = 0
+
+# Job result lists of records (e.g. photometry data) having at least this many
+# items are stored in columnar .npz job files instead of the job database;
+# None = always store in the database
+JOB_RESULT_TABLE_MIN_ROWS = 1000
@@ -10,7 +10,8 @@ __all__ = [
     'MissingWCSError', 'UnknownDataFileError', 'UnrecognizedDataFormatError',
     'UnknownSessionError', 'DuplicateSessionNameError',
     'UnknownDataFileGroupError', 'DataFileExportError',
-    'DataFileUploadNotAllowedError',
+    'DataFileUploadNotAllowedError', 'SessionVersionConflictError',
+    'CannotPatchSessionDataError',
 ]
 
 
@@ -132,3 +133,30 @@ class DataFileUploadNotAllowedError(AfterglowError):
     code = 403
     subcode = 2009
     message = 'Data file upload not allowed'
+
+
+class SessionVersionConflictError(AfterglowError):
+    """
+    Updating session that has been modified since the version known
+    to the client
+
+    Extra attributes::
+        id: session ID
+        version: current session version
+    """
+    code = 409
+    subcode = 2010
+    message = 'Session was modified by another client'
+
+
+class CannotPatchSessionDataError(AfterglowError):
+    """
+    Session data patch is invalid or cannot be applied to the current session
+    data
+
+    Extra attributes::
+        reason: error message describing the reason of failure
+    """
+    code = 422
+    subcode = 2011
+    message = 'Cannot patch session data'
@@ -7,8 +7,10 @@ from . import AfterglowError
 
 __all__ = [
     'CannotCancelJobError', 'CannotCreateJobFileError', 'CannotDeleteJobError',
-    'CannotSetJobStatusError', 'InvalidMethodError', 'JobServerError',
-    'UnknownJobError', 'UnknownJobFileError', 'UnknownJobTypeError',
+    'CannotSetJobStatusError', 'InvalidMethodError', 'JobResourceLimitError',
+    'JobServerBusyError', 'JobServerError', 'TooManyPendingJobsError',
+    'UnknownJobError', 'UnknownJobFileError', 'UnknownJobGroupError',
+    'UnknownJobTypeError',
 ]
 
 
@@ -120,3 +122,57 @@ class CannotCreateJobFileError(AfterglowError):
     code = 500
     subcode = 308
     message = 'Cannot create job file'
+
+
+class JobResourceLimitError(AfterglowError):
+    """
+    Job exceeded the memory or CPU time limit set by JOB_MAX_ADDRESS_SPACE,
+    JOB_MAX_CPU_TIME, or JOB_RESOURCE_LIMITS
+
+    Extra attributes::
+        resource: "memory" or "CPU time"
+        limit: resource limit (MB or seconds)
+    """
+    code = 500
+    subcode = 309
+    message = 'Job exceeded resource limit'
+
+
+class UnknownJobGroupError(AfterglowError):
+    """
+    Unknown job group ID requested
+
+    Extra attributes::
+        group_id: job group ID
+    """
+    code = 404
+    subcode = 310
+    message = 'Unknown job group'
+
+
+class TooManyPendingJobsError(AfterglowError):
+    """
+    Submitting a job would exceed the maximum number of user's jobs waiting
+    to be run (JOB_USER_MAX_PENDING); the Retry-After header contains
+    the estimated number of seconds until the next user's job starts
+
+    Extra attributes::
+        limit: maximum number of pending jobs per user
+    """
+    code = 429
+    subcode = 311
+    message = 'Too many pending jobs'
+
+
+class JobServerBusyError(AfterglowError):
+    """
+    Submitting a job would exceed the maximum total number of jobs waiting
+    to be run (JOB_MAX_PENDING); the Retry-After header contains the estimated
+    number of seconds until the next job starts
+
+    Extra attributes::
+        limit: maximum number of pending jobs
+    """
+    code = 503
+    subcode = 312
+    message = 'Job server is busy'
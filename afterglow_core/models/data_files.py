@@ -73,10 +73,13 @@ class Session(AfterglowSchema):
             the session
         name: unique session name
         data: arbitrary user data associated with the session
+        version: session version incremented on each update; used for
+            optimistic concurrency control
         data_files: list of data file objects associated with the session
     """
     id: int = Integer(default=None)
     name: str = String(default=None)
     data: str = String()
+    version: int = Integer()
     data_files: TList[DataFile] = List(
         Nested(DataFile), default=[], dump_only=True)
@@ -3,21 +3,101 @@ Afterglow Core: job data models
 """
 import os
 import sys
+import json
+import mmap
+import time
+import shutil
+import struct
+import pickle
+import hashlib
+import threading
 import traceback
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List as TList, Optional, Union
-from multiprocessing import Queue
+from zipfile import ZIP_STORED, ZipFile
+from typing import (
+    Any, BinaryIO, Dict, Iterable, Iterator, List as TList, Optional, Sequence,
+    Tuple, Union)
+from multiprocessing import Queue, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
 
 import errno
+import numpy as np
 from marshmallow.fields import Integer, List, Nested, String
 
 from .. import app
 from ..errors import MethodNotImplementedError
 from ..errors.job import CannotCreateJobFileError
-from ..schemas import AfterglowSchema, DateTime, Float
+from ..schemas import AfterglowSchema, Boolean, DateTime, Float
 
 
-__all__ = ['Job', 'JobResult', 'JobState', 'job_file_dir', 'job_file_path']
+__all__ = [
+    'Job', 'JobResult', 'JobState', 'get_job_phase_times', 'job_file_dir',
+    'job_file_path', 'job_phase', 'load_result_table', 'reset_job_phase_times',
+    'run_subtask', 'save_result_table', 'unlink_shared_arrays',
+]
+
+
+# Time spent by the job running in the current process in each phase (seconds);
+# None = not running a job
+_job_phase_times = None
+_job_phase_lock = threading.Lock()
+_job_phase_local = threading.local()
+
+
+@contextmanager
+def job_phase(name: str) -> Iterator[None]:
+    """
+    Account the time spent in the with block or decorated function to the given
+    phase of the job running in the current process; nested phases are
+    accounted to the outermost phase:
+
+        @job_phase('load')
+        def get_data_file_data(...):
+            ...
+
+    :param name: phase name: "load" or "save"
+
+    :return: context manager
+    """
+    if _job_phase_times is None or \
+            getattr(_job_phase_local, 'phase', None) is not None:
+        yield
+        return
+
+    _job_phase_local.phase = name
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _job_phase_local.phase = None
+        dt = time.perf_counter() - t0
+        with _job_phase_lock:
+            if _job_phase_times is not None:
+                _job_phase_times[name] = _job_phase_times.get(name, 0) + dt
+
+
+def reset_job_phase_times() -> None:
+    """
+    Start accounting job phase times for a new job
+
+    :return: None
+    """
+    global _job_phase_times
+    with _job_phase_lock:
+        _job_phase_times = {}
+
+
+def get_job_phase_times() -> Dict[str, float]:
+    """
+    Return the time spent by the current job in each phase since the last call
+    to :func:`reset_job_phase_times`
+
+    :return: {phase name: time in seconds, ...}
+    """
+    with _job_phase_lock:
+        return dict(_job_phase_times or {})
 
 
 class JobState(AfterglowSchema):
@@ -32,11 +112,37 @@ class JobState(AfterglowSchema):
         created_on: time of job creation (UTC "YYYY-MM-DD HH:MM:SS.SSSSSS")
         completed_on: time of completion or cancellation
         progress: current job progress, a number from 0 to 100
+        peak_rss: peak resident memory size of the worker processes while
+            running the job and its subtasks, in megabytes
+        cpu_time: CPU time (user + system) used by the job and its subtasks,
+            in seconds
+        wall_time: job run time, in seconds
+        bytes_read: number of bytes read by the job and its subtasks
+        bytes_written: number of bytes written by the job and its subtasks
+        load_time: time spent by the job loading data files, in seconds
+        compute_time: job run time excluding loading and saving data, in
+            seconds
+        save_time: time spent by the job saving data files and job files,
+            including result tables, in seconds
+        queue_position: estimated position of a pending job in the job queue,
+            starting from 1
+        estimated_start: estimated time when a pending job starts running,
+            based on the mean run times of the previous jobs of each type
     """
     status: str = String(default='in_progress')
     created_on: datetime = DateTime()
     completed_on: datetime = DateTime()
     progress: float = Float(default=0)
+    peak_rss: float = Float()
+    cpu_time: float = Float()
+    wall_time: float = Float()
+    bytes_read: int = Integer()
+    bytes_written: int = Integer()
+    load_time: float = Float()
+    compute_time: float = Float()
+    save_time: float = Float()
+    queue_position: int = Integer()
+    estimated_start: datetime = DateTime()
 
     def __init__(self, *args, **kwargs):
         """
@@ -196,7 +302,7 @@ class Job(AfterglowSchema):
                 self.result.file_id = create_data_file(
                     adb, None, get_root(self.user_id), data, hdr,
                     duplicates='append', session_id=self.session_id,
-                ).id
+                    user_id=self.user_id).id
                 adb.commit()
             except Exception:
                 adb.rollback()
@@ -212,6 +318,27 @@ class Job(AfterglowSchema):
     by their IDs assigned by :meth:`run`. See :meth:`create_job_file` for more
     info.
 
+    A job that processes multiple files independently may split the work into
+    per-file subtasks by calling :meth:`run_subtasks`. Subtasks are run in
+    parallel by the job worker process running the job and by the other idle
+    worker processes. Each subtask calls the given method of a copy of the job
+    object and returns a picklable value; the results are combined by
+    :meth:`run`:
+
+    class MyJob(Job):
+        ...
+        def run(self):
+            self.result.values = self.run_subtasks(
+                'process_file', self.settings.file_ids)
+
+        def process_file(self, file_id):
+            try:
+                ...  # process file
+                return ...
+            except Exception as e:
+                self.add_error(
+                    'Error processing file {}: {}'.format(file_id, e))
+
     When a job is canceled by the client via
     PUT /jobs/[id]/state?status=canceled, a KeyboardInterrupt is raised in
     :meth:`run`. No special action is needed to handle this unless the job needs
@@ -242,6 +369,11 @@ class Job(AfterglowSchema):
         user_id: ID of the user who submitted the job
         session_id: ID of the client session (None = default anonymous session);
             new data files will be created with this session ID
+        group_id: optional ID shared by the jobs submitted together via
+            POST /jobs/batch
+        profile: profile the job; the profile is saved in the job files
+            "profile" (:mod:`pstats` format) and "profile_stacks" (sampled call
+            stacks in the collapsed format used by flame graph tools)
         state: current job state, an instance of JobState
         result: job result structure, an instance of JobResult or its subclass
 
@@ -253,19 +385,45 @@ class Job(AfterglowSchema):
         update_progress(): update the current job progress value (0 to 100)
         create_job_file(): save data to an extra job data file and register the
             file in the job database
+        open_job_file(): same as create_job_file() but write the data
+            incrementally to a file object
+        store_result_tables(): save long lists of result records to columnar
+            job files
+        run_subtasks(): run the given job method for each item of a list,
+            possibly in parallel by multiple worker processes
+        share_array(): place an array in shared memory to be used by other
+            processes running the same job
+        get_shared_array(): return an array shared by share_array()
+        get_data_file_data(): load data file image and header, sharing the
+            image between all processes running the job
     """
     __polymorphic_on__ = 'type'
 
+    # Job plugins whose result depends only on the job parameters and input data
+    # files, and which have no side effects like creating data files, may set
+    # this to let identical jobs reuse the result of an earlier job
+    cacheable = False
+
     id: int = Integer(default=None)
     type: str = String()
     user_id: int = Integer(default=None)
     session_id: int = Integer(default=None)
+    group_id: str = String(default=None)
+    profile: bool = Boolean(default=False)
     state: JobState = Nested(JobState)
     result: JobResult = Nested(JobResult)
 
     _queue = None
-
-    def __init__(self, *args, _queue: Queue = None, **kwargs):
+    _task_queue = None
+    _subtask = False
+    _result_tables = None
+    _subtask_usage = None
+    _sent = None
+    _last_update_time = None
+    _intermediate_result_schema = None
+
+    def __init__(self, *args, _queue: Queue = None, _task_queue: Queue = None,
+                 _subtask: bool = False, **kwargs):
         """
         Create a :class:`Job` instance; used both when loading job plugins and
         when creating a new job
@@ -273,11 +431,21 @@ class Job(AfterglowSchema):
         :param args: may include job object to initialize from
         :param _queue: job state/result queue used to pass job state updates
             to job server; unused when loading job plugins
+        :param _task_queue: worker process task queue used to receive subtasks
+            and their results from job server; if omitted, subtasks are run
+            sequentially by the current process
+        :param _subtask: the job object is a copy of the job that runs
+            a subtask; its state and result updates are not sent to job server
         :param kwargs: job-specific parameters passed on job creation
         """
         super().__init__(*args, **kwargs)
 
         self._queue = _queue
+        self._task_queue = _task_queue
+        self._subtask = _subtask
+        self._result_tables = {}
+        self._subtask_usage = {}
+        self._sent = {'state': {}, 'result': {}}
 
         # Initialize to default state and result
         if not hasattr(self, 'state'):
@@ -294,18 +462,74 @@ class Job(AfterglowSchema):
         raise MethodNotImplementedError(
             class_name=self.__class__.__name__, method_name='run')
 
+    def _result_table_fields(self) -> TList[str]:
+        """
+        Return names of the job result fields that are lists of records
+
+        :return: list of field names
+        """
+        return [
+            name for name, field in self.result.fields.items()
+            if isinstance(field, List) and isinstance(
+                getattr(field, 'inner', getattr(field, 'container', None)),
+                Nested)]
+
+    def _send_update(self, state: Optional[Dict[str, Any]] = None,
+                     result: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Send the serialized job state and result fields that changed since
+        the previous update to the job server
+
+        :param state: serialized job state fields
+        :param result: serialized job result fields
+        """
+        if self._queue is None or self._subtask:
+            return
+
+        msg = dict(id=self.id)
+        for kind, data in (('state', state), ('result', result)):
+            if not data:
+                continue
+            sent = self._sent[kind]
+            delta = {name: val for name, val in data.items()
+                     if name not in sent or sent[name] != val}
+            if delta:
+                msg[kind] = delta
+                sent.update(delta)
+        if len(msg) > 1:
+            self._queue.put(msg)
+
     def update(self) -> None:
         """
         Notify the job server about job state change; should be called after
         modifying any of the JobState or JobResult fields while the job is still
         in progress; also called automatically upon job completion
+
+        Only the fields that changed since the previous update are sent.
+        Intermediate updates are sent at most once per JOB_UPDATE_INTERVAL
+        seconds, unless the job status changes, and do not include the lists
+        of records in the job result, which are sent once upon job completion.
         """
+        final = self.state.status in ('completed', 'canceled')
+        now = time.monotonic()
+        if not final and self._last_update_time is not None and \
+                self.state.status == self._sent['state'].get('status') and \
+                now - self._last_update_time < app.config.get(
+                    'JOB_UPDATE_INTERVAL', 1):
+            return
+        self._last_update_time = now
+
         # Serialize and enqueue the job state and result along with the job ID
-        self._queue.put(dict(
-            id=self.id,
-            state=self.state.dump(self.state),
-            result=self.result.dump(self.result),
-        ))
+        if final:
+            result = self.result.dump(self.result)
+            if self._result_tables:
+                result['tables'] = self._result_tables
+        else:
+            if self._intermediate_result_schema is None:
+                self._intermediate_result_schema = self.result.__class__(
+                    exclude=self._result_table_fields())
+            result = self._intermediate_result_schema.dump(self.result)
+        self._send_update(self.state.dump(self.state), result)
 
     def add_error(self, msg: str) -> None:
         """
@@ -318,10 +542,7 @@ class Job(AfterglowSchema):
             msg = '{}\nTraceback (most recent call last):\n{}'.format(
                 msg, traceback.format_tb(sys.exc_info()[-1]))
         self.result.errors.append(msg)
-        self._queue.put(dict(
-            id=self.id,
-            result=dict(errors=self.result.errors),
-        ))
+        self._send_update(result=dict(errors=list(self.result.errors)))
 
     def add_warning(self, msg: str) -> None:
         """
@@ -330,14 +551,12 @@ class Job(AfterglowSchema):
         :param msg: warning message
         """
         self.result.warnings.append(msg)
-        self._queue.put(dict(
-            id=self.id,
-            result=dict(warnings=self.result.warnings),
-        ))
+        self._send_update(result=dict(warnings=list(self.result.warnings)))
 
     def update_progress(self, progress: float) -> None:
         """
-        Set Job.state.progress and call :meth:`update`
+        Set Job.state.progress and call :meth:`update`; progress updates are
+        rate-limited in the same way as the other intermediate updates
 
         :param progress: job progress (0 to 100)
         """
@@ -359,20 +578,62 @@ class Job(AfterglowSchema):
         :param headers: optional extra headers to be returned by
             GET /jobs/[id]/result/files
         """
-        # Write job file data to disk
+        with self.open_job_file(id, mimetype, headers) as f:
+            try:
+                f.write(data)
+            except Exception as e:
+                raise CannotCreateJobFileError(id=id, reason=str(e))
+
+    @contextmanager
+    def open_job_file(self, id: Union[int, str],
+                      mimetype: Optional[str] = None,
+                      headers: Optional[Dict[str, str]] = None) \
+            -> Iterator[BinaryIO]:
+        """
+        Create a new extra job file and return a binary file object for writing
+        its data incrementally; use instead of :meth:`create_job_file` for
+        large files that should not be kept in memory:
+
+            with self.open_job_file('download', 'application/zip') as f:
+                with ZipFile(f, 'w') as zf:
+                    ...
+
+        The file is written to a temporary location and becomes available via
+        GET /jobs/[id]/result/files only after the with block completes
+        successfully.
+
+        :param id: extra job file ID; not necessarily integer but should be
+            unique among other job files for this job type
+        :param mimetype: optional MIME type of the file being created,
+            returned in the Content-Type header by GET /jobs/[id]/result/files
+        :param headers: optional extra headers to be returned by
+            GET /jobs/[id]/result/files
+
+        :return: context manager yielding the writable file object
+        """
+        fp = job_file_path(self.user_id, self.id, id)
+        tmp_fp = fp + '.tmp'
         try:
-            fp = job_file_path(self.user_id, self.id, id)
             try:
                 os.makedirs(os.path.dirname(fp))
             except OSError as e:
                 if e.errno != errno.EEXIST:
                     raise
-
-            with open(fp, 'wb') as f:
-                f.write(data)
+            f = open(tmp_fp, 'wb')
         except Exception as e:
             raise CannotCreateJobFileError(id=id, reason=str(e))
 
+        try:
+            with job_phase('save'), f:
+                yield f
+            os.replace(tmp_fp, fp)
+        except BaseException:
+            try:
+                os.remove(tmp_fp)
+            except OSError:
+                pass
+            raise
+
         # Send message to add job file to db
         file_def = dict(id=id)
         if mimetype is not None:
@@ -381,6 +642,694 @@ class Job(AfterglowSchema):
             file_def['headers'] = headers
         self._queue.put(dict(id=self.id, file=file_def))
 
+    def store_result_tables(self, prefix: str = 'result_') -> None:
+        """
+        Move long lists of records in the job result (e.g. photometry or
+        source extraction data) to columnar job files instead of storing them
+        in the job database; called automatically upon job completion
+
+        Lists having fewer than JOB_RESULT_TABLE_MIN_ROWS items stay in
+        the database. The columnar data are returned by GET /jobs/[id]/result
+        as usual and are also available as .npz files via
+        GET /jobs/[id]/result/files/result_[field name].
+
+        :param prefix: job file ID prefix
+        """
+        min_rows = app.config.get('JOB_RESULT_TABLE_MIN_ROWS')
+        if min_rows is None:
+            return
+
+        for name in self._result_table_fields():
+            records = getattr(self.result, name, None)
+            if not records or len(records) < min_rows:
+                continue
+
+            file_id = prefix + name
+            with self.open_job_file(file_id, 'application/x-npz') as f:
+                columns = save_result_table(
+                    f, [rec.to_dict() if isinstance(rec, AfterglowSchema)
+                        else rec for rec in records])
+            self._result_tables[name] = dict(
+                file_id=file_id, rows=len(records), columns=columns)
+            setattr(self.result, name, [])
+
+    def run_subtasks(self, method: str, items: Sequence[Any]) -> TList[Any]:
+        """
+        Call the given job method for each item, possibly in parallel by
+        multiple job worker processes, and return the results in the order of
+        items; used by job plugins to split the job into independent subtasks,
+        usually one per data file
+
+        Each subtask calls the method of a copy of the job object initialized
+        from the job fields as they are at the moment of the call, so
+        the method should not modify the job but return a picklable value
+        instead. Errors and warnings added by the method are merged into the job
+        result, and the job progress is updated as subtasks complete. If
+        the method raises an exception, its message is added to the job errors,
+        and None is returned for the corresponding item. Canceling the job
+        cancels all its subtasks.
+
+        Subtasks are queued by the job server and run by the current worker
+        process and by any other idle worker processes. If JOB_SUBTASKS is
+        disabled or there is only one item, they are run sequentially by
+        the current process. With JOB_CHECKPOINTS enabled, the results of
+        the completed subtasks are saved in a job file, so that a job resumed
+        after a job server restart runs only the remaining subtasks.
+
+        :param method: name of the job method to call
+        :param items: list of method arguments, one per subtask
+
+        :return: list of method return values
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        job = self.dump(self)
+        job.pop('state', None)
+        job.pop('result', None)
+        batch = uuid.uuid4().hex
+        # The job fields are sent along with subtasks only once per worker
+        # process by the job server
+        subtasks = [
+            dict(subtask=True, parent=self.id, batch=batch, index=i,
+                 method=method, item=item)
+            for i, item in enumerate(items)]
+
+        results, done = [None]*len(items), [False]*len(items)
+
+        # Reuse the results of the subtasks completed before the job was
+        # interrupted by the job server restart
+        checkpoint = self._open_checkpoint(method, job, items, results, done)
+        try:
+            num_done = sum(done)
+            if num_done:
+                self.update_progress(num_done/len(items)*100)
+            pending = [subtask for subtask in subtasks
+                       if not done[subtask['index']]]
+
+            if self._task_queue is None or len(pending) < 2 or \
+                    not app.config.get('JOB_SUBTASKS', True):
+                # Run subtasks sequentially
+                for subtask in pending:
+                    res = run_subtask(dict(subtask, job=job), self._queue)
+                    results[subtask['index']] = self._merge_subtask_result(res)
+                    self._save_checkpoint(
+                        checkpoint, items[subtask['index']], res)
+                    num_done += 1
+                    self.update_progress(num_done/len(items)*100)
+                return results
+
+            # Submit subtasks to the job server and wait for their results; run
+            # the subtasks dispatched back to the current process
+            # in the meantime
+            pid = os.getpid()
+            self._queue.put(
+                dict(id=self.id, pid=pid, subtasks=pending, job=job))
+            try:
+                while num_done < len(items):
+                    msg = self._task_queue.get()
+                    if msg is None:
+                        # The worker is told to exit (e.g. on job server
+                        # shutdown), so the other workers will not return
+                        # the remaining subtask results; abort the job and
+                        # put the stop message back for the worker to exit
+                        # after the job ends
+                        self._task_queue.put(None)
+                        raise KeyboardInterrupt()
+                    if not msg:
+                        continue
+                    if msg.get('subtask'):
+                        if msg.get('batch') != batch:
+                            continue
+                        res = run_subtask(dict(msg, job=job), self._queue)
+                        self._queue.put(dict(
+                            id=self.id, pid=pid,
+                            subtask_result=dict(
+                                batch=batch, index=res['index'])))
+                    else:
+                        res = msg.get('subtask_result')
+                        if not res or res.get('batch') != batch:
+                            # Result of a subtask of another job
+                            continue
+
+                    i = res['index']
+                    if done[i]:
+                        continue
+                    done[i] = True
+                    num_done += 1
+                    results[i] = self._merge_subtask_result(res)
+                    self._save_checkpoint(checkpoint, items[i], res)
+                    self.update_progress(num_done/len(items)*100)
+            except KeyboardInterrupt:
+                # Job canceled; cancel the subtasks that are still queued or
+                # running by other worker processes
+                self._queue.put(dict(id=self.id, cancel_subtasks=True))
+                raise
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+        return results
+
+    def _open_checkpoint(self, method: str, job: Dict[str, Any],
+                         items: TList[Any], results: TList[Any],
+                         done: TList[bool]) -> Optional[BinaryIO]:
+        """
+        Load the results of the subtasks completed by the previous run of
+        the job and open the checkpoint file for appending the new results;
+        checkpoints are enabled by JOB_CHECKPOINTS
+
+        :param method: subtask method name
+        :param job: serialized job passed to subtasks
+        :param items: subtask method arguments
+        :param results: list of subtask results to fill
+        :param done: list of subtask completion flags to fill
+
+        :return: checkpoint file object or None if checkpoints are disabled
+        """
+        if not app.config.get('JOB_CHECKPOINTS', True) or \
+                self._queue is None or self.id is None:
+            return None
+
+        # Different calls for the same job (e.g. within a pipeline) use
+        # separate checkpoints
+        key = hashlib.sha1(json.dumps(
+            [method, job], sort_keys=True, default=str).encode('utf8')) \
+            .hexdigest()[:16]
+        fp = job_file_path(self.user_id, self.id, 'checkpoint_' + key)
+
+        size = 0
+        # noinspection PyBroadException
+        try:
+            with open(fp, 'rb') as f:
+                while True:
+                    try:
+                        item, res = pickle.load(f)
+                    except EOFError:
+                        break
+                    size = f.tell()
+                    i = res.get('index')
+                    if isinstance(i, int) and 0 <= i < len(items) and \
+                            not done[i] and items[i] == item:
+                        results[i] = self._merge_subtask_result(res)
+                        done[i] = True
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # Truncated checkpoint; keep the records that have been read
+            pass
+
+        try:
+            os.makedirs(os.path.dirname(fp), exist_ok=True)
+            f = open(fp, 'ab')
+            f.truncate(size)
+        except OSError:
+            return None
+        return f
+
+    @staticmethod
+    def _save_checkpoint(f: Optional[BinaryIO], item: Any,
+                         res: Dict[str, Any]) -> None:
+        """
+        Append the completed subtask result to the checkpoint file
+
+        :param f: checkpoint file object returned by :meth:`_open_checkpoint`
+        :param item: subtask method argument
+        :param res: subtask result
+
+        :return: None
+        """
+        if f is None:
+            return
+        # noinspection PyBroadException
+        try:
+            pickle.dump((item, res), f)
+            f.flush()
+        except Exception:
+            pass
+
+    def _merge_subtask_result(self, res: Dict[str, Any]) -> Any:
+        """
+        Add errors and warnings of a completed subtask to the job result and
+        the resources used by a subtask run by another worker process to
+        the job's subtask resource usage (see :meth:`add_subtask_usage`)
+
+        :param res: subtask result returned by :func:`run_subtask`
+
+        :return: subtask return value
+        """
+        usage = self._subtask_usage
+        for name, val in (res.get('usage') or {}).items():
+            if name == 'peak_rss':
+                usage[name] = max(usage.get(name, 0), val)
+            elif name != 'wall_time':
+                usage[name] = usage.get(name, 0) + val
+        if res.get('errors'):
+            self.result.errors += res['errors']
+            self._send_update(result=dict(errors=list(self.result.errors)))
+        if res.get('warnings'):
+            self.result.warnings += res['warnings']
+            self._send_update(result=dict(warnings=list(self.result.warnings)))
+        return res.get('value')
+
+    def add_subtask_usage(self) -> None:
+        """
+        Add the resources used by the subtasks run by other worker processes
+        to the job state: CPU time and I/O are summed, peak RSS is the maximum
+        over all processes
+
+        :return: None
+        """
+        for name, val in self._subtask_usage.items():
+            current = getattr(self.state, name, None) or 0
+            setattr(self.state, name, max(current, val) if name == 'peak_rss'
+                    else current + val)
+
+    def share_array(self, key: str,
+                    data: Union[np.ndarray, np.ma.MaskedArray]) \
+            -> Union[np.ndarray, np.ma.MaskedArray]:
+        """
+        Place an image array in shared memory so that other processes running
+        the same job (the parent job, its subtasks, and the subsequent stages
+        of a pipeline) obtain it via :meth:`get_shared_array` without copying
+        or reloading; the shared memory is released by the job server when
+        the job is completed or canceled
+
+        :param key: array key unique within the job
+        :param data: array to share; masked arrays are supported
+
+        :return: a copy-on-write view of the shared array if sharing succeeded
+            (see :meth:`get_shared_array`), otherwise `data` itself
+        """
+        name = shared_array_name(self.id, key)
+        if name is None or self._queue is None or \
+                not isinstance(data, np.ndarray) or data.dtype.fields or \
+                data.dtype.hasobject:
+            return data
+        try:
+            if not create_shared_array(name, data):
+                return data
+        except Exception:
+            app.logger.warning(
+                'Could not share array "%s"', key, exc_info=True)
+            return data
+
+        # Let the job server release the shared memory after the job is done
+        self._queue.put(dict(id=self.id, shared_memory=name))
+        return self.get_shared_array(key)
+
+    def get_shared_array(self, key: str) \
+            -> Optional[Union[np.ndarray, np.ma.MaskedArray]]:
+        """
+        Return an array shared by :meth:`share_array` in this or another
+        process running the same job
+
+        The array is mapped copy-on-write: reading it does not copy the data,
+        and in-place modifications are private to the calling process.
+
+        :param key: array key
+
+        :return: shared array or None if no array with this key has been
+            shared by the job
+        """
+        name = shared_array_name(self.id, key)
+        if name is None:
+            return None
+        try:
+            return attach_shared_array(name)
+        except Exception:
+            app.logger.warning(
+                'Could not attach shared array "%s"', key, exc_info=True)
+            return None
+
+    @job_phase('load')
+    def get_data_file_data(self, file_id: int, as_float: bool = True) \
+            -> Tuple[Union[np.ndarray, np.ma.MaskedArray], Any]:
+        """
+        Same as :func:`afterglow_core.resources.data_files.get_data_file_data`
+        for the job's user, but the image data loaded by any process running
+        the job are shared with the other processes via shared memory, so that
+        each data file is read from disk once per job; the header is always
+        read from the file
+
+        :param file_id: data file ID
+        :param as_float: convert integer image data to float32
+
+        :return: tuple (data, hdr)
+        """
+        from ..resources.data_files import (
+            get_data_file_data, get_data_file_fits, get_data_file_hdu,
+            get_data_file_path)
+
+        if not app.config.get('JOB_SHARED_MEMORY'):
+            return get_data_file_data(self.user_id, file_id, as_float)
+
+        # Include the file version in the key so that the data file changes
+        # made by the job itself are picked up
+        try:
+            st = os.stat(get_data_file_path(self.user_id, file_id))
+        except OSError:
+            # Let get_data_file_data() raise the appropriate error
+            return get_data_file_data(self.user_id, file_id, as_float)
+        key = 'file_{}_{}_{}_{:d}'.format(
+            file_id, st.st_mtime_ns, st.st_size, as_float)
+        data = self.get_shared_array(key)
+        if data is None:
+            data, hdr = get_data_file_data(self.user_id, file_id, as_float)
+            return self.share_array(key, data), hdr
+        return data, get_data_file_hdu(
+            get_data_file_fits(self.user_id, file_id)).header
+
+
+# Shared memory segment layout: 8-byte metadata length, metadata (JSON),
+# padding to SHARED_ARRAY_ALIGN bytes, array data, mask; zero metadata length
+# means that the segment is being filled
+SHARED_ARRAY_ALIGN = 64
+
+
+# Directory where the OS exposes POSIX shared memory segments as files; shared
+# arrays are mapped copy-on-write from there, which SharedMemory does not
+# support
+SHARED_MEMORY_DIR = '/dev/shm'
+
+
+def shared_array_name(job_id: Optional[int], key: str) -> Optional[str]:
+    """
+    Return the name of the shared memory segment holding a job's shared array
+
+    :param job_id: job ID
+    :param key: array key
+
+    :return: shared memory name or None if shared memory is disabled or not
+        supported
+    """
+    if job_id is None or not os.path.isdir(SHARED_MEMORY_DIR) or \
+            not app.config.get('JOB_SHARED_MEMORY'):
+        return None
+    # Keep names short and distinct between Afterglow instances on the same
+    # host
+    return 'ag' + hashlib.sha1('{}:{}:{}'.format(
+        os.path.abspath(app.config['DATA_ROOT']), job_id, key)
+        .encode('utf8')).hexdigest()[:24]
+
+
+def create_shared_memory(name: str, size: int) -> SharedMemory:
+    """
+    Create a shared memory segment owned by the job server rather than by
+    the calling process
+
+    :param name: shared memory name
+    :param size: segment size in bytes
+
+    :return: shared memory object
+    """
+    try:
+        return SharedMemory(name, create=True, size=size, track=False)
+    except TypeError:
+        # Before Python 3.13, the segment is always registered with
+        # the resource tracker, which would unlink it when the worker process
+        # exits
+        shm = SharedMemory(name, create=True, size=size)
+        resource_tracker.unregister('/' + shm.name, 'shared_memory')
+        return shm
+
+
+def create_shared_array(name: str,
+                        data: Union[np.ndarray, np.ma.MaskedArray]) -> bool:
+    """
+    Create a shared memory segment and copy an array to it
+
+    :param name: shared memory name returned by :func:`shared_array_name`
+    :param data: array to share
+
+    :return: False if the segment already exists or there is not enough free
+        shared memory (see JOB_SHARED_MEMORY_RESERVE)
+    """
+    mask = np.ma.getmask(data) if isinstance(data, np.ma.MaskedArray) \
+        else np.ma.nomask
+    data = np.ascontiguousarray(np.ma.getdata(data))
+    meta = json.dumps(dict(
+        dtype=data.dtype.str, shape=data.shape,
+        mask=mask is not np.ma.nomask)).encode('ascii')
+    offset = -(-(8 + len(meta))//SHARED_ARRAY_ALIGN)*SHARED_ARRAY_ALIGN
+    size = offset + data.nbytes
+    if mask is not np.ma.nomask:
+        mask = np.ascontiguousarray(mask, bool)
+        size += mask.nbytes
+
+    reserve = app.config.get('JOB_SHARED_MEMORY_RESERVE', 0)*(1 << 20)
+    if shutil.disk_usage(SHARED_MEMORY_DIR).free - size < reserve:
+        return False
+
+    try:
+        shm = create_shared_memory(name, size)
+    except FileExistsError:
+        # Already shared by another process
+        return False
+    try:
+        buf = shm.buf
+        buf[offset:offset + data.nbytes] = data.reshape(-1).view(np.uint8)
+        if mask is not np.ma.nomask:
+            buf[offset + data.nbytes:size] = mask.reshape(-1).view(np.uint8)
+        # Mark the segment complete
+        buf[8:8 + len(meta)] = meta
+        buf[:8] = len(meta).to_bytes(8, 'little')
+        del buf
+    except BaseException:
+        shm.close()
+        unlink_shared_arrays([name])
+        raise
+    shm.close()
+    return True
+
+
+def attach_shared_array(name: str) \
+        -> Optional[Union[np.ndarray, np.ma.MaskedArray]]:
+    """
+    Map a shared array created by :func:`create_shared_array` copy-on-write
+
+    :param name: shared memory name
+
+    :return: array or None if the segment does not exist or is incomplete
+    """
+    try:
+        f = open(os.path.join(SHARED_MEMORY_DIR, name), 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 8:
+            return None
+        buf = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_COPY)
+
+    meta_len = int.from_bytes(buf[:8], 'little')
+    if not meta_len:
+        # Being filled by another process
+        buf.close()
+        return None
+    meta = json.loads(buf[8:8 + meta_len].decode('ascii'))
+    offset = -(-(8 + meta_len)//SHARED_ARRAY_ALIGN)*SHARED_ARRAY_ALIGN
+    dtype = np.dtype(meta['dtype'])
+    shape = tuple(meta['shape'])
+    count = int(np.prod(shape))
+
+    # The arrays keep the mapping alive
+    data = np.frombuffer(buf, dtype, count, offset).reshape(shape)
+    if meta['mask']:
+        mask = np.frombuffer(
+            buf, bool, count, offset + count*dtype.itemsize).reshape(shape)
+        data = np.ma.masked_array(data, mask)
+    return data
+
+
+def unlink_shared_arrays(names: Iterable[str]) -> None:
+    """
+    Remove shared memory segments; the memory is freed when all processes that
+    mapped the segments release them
+
+    :param names: shared memory names
+
+    :return: None
+    """
+    for name in names:
+        try:
+            # Attaching registers the segment with the resource tracker, and
+            # unlinking unregisters it
+            shm = SharedMemory(name)
+        except (OSError, ValueError):
+            continue
+        shm.close()
+        try:
+            shm.unlink()
+        except OSError:
+            pass
+
+
+def run_subtask(subtask: Dict[str, Any], queue: Optional[Queue] = None) \
+        -> Dict[str, Any]:
+    """
+    Run a single subtask created by :meth:`Job.run_subtasks`
+
+    :param subtask: subtask description
+    :param queue: job state/result queue; used by the subtask to create job
+        files
+
+    :return: subtask result: a dictionary containing the subtask batch ID and
+        index, the method return value, and the errors and warnings added by
+        the subtask
+    """
+    res = dict(batch=subtask['batch'], index=subtask['index'])
+    job = None
+    # noinspection PyBroadException
+    try:
+        job = Job(_queue=queue, _subtask=True, _set_defaults=True,
+                  **subtask['job'])
+        res['value'] = getattr(job, subtask['method'])(subtask['item'])
+    except Exception as e:
+        if job is not None:
+            job.result.errors.append(str(e))
+        else:
+            res['errors'] = [str(e)]
+    if job is not None:
+        res['errors'] = job.result.errors
+        res['warnings'] = job.result.warnings
+    return res
+
+
+def save_result_table(f: BinaryIO, records: TList[Dict[str, Any]]) \
+        -> Dict[str, str]:
+    """
+    Save a list of serialized job result records in columnar form (one numpy
+    array per field) to a .npz file; missing and null values are masked
+
+    :param f: output file object
+    :param records: list of serialized records
+
+    :return: dictionary {column name: column kind}, kind is one of "bool",
+        "int", "float", "str", or "json" (arbitrary JSON-serialized values)
+    """
+    names = {}
+    for rec in records:
+        for name in rec:
+            names[name] = None
+
+    arrays, kinds = {}, {}
+    for name in names:
+        values = [rec.get(name) for rec in records]
+        mask = np.array([v is None for v in values])
+        present = [v for v in values if v is not None]
+        if all(isinstance(v, bool) for v in present):
+            kind, fill, dtype = 'bool', False, bool
+        elif all(isinstance(v, int) and not isinstance(v, bool)
+                 for v in present):
+            kind, fill, dtype = 'int', 0, np.int64
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                 for v in present):
+            kind, fill, dtype = 'float', np.nan, np.float64
+        elif all(isinstance(v, str) for v in present):
+            kind, fill, dtype = 'str', '', str
+        else:
+            kind, fill, dtype = 'json', '', str
+            values = [json.dumps(v) for v in values]
+        try:
+            arrays[name] = np.array(
+                [fill if m else v for v, m in zip(values, mask)], dtype)
+        except OverflowError:
+            # Integers not fitting in 64 bits
+            kind = 'json'
+            arrays[name] = np.array(
+                ['' if m else json.dumps(v) for v, m in zip(values, mask)],
+                str)
+        kinds[name] = kind
+        if mask.any():
+            arrays['__mask__' + name] = mask
+
+    np.savez(f, **arrays)
+    return kinds
+
+
+def read_result_column(f: BinaryIO, zf: ZipFile, name: str, start: int,
+                       stop: Optional[int]) -> np.ndarray:
+    """
+    Read a range of elements of a column saved by :func:`save_result_table`
+    without loading the whole column
+
+    :param f: .npz file opened for reading
+    :param zf: ZipFile instance wrapping `f`
+    :param name: column name
+    :param start: index of the first element
+    :param stop: index of the element after the last one; None = up to
+        the end of the column
+
+    :return: column slice
+    """
+    zinfo = zf.getinfo(name + '.npy')
+    if zinfo.compress_type == ZIP_STORED:
+        # np.savez() stores arrays uncompressed; skip the ZIP local file header
+        # and the .npy header to get to the raw array data
+        f.seek(zinfo.header_offset + 26)
+        name_len, extra_len = struct.unpack('<HH', f.read(4))
+        f.seek(name_len + extra_len, os.SEEK_CUR)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = \
+                np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = \
+                np.lib.format.read_array_header_2_0(f)
+        else:
+            shape = None
+        if shape is not None and len(shape) == 1 and not dtype.hasobject:
+            start, stop, _ = slice(start, stop).indices(shape[0])
+            count = max(stop - start, 0)
+            f.seek(start*dtype.itemsize, os.SEEK_CUR)
+            return np.frombuffer(f.read(count*dtype.itemsize), dtype, count)
+
+    with zf.open(zinfo) as member:
+        return np.lib.format.read_array(member)[start:stop]
+
+
+def load_result_table(filename: str, kinds: Dict[str, str],
+                      columns: Optional[TList[str]] = None,
+                      offset: int = 0, limit: Optional[int] = None) \
+        -> TList[Dict[str, Any]]:
+    """
+    Load a range of rows from a columnar job result file created by
+    :func:`save_result_table`
+
+    :param filename: .npz file path
+    :param kinds: column kinds returned by :func:`save_result_table`
+    :param columns: optional list of columns to load; default: all columns
+    :param offset: index of the first row to load
+    :param limit: maximum number of rows to load; default: all rows starting
+        from `offset`
+
+    :return: list of serialized records
+    """
+    names = [name for name in kinds if columns is None or name in columns]
+    stop = None if limit is None else offset + limit
+    values = []
+    with open(filename, 'rb') as f, ZipFile(f) as zf:
+        members = set(zf.namelist())
+        for name in names:
+            col = read_result_column(
+                f, zf, name, offset, stop).tolist()
+            if '__mask__' + name + '.npy' in members:
+                mask = read_result_column(
+                    f, zf, '__mask__' + name, offset, stop).tolist()
+            else:
+                mask = None
+            if kinds[name] == 'json':
+                col = [json.loads(v) if v else None for v in col]
+            if mask is not None:
+                col = [None if m else v for v, m in zip(col, mask)]
+            values.append(col)
+
+    if not values:
+        return []
+    return [dict(zip(names, row)) for row in zip(*values)]
+
 
 job_file_dir = os.path.join(
     os.path.abspath(app.config['DATA_ROOT']), 'job_files')
@@ -4,19 +4,22 @@ Afterglow Core: data-files resource implementation
 
 import sys
 import os
-from glob import glob
+import copy
 from datetime import datetime
 import json
 import sqlite3
 import uuid
+from contextlib import contextmanager
 from threading import Lock
 from io import BytesIO
-from typing import Dict as TDict, List as TList, Optional, Tuple, Union
+from typing import (
+    Dict as TDict, Iterator, List as TList, Optional, Tuple, Union)
 
 from sqlalchemy import (
     Boolean, CheckConstraint, Column, ForeignKey, Integer, String,
     create_engine, event)
 from sqlalchemy.orm import relationship, scoped_session, sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.ext.declarative import declarative_base
 # noinspection PyProtectedMember
 from sqlalchemy.engine import Engine
@@ -24,13 +27,14 @@ import numpy
 import astropy.io.fits as pyfits
 
 from .. import app, errors
-from ..models import DataFile, Session
+from ..models import DataFile, Session, job_phase
 from ..errors.data_file import (
     UnknownDataFileError, CannotCreateDataFileDirError,
     CannotImportFromCollectionAssetError, UnknownSessionError,
     DuplicateSessionNameError, UnrecognizedDataFormatError,
     UnknownDataFileGroupError, DataFileExportError,
-    DataFileUploadNotAllowedError)
+    DataFileUploadNotAllowedError, SessionVersionConflictError,
+    CannotPatchSessionDataError)
 from ..errors.data_provider import UnknownDataProviderError
 from . import data_providers
 from .base import DateTime, JSONType
@@ -64,12 +68,13 @@ __all__ = [
     'DataFileBase', 'data_files_engine',
     'data_files_engine_lock', 'get_data_file_db',
     # Paths
-    'get_root', 'get_data_file_path',
+    'get_root', 'get_data_file_path', 'get_data_file_path_in_root',
     # Metadata
     'convert_exif_field', 'get_exp_length', 'get_gain', 'get_image_time',
     # Data/metadata retrieval
     'get_data_file_bytes', 'get_data_file_data', 'get_data_file_fits',
-    'get_data_file_group_bytes', 'get_subframe',
+    'get_data_file_group_bytes', 'get_data_file_hdu', 'get_subframe',
+    'update_data_file_header',
     # Data file creation
     'create_data_file', 'import_data_file', 'save_data_file',
     # API endpoint interface
@@ -78,7 +83,7 @@ __all__ = [
     'update_data_file_asset', 'update_data_file_group_asset',
     # Sessions
     'get_session', 'query_sessions', 'create_session', 'update_session',
-    'delete_session',
+    'patch_session', 'delete_session',
 ]
 
 
@@ -122,10 +127,15 @@ class DbSession(DataFileBase):
     data = Column(
         String, CheckConstraint('data is null or length(data) <= 1048576'),
         nullable=True, server_default='')
+    version = Column(Integer, nullable=False, server_default='1')
 
     data_files: TList[DbDataFile] = relationship(
         'DbDataFile', backref='session')
 
+    # Make SQLA increment the version on each update and fail if the row was
+    # updated concurrently
+    __mapper_args__ = {'version_id_col': version}
+
 
 def get_root(user_id: Optional[int]) -> str:
     """
@@ -142,6 +152,79 @@ def get_root(user_id: Optional[int]) -> str:
     return os.path.abspath(os.path.expanduser(root))
 
 
+# Extensions of all disk files that belong to a data file: the FITS file itself
+# and its sidecar files, e.g. the cached histogram
+data_file_extensions = ('fits', 'fits.hist')
+
+# Number of hashed subdirectories of the user's data file root that data files
+# are distributed over to keep directory sizes small
+DATA_FILE_SHARDS = 256
+
+# Data file roots known to have been converted to the sharded layout
+sharded_roots = set()
+sharded_roots_lock = Lock()
+
+
+def migrate_to_sharded_layout(root: str) -> None:
+    """
+    Move data files stored directly in the user's data file root directory (the
+    layout used by earlier versions) to the hashed subdirectories; done only
+    once per root, which is then marked as converted
+
+    :param root: user's data file storage root directory
+    """
+    marker = os.path.join(root, '.sharded')
+    if os.path.isfile(marker):
+        return
+
+    if os.path.isdir(root):
+        for entry in os.scandir(root):
+            file_id, sep, ext = entry.name.partition('.')
+            if not sep or not file_id.isdigit() or \
+                    ext not in data_file_extensions or not entry.is_file():
+                continue
+            filename = get_data_file_path_in_root(root, int(file_id), ext)
+            try:
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                os.replace(entry.path, filename)
+            except FileNotFoundError:
+                # Concurrently moved by another process
+                pass
+            except Exception as e:
+                app.logger.warning(
+                    'Error moving data file "%s" to "%s" [%s]',
+                    entry.path, filename, e)
+    else:
+        os.makedirs(root)
+
+    with open(marker, 'w'):
+        pass
+
+
+def get_data_file_path_in_root(root: str, file_id: int, ext: str = 'fits') \
+        -> str:
+    """
+    Return path to a data file or its sidecar file in the given user's data file
+    root directory; converts the directory to the sharded layout if needed
+
+    :param root: user's data file storage root directory
+    :param file_id: data file ID
+    :param ext: data file extension, one of :data:`data_file_extensions`
+
+    :return: path to data file
+    """
+    if root not in sharded_roots:
+        with sharded_roots_lock:
+            if root not in sharded_roots:
+                migrate_to_sharded_layout(root)
+                sharded_roots.add(root)
+
+    file_id = int(file_id)
+    return os.path.join(
+        root, '{:02x}'.format(file_id % DATA_FILE_SHARDS),
+        '{}.{}'.format(file_id, ext))
+
+
 # SQLA database engine
 data_files_engine = {}
 data_files_engine_lock = Lock()
@@ -223,15 +306,63 @@ def get_data_file_db(user_id: Optional[int]):
             else ', '.join(str(arg) for arg in e.args) if e.args else str(e))
 
 
+def get_data_file_compression(user_id: Optional[int]) \
+        -> Optional[TDict[str, dict]]:
+    """
+    Return tile compression options for the given user's data files, either
+    user-specific (DATA_FILE_COMPRESSION_PER_USER) or the deployment-wide
+    default (DATA_FILE_COMPRESSION)
+
+    :param user_id: current user ID (None if user auth is disabled)
+
+    :return: dictionary {"int": {option: value, ...}, "float": {...}} of
+        :class:`astropy.io.fits.CompImageHDU` keyword arguments for integer and
+        floating-point images; None or missing key means no compression
+    """
+    return (app.config.get('DATA_FILE_COMPRESSION_PER_USER') or {}).get(
+        user_id, app.config.get('DATA_FILE_COMPRESSION'))
+
+
+def reserve_header_space(hdr: pyfits.Header, strip: bool = False) -> None:
+    """
+    Append blank cards to the end of FITS header so that the header can later
+    grow by this number of cards without having to rewrite the whole file; new
+    header cards take the place of the trailing blanks (see
+    :func:`update_data_file_header`)
+
+    :param hdr: FITS header to pad in place
+    :param strip: remove the existing trailing blank cards first; otherwise,
+        only add the missing ones
+    """
+    reserve = app.config.get('DATA_FILE_HEADER_RESERVE', 0)
+    blanks = 0
+    while len(hdr) > blanks and hdr.cards[-blanks - 1].is_blank:
+        blanks += 1
+    if strip:
+        for _ in range(blanks):
+            del hdr[-1]
+        blanks = 0
+    for _ in range(reserve - blanks):
+        hdr.append(useblanks=False, end=True)
+
+
+@job_phase('save')
 def save_data_file(adb, root: str, file_id: int,
                    data: Union[numpy.ndarray, numpy.ma.MaskedArray], hdr,
-                   modified: bool = True) \
+                   modified: bool = True, user_id: Optional[int] = None) \
         -> None:
     """
     Save data file to the user's data file directory as a single (image) or
     double (image + mask) HDU FITS or a primary + table HDU FITS, depending on
     whether the input HDU contains an image or a table
 
+    Integer images (e.g. raw 16-bit CCD frames) are stored in their native
+    integer type, with unsigned data represented via BZERO, since this is
+    lossless; all other images are stored as float32. If tile compression is
+    enabled for the user (see :func:`get_data_file_compression`), the image
+    and mask are stored in compressed image extension HDUs after an empty
+    primary HDU.
+
     :param adb: SQLA database session
     :param root: user's data file storage root directory
     :param file_id: data file ID
@@ -239,39 +370,58 @@ def save_data_file(adb, root: str, file_id: int,
     :param hdr: FITS header
     :param modified: if True, set the file modification flag; not set on initial
         creation
+    :param user_id: current user ID; used to select the data file compression
+        options
     """
     # Initialize header
     if hdr is None:
         hdr = pyfits.Header()
     hdr['FILE_ID'] = (file_id, 'Afterglow data file ID')
+    reserve_header_space(hdr, strip=True)
 
     if data.dtype.fields is None:
-        # Convert image data to float32
-        data = data.astype(numpy.float32)
+        if data.dtype.kind not in ('i', 'u'):
+            # Convert non-integer image data to float32
+            data = data.astype(numpy.float32)
         if isinstance(data, numpy.ma.MaskedArray) and not data.mask.any():
             # Empty mask, save as normal array
             data = data.data
         if isinstance(data, numpy.ma.MaskedArray):
             # Store masked array in two HDUs
+            mask = data.mask
+            data = data.data
+        elif data.dtype.kind == 'f':
+            # Treat normal float arrays with NaN's as masked arrays
+            mask = numpy.isnan(data)
+            if not mask.any():
+                mask = None
+        else:
+            mask = None
+
+        compression = get_data_file_compression(user_id) or {}
+        compression = compression.get(
+            'int' if data.dtype.kind in ('i', 'u') else 'float')
+        if compression:
+            # Tile-compressed image and mask in extension HDUs
             fits = pyfits.HDUList(
-                [pyfits.PrimaryHDU(data.data, hdr),
-                 pyfits.ImageHDU(data.mask.astype(numpy.uint8), name='MASK')])
+                [pyfits.PrimaryHDU(),
+                 pyfits.CompImageHDU(data, hdr, **compression)])
+            if mask is not None:
+                fits.append(pyfits.CompImageHDU(
+                    mask.astype(numpy.uint8), name='MASK',
+                    compression_type='RICE_1'))
         else:
-            # Treat normal arrays with NaN's as masked arrays
-            mask = numpy.isnan(data)
-            if mask.any():
-                fits = pyfits.HDUList(
-                    [pyfits.PrimaryHDU(data, hdr),
-                     pyfits.ImageHDU(mask, name='MASK')])
-            else:
-                fits = pyfits.PrimaryHDU(data, hdr)
+            fits = pyfits.HDUList([pyfits.PrimaryHDU(data, hdr)])
+            if mask is not None:
+                fits.append(pyfits.ImageHDU(
+                    mask.astype(numpy.uint8), name='MASK'))
     else:
         fits = pyfits.BinTableHDU(data, hdr)
 
     # Save FITS to data file directory
-    fits.writeto(
-        os.path.join(root, '{}.fits'.format(file_id)),
-        'silentfix', overwrite=True)
+    filename = get_data_file_path_in_root(root, file_id)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    fits.writeto(filename, 'silentfix', overwrite=True)
 
     # Update image dimensions and file modification timestamp
     db_data_file = adb.query(DbDataFile).get(file_id)
@@ -286,13 +436,15 @@ def save_data_file(adb, root: str, file_id: int,
         db_data_file.modified = True
 
 
+@job_phase('save')
 def create_data_file(adb, name: Optional[str], root: str, data: numpy.ndarray,
                      hdr=None, provider: str = None, path: str = None,
                      metadata: dict = None, layer: str = None,
                      duplicates: str = 'ignore',
                      session_id: Optional[int] = None,
                      group_id: Optional[str] = None,
-                     group_order: Optional[int] = 0) -> DbDataFile:
+                     group_order: Optional[int] = 0,
+                     user_id: Optional[int] = None) -> DbDataFile:
     """
     Create a database entry for a new data file and save it to data file
     directory as an single (image) or double (image + mask) HDU FITS or
@@ -316,6 +468,8 @@ def create_data_file(adb, name: Optional[str], root: str, data: numpy.ndarray,
     :param session_id: optional user session ID; defaults to anonymous session
     :param group_id: optional GUID of the file group; default: auto-generate
     :param group_order: 0-based order of the file in the group
+    :param user_id: current user ID; used to select the data file compression
+        options
 
     :return: data file instance
     """
@@ -378,7 +532,8 @@ def create_data_file(adb, name: Optional[str], root: str, data: numpy.ndarray,
         adb.add(db_data_file)
         adb.flush()  # obtain the new row ID by flushing db
 
-    save_data_file(adb, root, db_data_file.id, data, hdr, modified=False)
+    save_data_file(
+        adb, root, db_data_file.id, data, hdr, modified=False, user_id=user_id)
 
     return db_data_file
 
@@ -386,7 +541,8 @@ def create_data_file(adb, name: Optional[str], root: str, data: numpy.ndarray,
 def import_data_file(adb, root: str, provider_id: Optional[Union[int, str]],
                      asset_path: Optional[str], asset_metadata: dict, fp,
                      name: Optional[str], duplicates: str = 'ignore',
-                     session_id: Optional[int] = None) -> TList[DbDataFile]:
+                     session_id: Optional[int] = None,
+                     user_id: Optional[int] = None) -> TList[DbDataFile]:
     """
     Create data file(s) from a (possibly multi-layer) non-collection data
     provider asset or from an uploaded file
@@ -405,6 +561,8 @@ def import_data_file(adb, root: str, provider_id: Optional[Union[int, str]],
         "overwrite" = re-import the file and replace the existing data file,
         "append" = always import as a new data file
     :param session_id: optional user session ID; defaults to anonymous session
+    :param user_id: current user ID; used to select the data file compression
+        options
 
     :return: list of DbDataFile instances created/updated
     """
@@ -477,7 +635,7 @@ def import_data_file(adb, root: str, provider_id: Optional[Union[int, str]],
                 all_data_files.append(create_data_file(
                     adb, name, root, hdu.data, hdu.header, provider_id,
                     asset_path, asset_metadata, layer, duplicates, session_id,
-                    group_id=group_id, group_order=i))
+                    group_id=group_id, group_order=i, user_id=user_id))
 
     except errors.AfterglowError:
         raise
@@ -620,7 +778,7 @@ def import_data_file(adb, root: str, provider_id: Optional[Union[int, str]],
             all_data_files.append(create_data_file(
                 adb, name, root, data[::-1], hdr, provider_id, asset_path,
                 asset_metadata, layer, duplicates, session_id,
-                group_id=group_id, group_order=i))
+                group_id=group_id, group_order=i, user_id=user_id))
 
     return all_data_files
 
@@ -654,6 +812,7 @@ def convert_exif_field(val):
     return str(val)
 
 
+@job_phase('load')
 def get_subframe(user_id: Optional[int], file_id: int,
                  x0: Optional[int] = None, y0: Optional[int] = None,
                  w: Optional[int] = None, h: Optional[int] = None) \
@@ -673,12 +832,16 @@ def get_subframe(user_id: Optional[int], file_id: int,
     :return: NumPy float32 array containing image data within the specified
         region
     """
-    data = get_data_file_data(user_id, file_id)[0]
-    is_image = data.dtype.fields is None
+    fits = get_data_file_fits(user_id, file_id)
+    hdu = get_data_file_hdu(fits)
+    is_image = hdu.is_image
     if is_image:
-        height, width = data.shape
+        # Don't load the whole image, just get the dimensions
+        height, width = hdu.shape
+        data = None
     else:
         # FITS table
+        data = hdu.data
         width = len(data.dtype.fields)
         height = len(data)
 
@@ -730,7 +893,25 @@ def get_subframe(user_id: Optional[int], file_id: int,
             'height', 'Height must be a positive integer')
 
     if is_image:
-        return data[y0:y0+h, x0:x0+w]
+        # Read only the requested region; for tile-compressed images, this only
+        # decompresses the tiles overlapping the region
+        try:
+            data = hdu.section[y0:y0+h, x0:x0+w]
+        except AttributeError:
+            # Older Astropy versions have no CompImageHDU.section
+            data = hdu.data[y0:y0+h, x0:x0+w]
+        data = numpy.asarray(data, numpy.float32)
+        try:
+            mask_hdu = fits['MASK']
+        except KeyError:
+            pass
+        else:
+            try:
+                mask = mask_hdu.section[y0:y0+h, x0:x0+w]
+            except AttributeError:
+                mask = mask_hdu.data[y0:y0+h, x0:x0+w]
+            data = numpy.ma.masked_array(data, numpy.asarray(mask, bool))
+        return data
 
     # For tables, convert Astropy FITS table to NumPy structured array and
     # extract the required range of columns, then the required range of rows
@@ -738,18 +919,22 @@ def get_subframe(user_id: Optional[int], file_id: int,
     return data[list(data.dtype.names[x0:x0+w])][y0:y0+h]
 
 
-def get_data_file_path(user_id: Optional[int], file_id: int) -> str:
+def get_data_file_path(user_id: Optional[int], file_id: int,
+                       ext: str = 'fits') -> str:
     """
     Return data file path on disk
 
     :param int | None user_id: current user ID (None if user auth is disabled)
     :param int file_id: data file ID
+    :param str ext: data file extension: "fits" (default) for the data file
+        itself, or the sidecar file extension, e.g. "fits.hist"
 
     :return: path to data file
     """
-    return os.path.join(get_root(user_id), '{}.fits'.format(file_id))
+    return get_data_file_path_in_root(get_root(user_id), file_id, ext)
 
 
+@job_phase('load')
 def get_data_file_fits(user_id: Optional[int], file_id: int,
                        mode: str = 'readonly') -> pyfits.HDUList:
     """
@@ -767,7 +952,52 @@ def get_data_file_fits(user_id: Optional[int], file_id: int,
         raise UnknownDataFileError(id=file_id)
 
 
-def get_data_file_data(user_id: Optional[int], file_id: int) \
+def get_data_file_hdu(fits: pyfits.HDUList):
+    """
+    Return the HDU of a data file FITS that holds the image or table data and
+    the associated header: the primary HDU for uncompressed images and the
+    first extension HDU for tables and tile-compressed images
+
+    :param fits: FITS file object returned by :func:`get_data_file_fits`
+
+    :return: FITS HDU object
+    """
+    if len(fits) > 1 and not fits[0].header.get('NAXIS'):
+        return fits[1]
+    return fits[0]
+
+
+@contextmanager
+def update_data_file_header(user_id: Optional[int], file_id: int) \
+        -> Iterator[pyfits.Header]:
+    """
+    Context manager for modifying data file header in place:
+
+        with update_data_file_header(user_id, file_id) as hdr:
+            hdr['KEYWORD'] = value
+
+    New cards occupy the blank cards reserved by :func:`save_data_file`, so
+    normally only the header is rewritten on exit. If the reserve is exhausted,
+    the whole file is rewritten once, and the reserve is replenished.
+
+    :param user_id: current user ID (None if user auth is disabled)
+    :param file_id: data file ID
+
+    :return: iterator yielding the data file header
+    """
+    with get_data_file_fits(user_id, file_id, 'update') as fits:
+        hdr = get_data_file_hdu(fits).header
+        # Number of 2880-byte header blocks, including the END card
+        blocks = len(hdr)//36 + 1
+        yield hdr
+        if len(hdr)//36 + 1 > blocks:
+            # The file is going to be rewritten anyway; refill the reserve
+            reserve_header_space(hdr)
+
+
+@job_phase('load')
+def get_data_file_data(user_id: Optional[int], file_id: int,
+                       as_float: bool = True) \
         -> Tuple[Union[numpy.ndarray, numpy.ma.MaskedArray], pyfits.Header]:
     """
     Return FITS file data and header for a data file with the given ID; handles
@@ -775,32 +1005,34 @@ def get_data_file_data(user_id: Optional[int], file_id: int) \
 
     :param user_id: current user ID (None if user auth is disabled)
     :param file_id: data file ID
+    :param as_float: convert integer image data to float32; set to False if
+        the caller can handle the native integer data type the image is stored
+        in, e.g. for raw frames
 
     :return: tuple (data, hdr); if the underlying FITS file contains a mask in
         an extra image HDU, it is converted into a :class:`numpy.ma.MaskedArray`
         instance
     """
     fits = get_data_file_fits(user_id, file_id)
+    hdu = get_data_file_hdu(fits)
 
-    if fits[0].data is None:
-        # Table stored in extension HDU
-        data = fits[1].data
-    elif fits[0].data.dtype.fields is None:
-        # Image stored in the primary HDU, with an optional mask
-        if len(fits) == 1:
-            # Normal image data
-            data = fits[0].data
+    data = hdu.data
+    if data.dtype.fields is None:
+        # Image with an optional mask
+        if as_float and data.dtype.kind in ('i', 'u'):
+            data = data.astype(numpy.float32)
+        try:
+            mask = fits['MASK'].data
+        except KeyError:
+            pass
         else:
             # Masked data
-            data = numpy.ma.masked_array(
-                fits[0].data, fits[1].data.astype(bool))
-    else:
-        # Table data in the primary HDU (?)
-        data = fits[0].data
+            data = numpy.ma.masked_array(data, mask.astype(bool))
 
-    return data, fits[0].header
+    return data, hdu.header
 
 
+@job_phase('load')
 def get_data_file_uint8(user_id: Optional[int], file_id: int) -> numpy.ndarray:
     """
     Return image file data array scaled to 8-bit unsigned integer format
@@ -823,6 +1055,7 @@ def get_data_file_uint8(user_id: Optional[int], file_id: int) -> numpy.ndarray:
     return data
 
 
+@job_phase('load')
 def get_data_file_bytes(user_id: Optional[int], file_id: int,
                         fmt: str = 'FITS') -> bytes:
     """
@@ -880,14 +1113,21 @@ def get_data_file_group_bytes(user_id: Optional[int], group_id: str,
     if fmt == 'FITS':
         # Assemble individual single-HDU data files into a single multi-HDU FITS
         fits = pyfits.HDUList()
-        for file_id, hdu_type in data_files:
-            with open(get_data_file_path(user_id, file_id), 'rb') as f:
-                data = f.read()
-            if hdu_type == 'image':
-                fits.append(pyfits.ImageHDU.fromstring(data))
-            else:
-                fits.append(pyfits.BinTableHDU.fromstring(data))
-        fits.writeto(buf, output_verify='silentfix')
+        files = []
+        try:
+            for file_id, hdu_type in data_files:
+                f = get_data_file_fits(user_id, file_id)
+                files.append(f)
+                hdu = get_data_file_hdu(f)
+                if hdu_type == 'image':
+                    # Also decompresses tile-compressed images
+                    fits.append(pyfits.ImageHDU(hdu.data, hdu.header))
+                else:
+                    fits.append(pyfits.BinTableHDU(hdu.data, hdu.header))
+            fits.writeto(buf, output_verify='silentfix')
+        finally:
+            for f in files:
+                f.close()
     elif PILImage is None:
         raise DataFileExportError(reason='Server does not support image export')
     else:
@@ -1145,7 +1385,7 @@ def import_data_files(user_id: Optional[int], session_id: Optional[int] = None,
 
             all_data_files.append(create_data_file(
                 adb, name, root, data, duplicates='append',
-                session_id=session_id))
+                session_id=session_id, user_id=user_id))
         elif provider_id is None:
             # Data file upload: get from multipart/form-data; use filename
             # for the 2nd and subsequent files or if the "name" parameter
@@ -1156,7 +1396,8 @@ def import_data_files(user_id: Optional[int], session_id: Optional[int] = None,
                 all_data_files += import_data_file(
                     adb, root, None, None, {}, BytesIO(file.read()),
                     filename if i else name or filename,
-                    duplicates='append', session_id=session_id)
+                    duplicates='append', session_id=session_id,
+                    user_id=user_id)
         else:
             # Import data file
             if path is None:
@@ -1183,7 +1424,8 @@ def import_data_files(user_id: Optional[int], session_id: Optional[int] = None,
                 return import_data_file(
                     adb, root, provider_id, asset.path, asset.metadata,
                     BytesIO(provider.get_asset_data(asset.path)),
-                    asset.name, duplicates, session_id=session_id)
+                    asset.name, duplicates, session_id=session_id,
+                    user_id=user_id)
 
             if not isinstance(path, list):
                 try:
@@ -1327,9 +1569,12 @@ def delete_data_file(user_id: Optional[int], id: int) -> None:
         adb.rollback()
         raise
 
-    for filename in glob(os.path.join(root, '{}.*'.format(id))):
+    for ext in data_file_extensions:
+        filename = get_data_file_path_in_root(root, id, ext)
         try:
             os.remove(filename)
+        except FileNotFoundError:
+            pass
         except Exception as e:
             # noinspection PyUnresolvedReferences
             app.logger.warning(
@@ -1388,12 +1633,13 @@ def create_session(user_id: Optional[int], session: Session) -> Session:
     if adb.query(DbSession).filter(DbSession.name == session.name).count():
         raise DuplicateSessionNameError(name=session.name)
 
-    # Ignore session ID if provided
+    # Ignore session ID and version if provided
     kw = session.to_dict()
-    try:
-        del kw['id']
-    except KeyError:
-        pass
+    for name in ('id', 'version'):
+        try:
+            del kw[name]
+        except KeyError:
+            pass
 
     if not kw.get('name'):
         raise errors.MissingFieldError('name')
@@ -1419,7 +1665,8 @@ def update_session(user_id: Optional[int], session_id: int,
 
     :param user_id: current user ID (None if user auth is disabled)
     :param session_id: session ID to update
-    :param session: session object containing updated parameters
+    :param session: session object containing updated parameters; if it
+        includes version, the session must not have been modified since then
 
     :return: updated session object
     """
@@ -1433,13 +1680,23 @@ def update_session(user_id: Optional[int], session_id: int,
         if key == 'id':
             # Don't allow changing session ID
             continue
+        if key == 'version':
+            # Version is maintained by the server; only check it
+            if val is not None and val != db_session.version:
+                raise SessionVersionConflictError(
+                    id=session_id, version=db_session.version)
+            continue
         if key == 'name' and val != db_session.name and adb.query(
                 DbSession).filter(DbSession.name == val).count():
             raise DuplicateSessionNameError(name=val)
         setattr(db_session, key, val)
     try:
+        adb.flush()
         session = Session(db_session)
         adb.commit()
+    except StaleDataError:
+        adb.rollback()
+        raise SessionVersionConflictError(id=session_id)
     except Exception:
         adb.rollback()
         raise
@@ -1447,6 +1704,200 @@ def update_session(user_id: Optional[int], session_id: int,
     return session
 
 
+def split_json_pointer(pointer: str) -> TList[str]:
+    """
+    Split JSON pointer (RFC 6901) into reference tokens
+
+    :param pointer: JSON pointer string, e.g. "/a/b~1c/0"
+
+    :return: list of unescaped tokens; empty list refers to the whole document
+    """
+    if not pointer:
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError('Invalid JSON pointer "{}"'.format(pointer))
+    return [token.replace('~1', '/').replace('~0', '~')
+            for token in pointer[1:].split('/')]
+
+
+def json_list_index(container: list, token: str, insert: bool = False) -> int:
+    """
+    Convert JSON pointer reference token to array index
+
+    :param container: array being indexed
+    :param token: reference token
+    :param insert: allow index equal to array length and "-" (append)
+
+    :return: array index
+    """
+    if insert and token == '-':
+        return len(container)
+    if not token.isdigit() or len(token) > 1 and token[0] == '0':
+        raise ValueError('Invalid array index "{}"'.format(token))
+    i = int(token)
+    if i > len(container) or i == len(container) and not insert:
+        raise IndexError('Array index {} out of range'.format(i))
+    return i
+
+
+def apply_json_patch(doc, patch: list):
+    """
+    Apply JSON Patch (RFC 6902) to a JSON document
+
+    :param doc: JSON document (deserialized); not modified
+    :param patch: list of JSON Patch operations
+
+    :return: patched document
+    """
+    doc = copy.deepcopy(doc)
+
+    def get(tokens):
+        target = doc
+        for token in tokens:
+            if isinstance(target, list):
+                target = target[json_list_index(target, token)]
+            else:
+                target = target[token]
+        return target
+
+    def add(tokens, value):
+        nonlocal doc
+        if not tokens:
+            doc = value
+            return
+        parent = get(tokens[:-1])
+        if isinstance(parent, list):
+            parent.insert(json_list_index(parent, tokens[-1], True), value)
+        else:
+            parent[tokens[-1]] = value
+
+    def remove(tokens):
+        nonlocal doc
+        if not tokens:
+            value, doc = doc, None
+            return value
+        parent = get(tokens[:-1])
+        if isinstance(parent, list):
+            return parent.pop(json_list_index(parent, tokens[-1]))
+        return parent.pop(tokens[-1])
+
+    if not isinstance(patch, list):
+        raise ValueError('JSON Patch must be an array of operations')
+    for op in patch:
+        if not isinstance(op, dict):
+            raise ValueError('JSON Patch operation must be an object')
+        name = op.get('op')
+        path = split_json_pointer(op.get('path', ''))
+        if name == 'add':
+            add(path, op['value'])
+        elif name == 'remove':
+            remove(path)
+        elif name == 'replace':
+            remove(path)
+            add(path, op['value'])
+        elif name == 'move':
+            add(path, remove(split_json_pointer(op['from'])))
+        elif name == 'copy':
+            add(path, copy.deepcopy(get(split_json_pointer(op['from']))))
+        elif name == 'test':
+            if get(path) != op['value']:
+                raise ValueError('Test failed for path "{}"'.format(
+                    op.get('path', '')))
+        else:
+            raise ValueError('Unknown JSON Patch operation "{}"'.format(name))
+
+    return doc
+
+
+def apply_merge_patch(doc, patch):
+    """
+    Apply JSON Merge Patch (RFC 7396) to a JSON document
+
+    :param doc: JSON document (deserialized); not modified
+    :param patch: merge patch
+
+    :return: patched document
+    """
+    if not isinstance(patch, dict):
+        return patch
+    if isinstance(doc, dict):
+        doc = dict(doc)
+    else:
+        doc = {}
+    for key, val in patch.items():
+        if val is None:
+            doc.pop(key, None)
+        else:
+            doc[key] = apply_merge_patch(doc.get(key), val)
+    return doc
+
+
+def patch_session(user_id: Optional[int], session_id: int, patch,
+                  patch_type: str = 'merge', version: Optional[int] = None) \
+        -> Session:
+    """
+    Update the existing session data, which must be a JSON document, by
+    applying a patch to it
+
+    Clients that update large session data frequently should send patches
+    instead of the whole data via :func:`update_session`. The patch is applied
+    and stored in a single transaction; the data is not written at all if the
+    patch does not change it.
+
+    :param user_id: current user ID (None if user auth is disabled)
+    :param session_id: session ID to update
+    :param patch: deserialized JSON Merge Patch (RFC 7396) or JSON Patch
+        (RFC 6902)
+    :param patch_type: "merge" (default) for JSON Merge Patch or "json" for
+        JSON Patch
+    :param version: if set, the session must not have been modified since
+        the given version
+
+    :return: updated session object
+    """
+    adb = get_data_file_db(user_id)
+
+    db_session = adb.query(DbSession).get(session_id)
+    if db_session is None:
+        raise UnknownSessionError(id=session_id)
+    if version is not None and version != db_session.version:
+        raise SessionVersionConflictError(
+            id=session_id, version=db_session.version)
+
+    try:
+        data = json.loads(db_session.data) if db_session.data else {}
+    except ValueError:
+        raise CannotPatchSessionDataError(
+            reason='Session data is not a JSON document')
+    try:
+        if patch_type == 'merge':
+            new_data = apply_merge_patch(data, patch)
+        elif patch_type == 'json':
+            new_data = apply_json_patch(data, patch)
+        else:
+            raise ValueError('Unknown patch type "{}"'.format(patch_type))
+    except Exception as e:
+        raise CannotPatchSessionDataError(
+            reason=', '.join(str(arg) for arg in e.args) if e.args else str(e))
+
+    if new_data != data:
+        try:
+            db_session.data = json.dumps(new_data, separators=(',', ':'))
+            adb.flush()
+            session = Session(db_session)
+            adb.commit()
+        except StaleDataError:
+            adb.rollback()
+            raise SessionVersionConflictError(id=session_id)
+        except Exception:
+            adb.rollback()
+            raise
+    else:
+        session = Session(db_session)
+
+    return session
+
+
 def delete_session(user_id: Optional[int], session_id: int) -> None:
     """
     Delete session with the given ID
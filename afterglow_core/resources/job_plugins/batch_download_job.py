@@ -2,25 +2,150 @@
 Afterglow Core: data file and data provider asset batch download job plugins
 """
 
-from io import BytesIO
-from zipfile import ZIP_DEFLATED, ZipFile
-from typing import List as TList
+import os
+import time
+import shutil
+import tempfile
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+from typing import Callable, List as TList, Tuple, Union
 
 from marshmallow.fields import Integer, List, String
 
+from ... import app
 from ...models import Job
 from ...errors import MissingFieldError, ValidationError
-from ...errors.data_file import UnknownDataFileGroupError
+from ...errors.data_file import UnknownDataFileError, UnknownDataFileGroupError
 from ...errors.data_provider import (
     NonBrowseableDataProviderError, UnknownDataProviderError)
 from ..data_files import (
-    get_data_file, get_data_file_bytes, get_data_file_group, get_data_file_path)
+    get_data_file, get_data_file_compression, get_data_file_group,
+    get_data_file_path)
 from ..data_providers import providers
 
 
 __all__ = ['BatchDownloadJob', 'BatchAssetDownloadJob']
 
 
+# Extensions of files that are already compressed and are stored in archives
+# as is
+COMPRESSED_EXTENSIONS = {
+    '7z', 'bz2', 'fz', 'gif', 'gz', 'jpeg', 'jpg', 'mp4', 'png', 'rar', 'tgz',
+    'webp', 'xz', 'z', 'zip',
+}
+
+# Size of chunks in which data are read and compressed
+CHUNK_SIZE = 1 << 20
+
+
+def is_compressed(filename: str) -> bool:
+    """
+    Is the given file already compressed?
+
+    :param filename: file name
+
+    :return: True if file extension is one of :data:`COMPRESSED_EXTENSIONS`
+    """
+    return os.path.splitext(filename)[1][1:].lower() in COMPRESSED_EXTENSIONS
+
+
+def fetch_entry(source: Callable[[], bytes]) -> tempfile.TemporaryFile:
+    """
+    Retrieve the data of a single archive entry; run in a thread pool so that
+    multiple entries are retrieved in parallel while the archive is being
+    written
+
+    :param source: callable returning the entry data
+
+    :return: temporary file containing the entry data
+    """
+    data = source()
+    out = tempfile.TemporaryFile()
+    try:
+        out.write(data)
+        out.seek(0)
+    except Exception:
+        out.close()
+        raise
+    return out
+
+
+def write_entry(zf: ZipFile, name: str, data: tempfile.TemporaryFile,
+                compress_type: int) -> None:
+    """
+    Append an entry retrieved by :func:`fetch_entry` to the archive
+
+    :param zf: archive opened for writing
+    :param name: entry name within the archive
+    :param data: temporary file with the entry data; closed on return
+    :param compress_type: ZIP_STORED or ZIP_DEFLATED
+    """
+    with data:
+        zinfo = ZipInfo(name, time.localtime(time.time())[:6])
+        zinfo.external_attr = 0o600 << 16
+        zinfo.compress_type = compress_type
+        # Setting the size in advance lets ZipFile use the ZIP64 format when
+        # needed
+        zinfo.file_size = data.seek(0, os.SEEK_END)
+        data.seek(0)
+        with zf.open(zinfo, 'w') as dst:
+            shutil.copyfileobj(data, dst, CHUNK_SIZE)
+
+
+def write_archive(job: Job, f,
+                  entries: TList[Tuple[str, Union[str, Callable[[], bytes]],
+                                       bool, str]]) -> None:
+    """
+    Write a ZIP archive to a file entry by entry; already compressed entries
+    are stored as is, and the data of entries that are not files on disk are
+    retrieved in parallel ahead of writing them
+
+    :param job: job creating the archive; used to report progress and errors
+    :param f: output file object
+    :param entries: list of archive entries (name, source, compressed, label),
+        where `source` is a path to the file on disk or a callable returning
+        the entry data, `compressed` = True means that the data are already
+        compressed, and `label` is used in error messages
+    """
+    num_threads = app.config.get('JOB_ZIP_THREADS') or os.cpu_count() or 1
+    with ZipFile(f, 'w', ZIP_DEFLATED) as zf, \
+            ThreadPoolExecutor(num_threads) as executor:
+        # Submit entries for retrieval ahead of writing them, keeping a
+        # bounded number of them in flight to limit temporary storage usage
+        pending = deque()
+        it = iter(entries)
+
+        def submit() -> None:
+            for entry in it:
+                source = entry[1]
+                if isinstance(source, str):
+                    pending.append((entry, None))
+                else:
+                    pending.append(
+                        (entry, executor.submit(fetch_entry, source)))
+                if len(pending) >= 2*num_threads:
+                    break
+
+        submit()
+        entry_no = 0
+        while pending:
+            (name, source, compressed, label), future = pending.popleft()
+            compress_type = ZIP_STORED if compressed else ZIP_DEFLATED
+            try:
+                if future is None:
+                    zf.write(source, name, compress_type)
+                else:
+                    write_entry(zf, name, future.result(), compress_type)
+            except Exception as e:
+                job.add_error('{}: {}'.format(label, e))
+            submit()
+
+            entry_no += 1
+            job.update_progress(entry_no/len(entries)*100)
+
+
 class BatchDownloadJob(Job):
     """
     Data file batch download job
@@ -37,9 +162,13 @@ class BatchDownloadJob(Job):
 
         if len(self.file_ids) == 1 and not self.group_ids:
             # Single data file; don't create archive
-            self.create_job_file(
-                'download', get_data_file_bytes(self.user_id, self.file_ids[0]),
-                mimetype='image/fits')
+            try:
+                src = open(
+                    get_data_file_path(self.user_id, self.file_ids[0]), 'rb')
+            except Exception:
+                raise UnknownDataFileError(id=self.file_ids[0])
+            with src, self.open_job_file('download', 'image/fits') as f:
+                shutil.copyfileobj(src, f, CHUNK_SIZE)
             return
 
         # Collect data files in groups
@@ -74,34 +203,26 @@ class BatchDownloadJob(Job):
                 filenames[i] = filename
 
         # Add single-file groups to the archive as individual files at top
-        # level, multi-file groups as directories
-        data = BytesIO()
-        with ZipFile(data, 'w', ZIP_DEFLATED) as zf:
-            for file_no, (file_ids, filename) in enumerate(
-                    zip(file_id_lists, filenames)):
-                if len(file_ids) == 1:
-                    file_id = file_ids[0]
-                    try:
-                        zf.write(
-                            get_data_file_path(self.user_id, file_id), filename)
-                    except Exception as e:
-                        self.add_error(
-                            'Data file ID {} ({}): {}'.format(
-                                file_id, filename, e))
-                else:
-                    for i, file_id in enumerate(file_ids):
-                        try:
-                            zf.write(
-                                get_data_file_path(self.user_id, file_id),
-                                filename + '/' + filename + '.' + str(i + 1))
-                        except Exception as e:
-                            self.add_error(
-                                'Data file ID {} ({}): {}'.format(
-                                    file_id, filename, e))
-
-                self.update_progress((file_no + 1)/len(filenames)*100)
+        # level, multi-file groups as directories; tile-compressed data files
+        # are stored as is
+        compressed = bool(get_data_file_compression(self.user_id))
+        entries = []
+        for file_ids, filename in zip(file_id_lists, filenames):
+            for i, file_id in enumerate(file_ids):
+                try:
+                    path = get_data_file_path(self.user_id, file_id)
+                except Exception as e:
+                    self.add_error(
+                        'Data file ID {} ({}): {}'.format(file_id, filename, e))
+                    continue
+                entries.append((
+                    filename if len(file_ids) == 1
+                    else filename + '/' + filename + '.' + str(i + 1),
+                    path, compressed or is_compressed(filename),
+                    'Data file ID {} ({})'.format(file_id, filename)))
 
-        self.create_job_file('download', data.getvalue(), 'application/zip')
+        with self.open_job_file('download', 'application/zip') as f:
+            write_archive(self, f, entries)
 
 
 class BatchAssetDownloadJob(Job):
@@ -147,21 +268,15 @@ class BatchAssetDownloadJob(Job):
         if len(assets) == 1:
             # Single non-collection asset; don't create archive
             asset = assets[0][0]
-            self.create_job_file(
-                'download', provider.get_asset_data(asset.path),
-                mimetype=asset.mimetype)
+            data = provider.get_asset_data(asset.path)
+            with self.open_job_file('download', asset.mimetype) as f:
+                f.write(data)
             return
 
-        # Add asset to archive
-        data = BytesIO()
-        with ZipFile(data, 'w', ZIP_DEFLATED) as zf:
-            for file_no, (asset, filename) in enumerate(assets):
-                try:
-                    zf.writestr(filename, provider.get_asset_data(asset.path))
-                except Exception as e:
-                    self.add_error(
-                        'Asset "{}": {}'.format(asset.path, e))
-
-                self.update_progress((file_no + 1)/len(assets)*100)
-
-        self.create_job_file('download', data.getvalue(), 'application/zip')
+        # Add assets to archive; asset data are retrieved by the worker
+        # threads
+        with self.open_job_file('download', 'application/zip') as f:
+            write_archive(self, f, [
+                (filename, partial(provider.get_asset_data, asset.path),
+                 is_compressed(filename), 'Asset "{}"'.format(asset.path))
+                for asset, filename in assets])
@@ -43,53 +43,67 @@ class BatchImportJob(Job):
     session_id: int = Integer(default=None)
 
     def run(self):
+        # Import assets in parallel, one subtask per settings item
+        self.result.file_ids = sum(
+            [file_ids or [] for file_ids in self.run_subtasks(
+                'import_asset', list(range(len(self.settings))))], [])
+
+    def import_asset(self, i: int) -> TList[int]:
+        """
+        Batch import subtask: import the data file(s) specified by a single
+        settings item
+
+        :param i: 0-based index of the item in settings
+
+        :return: list of imported data file IDs; empty on error
+        """
+        settings = self.settings[i]
+        file_ids = []
         adb = get_data_file_db(self.user_id)
         try:
-            nfiles = len(self.settings)
             root = get_root(self.user_id)
-            for i, settings in enumerate(self.settings):
-                try:
-                    asset_path = settings.path
+            try:
+                asset_path = settings.path
 
+                try:
+                    provider = providers[settings.provider_id]
+                except KeyError:
+                    raise UnknownDataProviderError(id=settings.provider_id)
+
+                def recursive_import(path, depth=0):
+                    asset = provider.get_asset(path)
+                    if asset.collection:
+                        if not provider.browseable:
+                            raise CannotImportFromCollectionAssetError(
+                                provider_id=provider.id, path=path)
+                        if not settings.recurse and depth:
+                            return []
+                        return sum(
+                            [recursive_import(child_asset.path, depth + 1)
+                             for child_asset in provider.get_child_assets(
+                                asset.path)], [])
+                    return [f.id for f in import_data_file(
+                        adb, root, provider.id, asset.path, asset.metadata,
+                        BytesIO(provider.get_asset_data(asset.path)),
+                        asset.name, settings.duplicates,
+                        session_id=self.session_id, user_id=self.user_id)]
+
+                if not isinstance(asset_path, list):
                     try:
-                        provider = providers[settings.provider_id]
-                    except KeyError:
-                        raise UnknownDataProviderError(id=settings.provider_id)
-
-                    def recursive_import(path, depth=0):
-                        asset = provider.get_asset(path)
-                        if asset.collection:
-                            if not provider.browseable:
-                                raise CannotImportFromCollectionAssetError(
-                                    provider_id=provider.id, path=path)
-                            if not settings.recurse and depth:
-                                return []
-                            return sum(
-                                [recursive_import(child_asset.path, depth + 1)
-                                 for child_asset in provider.get_child_assets(
-                                    asset.path)], [])
-                        return [f.id for f in import_data_file(
-                            adb, root, provider.id, asset.path, asset.metadata,
-                            BytesIO(provider.get_asset_data(asset.path)),
-                            asset.name, settings.duplicates,
-                            session_id=self.session_id)]
-
+                        asset_path = json.loads(asset_path)
+                    except ValueError:
+                        pass
                     if not isinstance(asset_path, list):
-                        try:
-                            asset_path = json.loads(asset_path)
-                        except ValueError:
-                            pass
-                        if not isinstance(asset_path, list):
-                            asset_path = [asset_path]
-
-                    self.result.file_ids += sum(
-                        [recursive_import(p) for p in asset_path], [])
-                except Exception as e:
-                    self.add_error('Data file #{}: {}'.format(i + 1, e))
-                finally:
-                    self.update_progress((i + 1)/nfiles*100)
-
-            if self.result.file_ids:
-                adb.commit()
+                        asset_path = [asset_path]
+
+                file_ids = sum([recursive_import(p) for p in asset_path], [])
+            except Exception as e:
+                self.add_error('Data file #{}: {}'.format(i + 1, e))
+
+            # Like with sequential import, keep the files imported before
+            # an error
+            adb.commit()
         finally:
             adb.remove()
+
+        return file_ids
@@ -12,7 +12,7 @@ from astropy.wcs import WCS
 from ...models import Job, JobResult, CatalogSource
 from ...schemas import Float
 from ..catalogs import catalogs as known_catalogs
-from ..data_files import get_data_file_fits
+from ..data_files import get_data_file_fits, get_data_file_hdu
 
 
 __all__ = ['CatalogQueryJob', 'run_catalog_query_job']
@@ -126,7 +126,8 @@ def run_catalog_query_job(job: Job, catalogs: TList[str],
     # overlap
     wcs_list = []
     for file_id in file_ids:
-        hdr = get_data_file_fits(job.user_id, file_id)[0].header
+        hdr = get_data_file_hdu(
+            get_data_file_fits(job.user_id, file_id)).header
         try:
             wcs = WCS(hdr)
         except Exception:
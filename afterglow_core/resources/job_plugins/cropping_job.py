@@ -18,7 +18,7 @@ from ..data_files import (
     save_data_file)
 
 
-__all__ = ['CroppingJob', 'run_cropping_job']
+__all__ = ['CroppingJob', 'crop_data_file', 'run_cropping_job']
 
 
 def max_rectangle(histogram: ndarray) -> Tuple[int, int, int]:
@@ -68,7 +68,7 @@ def get_auto_crop(user_id: int, file_ids: TList[int]) \
 
     # Obtain the combined mask
     for file_id in file_ids:
-        data = get_data_file_data(user_id, file_id)[0]
+        data = get_data_file_data(user_id, file_id, as_float=False)[0]
         if width is None:
             height, width = data.shape
         elif data.shape != (height, width):
@@ -113,6 +113,9 @@ def run_cropping_job(job: Job,
     """
     Image cropping job body; also used during alignment
 
+    Files are cropped by job subtasks, so the job class must define
+    the `crop_file` method calling :func:`crop_data_file`.
+
     :param job: job class instance
     :param settings: cropping settings
     :param job_file_ids: data file IDs to process
@@ -158,75 +161,85 @@ def run_cropping_job(job: Job,
         # data files
         return job_file_ids
 
+    # Crop all data files in parallel; see CroppingJob.crop_file()
+    margins = (left, right, top, bottom)
+    return [
+        file_id
+        for file_id in job.run_subtasks(
+            'crop_file',
+            [(file_id, margins, inplace) for file_id in job_file_ids])
+        if file_id is not None]
+
+
+def crop_data_file(job: Job, file_id: int,
+                   margins: Tuple[int, int, int, int],
+                   inplace: bool = False) -> Optional[int]:
+    """
+    Crop a single data file and adjust its WCS; the body of the cropping
+    subtask run by :func:`run_cropping_job`
+
+    :param job: job class instance
+    :param file_id: data file ID
+    :param margins: cropping margins (left, right, top, bottom)
+    :param inplace: crop in place instead of creating a new data file
+
+    :return: generated/modified data file ID or None on error
+    """
+    left, right, top, bottom = margins
     adb = get_data_file_db(job.user_id)
     try:
-        # Crop all data files and adjust WCS
-        new_file_ids = []
-        for i, file_id in enumerate(job_file_ids):
-            try:
-                data, hdr = get_data_file_data(job.user_id, file_id)
-                if any([left, right, top, bottom]):
-                    data = data[bottom:-(top + 1), left:-(right + 1)]
-                    hdr.add_history(
-                        'Cropped with margins: left={}, right={}, top={}, '
-                        'bottom={}'.format(left, right, top, bottom))
-
-                    # Move CRPIXn if present
-                    if left:
-                        try:
-                            hdr['CRPIX1'] -= left
-                        except (KeyError, ValueError):
-                            pass
-                    if bottom:
-                        try:
-                            hdr['CRPIX2'] -= bottom
-                        except (KeyError, ValueError):
-                            pass
-
-                    if inplace:
-                        try:
-                            # Overwrite the original data file
-                            save_data_file(
-                                adb, get_root(job.user_id), file_id, data, hdr)
-                            adb.commit()
-                        except Exception:
-                            adb.rollback()
-                            raise
-                    else:
-                        hdr.add_history(
-                            'Original data file ID: {:d}'.format(file_id))
-                        try:
-                            file_id = create_data_file(
-                                adb, None, get_root(job.user_id), data, hdr,
-                                duplicates='append',
-                                session_id=job.session_id).id
-                            adb.commit()
-                        except Exception:
-                            adb.rollback()
-                            raise
-                elif not inplace:
-                    # Merely duplicate the original data file
-                    try:
-                        hdr.add_history(
-                            'Original data file ID: {:d}'.format(file_id))
-                        file_id = create_data_file(
-                            adb, None, get_root(job.user_id), data, hdr,
-                            duplicates='append', session_id=job.session_id).id
-                        adb.commit()
-                    except Exception:
-                        adb.rollback()
-                        raise
-
-                new_file_ids.append(file_id)
-            except Exception as e:
-                job.add_error('Data file ID {}: {}'.format(job_file_ids[i], e))
-            finally:
-                job.update_progress((i + 1)/len(job_file_ids)*100)
+        data, hdr = get_data_file_data(job.user_id, file_id, as_float=False)
+        if any([left, right, top, bottom]):
+            data = data[bottom:-(top + 1), left:-(right + 1)]
+            hdr.add_history(
+                'Cropped with margins: left={}, right={}, top={}, '
+                'bottom={}'.format(left, right, top, bottom))
+
+            # Move CRPIXn if present
+            if left:
+                try:
+                    hdr['CRPIX1'] -= left
+                except (KeyError, ValueError):
+                    pass
+            if bottom:
+                try:
+                    hdr['CRPIX2'] -= bottom
+                except (KeyError, ValueError):
+                    pass
+
+            if inplace:
+                try:
+                    # Overwrite the original data file
+                    save_data_file(
+                        adb, get_root(job.user_id), file_id, data, hdr,
+                        user_id=job.user_id)
+                    adb.commit()
+                except Exception:
+                    adb.rollback()
+                    raise
+                return file_id
+
+        elif inplace:
+            return file_id
+
+        # Create a new cropped data file or merely duplicate the original one
+        hdr.add_history('Original data file ID: {:d}'.format(file_id))
+        try:
+            new_file_id = create_data_file(
+                adb, None, get_root(job.user_id), data, hdr,
+                duplicates='append', session_id=job.session_id,
+                user_id=job.user_id).id
+            adb.commit()
+        except Exception:
+            adb.rollback()
+            raise
+        return new_file_id
+    except Exception as e:
+        job.add_error('Data file ID {}: {}'.format(file_id, e))
+        return None
     finally:
         adb.remove()
 
-    return new_file_ids
-
 
 class CroppingSettings(AfterglowSchema):
     left: int = Integer(default=0)
@@ -254,3 +267,14 @@ class CroppingJob(Job):
     def run(self):
         self.result.file_ids = run_cropping_job(
             self, self.settings, getattr(self, 'file_ids', []), self.inplace)
+
+    def crop_file(self, item: Tuple[int, Tuple[int, int, int, int], bool]) \
+            -> Optional[int]:
+        """
+        Cropping subtask: crop a single data file
+
+        :param item: data file ID, cropping margins, and in-place flag
+
+        :return: generated/modified data file ID or None on error
+        """
+        return crop_data_file(self, *item)
@@ -11,7 +11,9 @@ from astropy.wcs import WCS
 
 from ...models import (
     Job, JobResult, FieldCal, FieldCalResult, Mag, PhotSettings)
-from ..data_files import get_data_file_fits, get_image_time
+from ..data_files import (
+    get_data_file_fits, get_data_file_hdu, get_image_time,
+    update_data_file_header)
 from ..field_cals import get_field_cal
 from ..catalogs import catalogs as known_catalogs
 from .catalog_query_job import run_catalog_query_job
@@ -126,7 +128,8 @@ class FieldCalJob(Job):
                             try:
                                 with get_data_file_fits(
                                         self.user_id, file_id) as f:
-                                    epoch = get_image_time(f[0].header)
+                                    epoch = get_image_time(
+                                        get_data_file_hdu(f).header)
                             except Exception:
                                 epoch = None
                             epochs[file_id] = epoch
@@ -137,7 +140,7 @@ class FieldCalJob(Job):
                             try:
                                 with get_data_file_fits(
                                         self.user_id, file_id) as f:
-                                    wcs = WCS(f[0].header)
+                                    wcs = WCS(get_data_file_hdu(f).header)
                                     if not wcs.has_celestial:
                                         wcs = None
                             except Exception:
@@ -217,7 +220,8 @@ class FieldCalJob(Job):
                     # noinspection PyBroadException
                     try:
                         with get_data_file_fits(self.user_id, file_id) as f:
-                            source.filter = f[0].header.get('FILTER')
+                            source.filter = get_data_file_hdu(f).header.get(
+                                'FILTER')
                     except Exception:
                         source.filter = None
                     filters[file_id] = source.filter
@@ -380,8 +384,7 @@ class FieldCalJob(Job):
 
             # Update photometric calibration info in data file header
             try:
-                with get_data_file_fits(self.user_id, file_id, 'update') as f:
-                    hdr = f[0].header
+                with update_data_file_header(self.user_id, file_id) as hdr:
                     hdr['PHOT_M0'] = m0, 'Photometric zero point'
                     if m0_error:
                         hdr['PHOT_M0E'] = (
@@ -16,8 +16,7 @@ from skylib.extraction.centroiding import centroid_psf, centroid_sources
 from ...models import (
     Job, JobResult, SourceExtractionData, PhotSettings, PhotometryData,
     sigma_to_fwhm)
-from ..data_files import (
-    get_data_file_data, get_exp_length, get_gain, get_image_time)
+from ..data_files import get_exp_length, get_gain, get_image_time
 
 
 __all__ = ['PhotometryJob', 'get_source_xy', 'run_photometry_job']
@@ -140,7 +139,7 @@ def run_photometry_job(job: Job, settings: PhotSettings,
     result_data = []
     for file_no, file_id in enumerate(file_ids):
         try:
-            data, hdr = get_data_file_data(job.user_id, file_id)
+            data, hdr = job.get_data_file_data(file_id)
 
             if settings.gain is None:
                 gain = get_gain(hdr)
@@ -252,6 +251,7 @@ class PhotometryJobResult(JobResult):
 class PhotometryJob(Job):
     type = 'photometry'
     description = 'Photometer Sources'
+    cacheable = True
 
     result: PhotometryJobResult = Nested(PhotometryJobResult, default={})
     file_ids: TList[int] = List(Integer(), default=[])
@@ -260,5 +260,47 @@ class PhotometryJob(Job):
     settings: PhotSettings = Nested(PhotSettings, default={})
 
     def run(self):
-        self.result.data = run_photometry_job(
-            self, self.settings, self.file_ids, self.sources)
+        if not self.sources:
+            # Nothing to photometer
+            self.result.data = []
+            return
+
+        if all(getattr(source, 'file_id', None) is None
+               for source in self.sources):
+            # Same sources for all images; assign the missing source IDs now
+            # so that they match across the images photometered
+            # by the different subtasks
+            if not self.file_ids:
+                raise ValueError('Missing data file IDs')
+            prefix = '{}_{}_'.format(
+                datetime.utcnow().strftime('%Y%m%d%H%M%S'), self.id)
+            for i, source in enumerate(self.sources):
+                if not getattr(source, 'id', None):
+                    source.id = prefix + str(i + 1)
+            file_ids = self.file_ids
+        else:
+            # Individual sources for each image
+            file_ids = sorted({
+                source.file_id for source in self.sources
+                if getattr(source, 'file_id', None) is not None})
+
+        # Photometer each image in parallel
+        self.result.data = [
+            PhotometryData(**source)
+            for sources in self.run_subtasks('photometer_file', file_ids)
+            if sources
+            for source in sources]
+
+    def photometer_file(self, file_id: int) -> TList[dict]:
+        """
+        Photometry subtask: photometer sources in a single image
+
+        :param file_id: data file ID
+
+        :return: list of serialized photometry results
+        """
+        return [
+            source.to_dict() for source in run_photometry_job(
+                self, self.settings, [file_id],
+                [source for source in self.sources
+                 if getattr(source, 'file_id', None) in (None, file_id)])]
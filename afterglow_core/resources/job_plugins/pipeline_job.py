@@ -0,0 +1,214 @@
+"""
+Afterglow Core: job pipeline plugin
+"""
+
+from functools import partial
+from typing import Any, Dict as TDict, List as TList
+
+from marshmallow.fields import Dict, List, Nested, String
+
+from ...models import Job, JobResult
+from ...schemas import AfterglowSchema, Boolean
+from ...errors import ValidationError
+
+
+__all__ = ['PipelineJob', 'PipelineStage']
+
+
+class PipelineStage(AfterglowSchema):
+    """
+    Pipeline stage definition
+
+    Attributes::
+        name: unique stage name
+        job: stage job type and parameters, as in POST /jobs
+        inputs: stage job parameters taken from the results of the previous
+            stages: {parameter name: "stage_name.result_field", ...}
+        depends_on: names of the extra stages that must complete before this
+            stage starts
+        keep: return the stage result even if it is consumed by other stages;
+            results of the final stages are always returned
+    """
+    name: str = String()
+    job: TDict[str, Any] = Dict(default={})
+    inputs: TDict[str, str] = Dict(default={})
+    depends_on: TList[str] = List(String(), default=[])
+    keep: bool = Boolean(default=False)
+
+
+class PipelineJobResult(JobResult):
+    """
+    Combined pipeline result
+
+    Attributes::
+        stages: {stage name: {"type": job type, "status": "pending" |
+            "in_progress" | "completed" | "failed" | "skipped", "result":
+            stage job result, "tables": columnar result files}, ...}; results
+            are only present for final stages and stages with `keep` set;
+            long lists of records in stage results are saved to job files
+            named "result_[stage name]_[field]"
+    """
+    stages: TDict[str, TDict[str, Any]] = Dict(default={})
+
+
+class PipelineJob(Job):
+    """
+    Run a sequence of jobs (e.g. source extraction -> photometry -> photometric
+    calibration) in a single job worker, passing the results of each stage
+    to the subsequent stages in memory
+    """
+    type = 'pipeline'
+    description = 'Run Job Pipeline'
+
+    result: PipelineJobResult = Nested(PipelineJobResult, default={})
+    stages: TList[PipelineStage] = List(Nested(PipelineStage), default=[])
+
+    def run(self):
+        stages = {}
+        for stage in self.stages:
+            if not getattr(stage, 'name', None):
+                raise ValidationError('stages.name', 'Missing stage name')
+            if stage.name in stages:
+                raise ValidationError(
+                    'stages.name', 'Duplicate stage name "{}"'.format(
+                        stage.name))
+            if not stage.job.get('type'):
+                raise ValidationError(
+                    'stages.job.type',
+                    'Missing job type for stage "{}"'.format(stage.name))
+            if stage.job['type'] == self.type:
+                raise ValidationError(
+                    'stages.job.type', 'Pipelines cannot be nested')
+            stages[stage.name] = stage
+
+        # Collect stage dependencies and sort stages topologically
+        deps = {}
+        for name, stage in stages.items():
+            deps[name] = set(stage.depends_on)
+            for param, ref in stage.inputs.items():
+                if not isinstance(ref, str) or '.' not in ref:
+                    raise ValidationError(
+                        'stages.inputs',
+                        'Input "{}" of stage "{}" must be specified as '
+                        '"stage_name.result_field"'.format(param, name))
+                deps[name].add(ref.split('.', 1)[0])
+            for dep in deps[name]:
+                if dep not in stages:
+                    raise ValidationError(
+                        'stages', 'Stage "{}" depends on unknown stage '
+                        '"{}"'.format(name, dep))
+        order = []
+        while len(order) < len(stages):
+            ready = [name for name in stages
+                     if name not in order and deps[name].issubset(order)]
+            if not ready:
+                raise ValidationError(
+                    'stages', 'Circular dependency between stages')
+            order += ready
+
+        # Number of stages that consume the result of each stage; results of
+        # intermediate stages are released as soon as they are consumed
+        consumers = {name: 0 for name in stages}
+        for name in stages:
+            for dep in deps[name]:
+                consumers[dep] += 1
+
+        self.result.stages = {
+            name: dict(type=stages[name].job['type'], status='pending')
+            for name in order}
+        self.update()
+
+        jobs = {}
+        for stage_no, name in enumerate(order):
+            stage = stages[name]
+            if any(self.result.stages[dep]['status'] != 'completed'
+                   for dep in deps[name]):
+                self._set_stage_state(name, status='skipped')
+                self.add_error(
+                    'Stage "{}": skipped due to failed dependencies'
+                    .format(name))
+                continue
+
+            self._set_stage_state(name, status='in_progress')
+            self.update()
+            try:
+                params = dict(stage.job)
+                for param, ref in stage.inputs.items():
+                    src, field = ref.split('.', 1)
+                    params[param] = getattr(jobs[src].result, field)
+
+                # Stage jobs share the pipeline job ID, so that their subtasks
+                # and job files are attributed to the pipeline, but report
+                # their progress, errors, and warnings via the pipeline job
+                params.update(
+                    id=self.id, user_id=self.user_id,
+                    session_id=self.session_id)
+                job = Job(
+                    _queue=self._queue, _task_queue=self._task_queue,
+                    _subtask=True, _set_defaults=True, **params)
+                job.update_progress = partial(
+                    self._update_stage_progress, stage_no, len(order))
+                try:
+                    job.run()
+                finally:
+                    for msg in job.result.errors:
+                        self.add_error('Stage "{}": {}'.format(name, msg))
+                    for msg in job.result.warnings:
+                        self.add_warning('Stage "{}": {}'.format(name, msg))
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                self._set_stage_state(name, status='failed')
+                self.add_error('Stage "{}": {}'.format(name, e))
+                continue
+
+            state = dict(status='completed')
+            if stage.keep or not consumers[name]:
+                # Return the stage result
+                job.store_result_tables(prefix='result_{}_'.format(name))
+                state['result'] = {
+                    field: val for field, val in job.result.to_dict().items()
+                    if field not in ('errors', 'warnings')}
+                # noinspection PyProtectedMember
+                if job._result_tables:
+                    # noinspection PyProtectedMember
+                    state['tables'] = job._result_tables
+            self._set_stage_state(name, **state)
+            jobs[name] = job
+
+            # Release the results that are no longer needed
+            for dep in deps[name]:
+                consumers[dep] -= 1
+                if not consumers[dep]:
+                    jobs.pop(dep, None)
+
+            self._update_stage_progress(stage_no, len(order), 100)
+
+    def _set_stage_state(self, name: str, **kwargs) -> None:
+        """
+        Update the state of a pipeline stage in the job result
+
+        :param name: stage name
+        :param kwargs: stage state fields
+
+        :return: None
+        """
+        # Replace rather than modify the stage state dict so that the change
+        # is detected when sending the job state update
+        stages = dict(self.result.stages)
+        stages[name] = dict(stages[name], **kwargs)
+        self.result.stages = stages
+
+    def _update_stage_progress(self, stage_no: int, num_stages: int,
+                               progress: float) -> None:
+        """
+        Set the combined pipeline progress from the progress of the current
+        stage
+
+        :param stage_no: current stage index
+        :param num_stages: total number of stages
+        :param progress: current stage progress (0 to 100)
+
+        :return: None
+        """
+        self.update_progress((stage_no + progress/100)/num_stages*100)
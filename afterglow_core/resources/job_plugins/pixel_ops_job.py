@@ -180,7 +180,8 @@ class PixelOpsJob(Job):
 
                     try:
                         save_data_file(
-                            adb, get_root(self.user_id), file_id, res, hdr)
+                            adb, get_root(self.user_id), file_id, res, hdr,
+                            user_id=self.user_id)
                         adb.commit()
                     except Exception:
                         adb.rollback()
@@ -202,7 +203,8 @@ class PixelOpsJob(Job):
                         # file or, if created from expression not involving
                         file_id = create_data_file(
                             adb, None, get_root(self.user_id), res, hdr,
-                            duplicates='append', session_id=self.session_id).id
+                            duplicates='append', session_id=self.session_id,
+                            user_id=self.user_id).id
                         adb.commit()
                     except Exception:
                         adb.rollback()
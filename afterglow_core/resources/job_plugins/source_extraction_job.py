@@ -51,6 +51,7 @@ class SourceExtractionJobResult(JobResult):
 class SourceExtractionJob(Job):
     type = 'source_extraction'
     description = 'Extract Sources'
+    cacheable = True
 
     result: SourceExtractionJobResult = Nested(
         SourceExtractionJobResult)
@@ -62,8 +63,13 @@ class SourceExtractionJob(Job):
         SourceMergeSettings, default={})
 
     def run(self):
-        result_data = run_source_extraction_job(
-            self, self.source_extraction_settings, self.file_ids)
+        # Extract sources from each image in parallel
+        result_data = [
+            SourceExtractionData(**source)
+            for sources in self.run_subtasks(
+                'extract_file_sources', self.file_ids)
+            if sources
+            for source in sources]
 
         if self.file_ids and len(self.file_ids) > 1 and self.merge_sources:
             result_data = merge_sources(
@@ -71,6 +77,19 @@ class SourceExtractionJob(Job):
 
         self.result.data = result_data
 
+    def extract_file_sources(self, file_id: int) -> TList[dict]:
+        """
+        Source extraction subtask: extract sources from a single image
+
+        :param file_id: data file ID
+
+        :return: list of serialized source extraction results
+        """
+        return [
+            source.to_dict() for source in run_source_extraction_job(
+                self, self.source_extraction_settings, [file_id],
+                update_progress=False)]
+
 
 def run_source_extraction_job(job: Job,
                               settings: SourceExtractionSettings,
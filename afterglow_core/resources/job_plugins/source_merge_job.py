@@ -182,6 +182,7 @@ class SourceMergeJobResult(JobResult):
 class SourceMergeJob(Job):
     type = 'source_merge'
     description = 'Merge Sources from Multiple Images'
+    cacheable = True
 
     result: SourceMergeJobResult = Nested(SourceMergeJobResult)
     sources: TList[SourceExtractionData] = List(Nested(SourceExtractionData))
@@ -113,7 +113,8 @@ class StackingJob(Job):
         try:
             self.result.file_id = create_data_file(
                 adb, None, get_root(self.user_id), data, header,
-                duplicates='append', session_id=self.session_id).id
+                duplicates='append', session_id=self.session_id,
+                user_id=self.user_id).id
             adb.commit()
         except Exception:
             adb.rollback()
@@ -16,8 +16,7 @@ from ...models import Job, JobResult
 from ...schemas import AfterglowSchema, Boolean, Float
 from ...errors import ValidationError
 from ..data_files import (
-    create_data_file, get_data_file_data, get_data_file_db, get_root,
-    save_data_file)
+    create_data_file, get_data_file_db, get_root, save_data_file)
 from .source_extraction_job import (
     SourceExtractionSettings, run_source_extraction_job)
 
@@ -65,6 +64,22 @@ WCS_REGEX = re.compile(
 )
 
 
+_solver = None
+
+
+def get_solver() -> Solver:
+    """
+    Return Astrometry.net solver instance; the index files are loaded once per
+    worker process and reused by all subsequent calibration subtasks
+
+    :return: solver instance
+    """
+    global _solver
+    if _solver is None:
+        _solver = Solver(app.config['ANET_INDEX_PATH'])
+    return _solver
+
+
 class WcsCalibrationSettings(AfterglowSchema):
     ra_hours: Optional[float] = Float(default=None)
     dec_degs: Optional[float] = Float(default=None)
@@ -123,8 +138,21 @@ class WcsCalibrationJob(Job):
                 'settings.max_sources',
                 'Maximum number of sources must be positive', 422)
 
-        if not self.file_ids:
-            return
+        # Calibrate each image in parallel
+        self.result.file_ids = [
+            file_id
+            for file_id in self.run_subtasks('calibrate_file', self.file_ids)
+            if file_id is not None]
+
+    def calibrate_file(self, file_id: int) -> Optional[int]:
+        """
+        WCS calibration subtask: plate-solve a single image
+
+        :param file_id: data file ID
+
+        :return: ID of the calibrated data file or None on error
+        """
+        settings = self.settings
 
         source_extraction_settings = self.source_extraction_settings or \
             SourceExtractionSettings(_set_defaults=True)
@@ -133,123 +161,121 @@ class WcsCalibrationJob(Job):
 
         root = get_root(self.user_id)
 
-        solver = Solver(app.config['ANET_INDEX_PATH'])
+        solver = get_solver()
 
         adb = get_data_file_db(self.user_id)
+        orig_file_id = file_id
         try:
-            for i, file_id in enumerate(self.file_ids):
+            data, hdr = self.get_data_file_data(file_id)
+            height, width = data.shape
+
+            # Extract sources
+            sources = run_source_extraction_job(
+                self, source_extraction_settings, [file_id],
+                update_progress=False)
+            xy = [(source.x - 1, source.y - 1) for source in sources]
+            fluxes = [source.flux for source in sources]
+
+            ra_hours, dec_degs = settings.ra_hours, settings.dec_degs
+            if ra_hours is None and dec_degs is None:
+                # Guess starting RA and Dec from WCS in the image header
+                # noinspection PyBroadException
                 try:
-                    data, hdr = get_data_file_data(self.user_id, file_id)
-                    height, width = data.shape
-
-                    # Extract sources
-                    sources = run_source_extraction_job(
-                        self, source_extraction_settings, [file_id],
-                        update_progress=False)
-                    xy = [(source.x - 1, source.y - 1) for source in sources]
-                    fluxes = [source.flux for source in sources]
-
-                    ra_hours, dec_degs = settings.ra_hours, settings.dec_degs
-                    if ra_hours is None and dec_degs is None:
-                        # Guess starting RA and Dec from WCS in the image header
-                        # noinspection PyBroadException
-                        try:
-                            wcs = WCS(hdr, relax=True)
-                            if wcs.has_celestial:
-                                ra_hours, dec_degs = wcs.all_pix2world(
-                                    (width - 1)/2, (height - 1)/2, 0)
-                                ra_hours /= 15
-                        except Exception:
-                            pass
-                    if ra_hours is None and dec_degs is None:
-                        # Guess starting RA and Dec from MaxIm DL FITS keywords
-                        for name in ('OBJRA', 'TELRA', 'RA'):
-                            try:
-                                h, m, s = hdr[name].split(':')
-                                ra_hours = int(h) + int(m)/60 + float(s)/3600
-                            except (KeyError, ValueError):
-                                pass
-                            else:
-                                break
-                        for name in ('OBJDEC', 'TELDEC', 'DEC'):
-                            try:
-                                d, m, s = hdr[name].split(':')
-                                dec_degs = \
-                                    (abs(int(d)) + int(m)/60 + float(s)/3600) *\
-                                    (1 - d.strip().startswith('-'))
-                            except (KeyError, ValueError):
-                                pass
-                            else:
-                                break
-
-                    # Run Astrometry.net; allow to abort the job by calling back
-                    # from the engine into Python code
-                    solution = solve_field(
-                        solver, xy, fluxes,
-                        width=width,
-                        height=height,
-                        ra_hours=ra_hours or 0,
-                        dec_degs=dec_degs or 0,
-                        radius=settings.radius,
-                        min_scale=settings.min_scale,
-                        max_scale=settings.max_scale,
-                        parity=settings.parity,
-                        sip_order=settings.sip_order,
-                        crpix_center=settings.crpix_center,
-                        max_sources=settings.max_sources,
-                        retry_lost=False,
-                        callback=lambda: self.state.status != 'canceled')
-                    if solution.wcs is None:
-                        raise RuntimeError('WCS solution not found')
-
-                    # Remove all existing WCS-related keywords so that they
-                    # don't mess up the new WCS if it doesn't have them
-                    for name in list(hdr):
-                        if WCS_REGEX.match(name):
-                            del hdr[name]
+                    wcs = WCS(hdr, relax=True)
+                    if wcs.has_celestial:
+                        ra_hours, dec_degs = wcs.all_pix2world(
+                            (width - 1)/2, (height - 1)/2, 0)
+                        ra_hours /= 15
+                except Exception:
+                    pass
+            if ra_hours is None and dec_degs is None:
+                # Guess starting RA and Dec from MaxIm DL FITS keywords
+                for name in ('OBJRA', 'TELRA', 'RA'):
+                    try:
+                        h, m, s = hdr[name].split(':')
+                        ra_hours = int(h) + int(m)/60 + float(s)/3600
+                    except (KeyError, ValueError):
+                        pass
+                    else:
+                        break
+                for name in ('OBJDEC', 'TELDEC', 'DEC'):
+                    try:
+                        d, m, s = hdr[name].split(':')
+                        dec_degs = \
+                            (abs(int(d)) + int(m)/60 + float(s)/3600) *\
+                            (1 - d.strip().startswith('-'))
+                    except (KeyError, ValueError):
+                        pass
+                    else:
+                        break
 
+            # Run Astrometry.net; allow to abort the job by calling back
+            # from the engine into Python code
+            solution = solve_field(
+                solver, xy, fluxes,
+                width=width,
+                height=height,
+                ra_hours=ra_hours or 0,
+                dec_degs=dec_degs or 0,
+                radius=settings.radius,
+                min_scale=settings.min_scale,
+                max_scale=settings.max_scale,
+                parity=settings.parity,
+                sip_order=settings.sip_order,
+                crpix_center=settings.crpix_center,
+                max_sources=settings.max_sources,
+                retry_lost=False,
+                callback=lambda: self.state.status != 'canceled')
+            if solution.wcs is None:
+                raise RuntimeError('WCS solution not found')
+
+            # Remove all existing WCS-related keywords so that they
+            # don't mess up the new WCS if it doesn't have them
+            for name in list(hdr):
+                if WCS_REGEX.match(name):
+                    del hdr[name]
+
+            hdr.add_history(
+                'WCS calibration obtained at {} with index {} from {} '
+                'sources; matched sources: {}, conflicts: {}, '
+                'log-odds: {}'.format(
+                    datetime.utcnow(), solution.index_name,
+                    solution.n_field, solution.n_match,
+                    solution.n_conflict, solution.log_odds))
+
+            # Overwrite WCS in FITS header; preserve epoch
+            # of observation
+            orig_kw = {
+                name: (hdr[name], hdr.comments[name])
+                if hdr.comments[name] else hdr[name]
+                for name in (
+                    'DATE-OBS', 'MJD-OBS', 'DATEREF', 'MJDREFI',
+                    'MJDREFF')
+                if name in hdr
+            }
+            hdr.update(solution.wcs.to_header(relax=True))
+            for name, val in orig_kw.items():
+                hdr[name] = val
+
+            try:
+                if self.inplace:
+                    # Overwrite the original data file
+                    save_data_file(
+                        adb, root, file_id, data, hdr, user_id=self.user_id)
+                else:
                     hdr.add_history(
-                        'WCS calibration obtained at {} with index {} from {} '
-                        'sources; matched sources: {}, conflicts: {}, '
-                        'log-odds: {}'.format(
-                            datetime.utcnow(), solution.index_name,
-                            solution.n_field, solution.n_match,
-                            solution.n_conflict, solution.log_odds))
-
-                    # Overwrite WCS in FITS header; preserve epoch
-                    # of observation
-                    orig_kw = {
-                        name: (hdr[name], hdr.comments[name])
-                        if hdr.comments[name] else hdr[name]
-                        for name in (
-                            'DATE-OBS', 'MJD-OBS', 'DATEREF', 'MJDREFI',
-                            'MJDREFF')
-                        if name in hdr
-                    }
-                    hdr.update(solution.wcs.to_header(relax=True))
-                    for name, val in orig_kw.items():
-                        hdr[name] = val
+                        'Original data file ID: {:d}'.format(file_id))
+                    file_id = create_data_file(
+                        adb, None, root, data, hdr, duplicates='append',
+                        session_id=self.session_id, user_id=self.user_id).id
+                adb.commit()
+            except Exception:
+                adb.rollback()
+                raise
 
-                    try:
-                        if self.inplace:
-                            # Overwrite the original data file
-                            save_data_file(adb, root, file_id, data, hdr)
-                        else:
-                            hdr.add_history(
-                                'Original data file ID: {:d}'.format(file_id))
-                            file_id = create_data_file(
-                                adb, None, root, data, hdr, duplicates='append',
-                                session_id=self.session_id).id
-                        adb.commit()
-                    except Exception:
-                        adb.rollback()
-                        raise
-
-                    self.result.file_ids.append(file_id)
-                except Exception as e:
-                    self.add_error(
-                        'Data file ID {}: {}'.format(self.file_ids[i], e))
-                finally:
-                    self.update_progress((i + 1)/len(self.file_ids)*100)
+            return file_id
+        except Exception as e:
+            self.add_error('Data file ID {}: {}'.format(orig_file_id, e))
+            return None
         finally:
             adb.remove()
@@ -10,43 +10,60 @@ import traceback
 import shutil
 import errno
 import ctypes
+import hashlib
 import signal
 import json
+import pickle
+import queue
 import struct
 import socket
+import tempfile
+import time
+import uuid
 import cProfile
+import heapq
+import marshal
+import pstats
 import atexit
-from datetime import datetime
+from collections import Counter, deque
+from datetime import datetime, timedelta
 from glob import glob
+from math import ceil
 from multiprocessing import Event, Process, Queue
-from importlib import reload
+from multiprocessing.managers import BaseManager
+from importlib import import_module, reload
 from socketserver import BaseRequestHandler, ThreadingTCPServer
-from typing import Any, Dict as TDict
+from typing import Any, Dict as TDict, List as TList, Optional, Tuple
 import threading
 import sqlite3
 
 # noinspection PyProtectedMember
 from marshmallow import Schema, fields, missing
 from sqlalchemy import (
-    Boolean, Column, Float, ForeignKey, Integer, String, Text, create_engine,
-    event, text)
+    Boolean, Column, Float, ForeignKey, Index, Integer, String, Text, and_,
+    create_engine, event, func, inspect, or_, text)
 # noinspection PyProtectedMember
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import relationship, scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
 from .. import app, plugins
-from ..models import Job, JobState, JobResult, job_file_dir, job_file_path
+from ..models import (
+    Job, JobState, JobResult, get_job_phase_times, job_file_dir, job_file_path,
+    load_result_table, reset_job_phase_times, run_subtask,
+    unlink_shared_arrays)
 from ..schemas import (
     AfterglowSchema, Boolean as BooleanField, Date as DateField,
     DateTime as DateTimeField, Float as FloatField, Time as TimeField)
-from ..errors import AfterglowError, MissingFieldError
+from ..errors import AfterglowError, MissingFieldError, ValidationError
 from ..errors.job import (
     JobServerError, UnknownJobError, UnknownJobFileError, UnknownJobTypeError,
     InvalidMethodError, CannotSetJobStatusError, CannotCancelJobError,
-    CannotDeleteJobError)
+    CannotDeleteJobError, JobResourceLimitError, JobServerBusyError,
+    TooManyPendingJobsError, UnknownJobGroupError)
 from .base import Date, DateTime, JSONType, Time
-from .data_files import get_session
+from .data_files import get_data_file_path, get_session
 
 # Encryption imports
 try:
@@ -58,8 +75,14 @@ except ImportError:
     from Crypto import Random
     from Crypto.Cipher import AES
 
+try:
+    from socketserver import ThreadingUnixStreamServer
+except ImportError:
+    # Windows
+    ThreadingUnixStreamServer = None
 
-__all__ = ['init_jobs', 'job_server_request']
+
+__all__ = ['RemoteJobWorker', 'init_jobs', 'job_server_request']
 
 
 # Read/write lock by Fazal Majid
@@ -185,6 +208,16 @@ class DbJobState(JobBase):
         DateTime, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
     completed_on = Column(DateTime)
     progress = Column(Float, nullable=False, default=0)
+    peak_rss = Column(Float)
+    cpu_time = Column(Float)
+    wall_time = Column(Float)
+    bytes_read = Column(Integer)
+    bytes_written = Column(Integer)
+    load_time = Column(Float)
+    compute_time = Column(Float)
+    save_time = Column(Float)
+
+    __table_args__ = (Index('ix_job_states_status_id', 'status', 'id'),)
 
 
 class DbJobResult(JobBase):
@@ -195,6 +228,7 @@ class DbJobResult(JobBase):
     type = Column(String(40), index=True)
     errors = Column(JSONType, nullable=False, default=[])
     warnings = Column(JSONType, nullable=False, default=[])
+    tables = Column(JSONType, default=None)
 
     __mapper_args__ = {'polymorphic_on': type, 'polymorphic_identity': None}
 
@@ -217,6 +251,9 @@ class DbJob(JobBase):
     type = Column(String(40), nullable=False, index=True)
     user_id = Column(Integer, index=True)
     session_id = Column(Integer, nullable=True, index=True)
+    group_id = Column(String(36), nullable=True, index=True)
+    priority = Column(String(16))
+    profile = Column(Boolean, default=False)
 
     state = relationship(DbJobState, backref='job', uselist=False)
     result = relationship(
@@ -224,14 +261,198 @@ class DbJob(JobBase):
         foreign_keys=DbJobResult.id)
     files = relationship(DbJobFile, backref='job')
 
+    # Indexes used by job listing filters with pagination by job ID
+    __table_args__ = (
+        Index('ix_jobs_user_session_id', 'user_id', 'session_id', 'id'),
+        Index('ix_jobs_user_type_id', 'user_id', 'type', 'id'),
+    )
     __mapper_args__ = {'polymorphic_on': type}
 
 
+def delete_job_files(user_id: Optional[int], job_id: int) -> None:
+    """
+    Delete all extra job files of the given job, including subtask checkpoints
+
+    :param user_id: job user ID
+    :param job_id: job ID
+
+    :return: None
+    """
+    for fp in glob(job_file_path(user_id, job_id, '*')):
+        try:
+            os.unlink(fp)
+        except OSError:
+            pass
+
+
+def get_job_file_usage() -> TDict[Optional[int], TDict[int, int]]:
+    """
+    Return the disk space used by job files
+
+    :return: {user ID: {job ID: total size of job files in bytes, ...}, ...}
+    """
+    usage = {}
+
+    def scan(path: str, user_id: Optional[int]) -> None:
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if user_id is None and entry.name.isdigit():
+                        scan(entry.path, int(entry.name))
+                    continue
+                job_id = int(entry.name.split('_', 1)[0])
+                size = entry.stat().st_size
+            except (OSError, ValueError):
+                continue
+            user_usage = usage.setdefault(user_id, {})
+            user_usage[job_id] = user_usage.get(job_id, 0) + size
+
+    scan(job_file_dir, None)
+    return usage
+
+
+def get_expired_jobs(session, limit: int) -> TList[Tuple[int, Optional[int]]]:
+    """
+    Return the completed and canceled jobs past their retention time
+    (JOB_RETENTION or the job type-specific JOB_RETENTION_PER_TYPE)
+
+    :param session: job db session
+    :param limit: maximum number of jobs to return
+
+    :return: list of pairs (job ID, user ID), oldest jobs first
+    """
+    now = datetime.utcnow()
+    default_ttl = app.config.get('JOB_RETENTION', 0)
+    type_ttls = app.config.get('JOB_RETENTION_PER_TYPE', {})
+    conditions = [
+        and_(DbJob.type == job_type,
+             DbJobState.completed_on < now - timedelta(seconds=ttl))
+        for job_type, ttl in type_ttls.items() if ttl]
+    if default_ttl:
+        condition = DbJobState.completed_on < \
+            now - timedelta(seconds=default_ttl)
+        if type_ttls:
+            condition = and_(DbJob.type.notin_(list(type_ttls)), condition)
+        conditions.append(condition)
+    if not conditions:
+        return []
+
+    return session.query(DbJob.id, DbJob.user_id) \
+        .join(DbJobState, DbJobState.id == DbJob.id) \
+        .filter(DbJobState.status.in_(('completed', 'canceled')),
+                or_(*conditions)) \
+        .order_by(DbJobState.completed_on) \
+        .limit(limit) \
+        .all()
+
+
+def get_excess_job_files(session, limit: int) \
+        -> Tuple[TList[Tuple[int, Optional[int]]],
+                 TList[Tuple[int, Optional[int]]]]:
+    """
+    Find the jobs whose files must be deleted to keep the users' job files
+    within JOB_FILE_QUOTA, and the job files left from deleted jobs
+
+    :param session: job db session
+    :param limit: maximum number of jobs to return
+
+    :return: list of pairs (job ID, user ID) of the oldest completed
+        and canceled jobs of each user in excess of the quota, and list of
+        pairs (job ID, user ID) for files not belonging to any job
+    """
+    default_quota = app.config.get('JOB_FILE_QUOTA', 0)
+    user_quotas = app.config.get('JOB_FILE_QUOTA_PER_USER', {})
+    excess_jobs, orphans = [], []
+    for user_id, usage in get_job_file_usage().items():
+        if len(excess_jobs) + len(orphans) >= limit:
+            break
+
+        job_ids = list(usage)
+        existing_jobs, finished_jobs = set(), []
+        for i in range(0, len(job_ids), 500):
+            for job_id, status in session.query(DbJob.id, DbJobState.status) \
+                    .join(DbJobState, DbJobState.id == DbJob.id) \
+                    .filter(DbJob.id.in_(job_ids[i:i + 500])) \
+                    .order_by(DbJobState.completed_on):
+                existing_jobs.add(job_id)
+                if status in ('completed', 'canceled'):
+                    finished_jobs.append(job_id)
+
+        for job_id in job_ids:
+            if job_id not in existing_jobs:
+                orphans.append((job_id, user_id))
+                del usage[job_id]
+
+        quota = user_quotas.get(user_id, default_quota)
+        if quota:
+            total = sum(usage.values())
+            for job_id in finished_jobs:
+                if total <= quota*1024*1024:
+                    break
+                excess_jobs.append((job_id, user_id))
+                total -= usage[job_id]
+
+    return excess_jobs[:limit], orphans[:limit]
+
+
+class DbJobCacheEntry(JobBase):
+    __tablename__ = 'job_cache'
+
+    key = Column(String(64), primary_key=True, nullable=False)
+    job_id = Column(
+        ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False, index=True)
+    last_used_on = Column(
+        DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    job = relationship(DbJob)
+
+
 WINDOWS = sys.platform.startswith('win')
 
 
-# Message encryption
-job_server_port = None
+# Maximum number of job state update messages written to the job database in
+# a single transaction
+STATE_UPDATE_BATCH_SIZE = 1000
+
+# Maximum number of attempts to write a batch of job state updates when the job
+# database is locked by other writers, and initial delay between attempts in
+# seconds, doubled after each attempt
+STATE_UPDATE_MAX_ATTEMPTS = 10
+STATE_UPDATE_RETRY_DELAY = 0.05
+
+# Job worker pool check interval in seconds
+POOL_MANAGER_INTERVAL = 5
+
+# Remote job worker heartbeat interval in seconds; the job server removes
+# remote workers that did not send a heartbeat within REMOTE_WORKER_TIMEOUT
+REMOTE_WORKER_HEARTBEAT = 5
+REMOTE_WORKER_TIMEOUT = 3*REMOTE_WORKER_HEARTBEAT
+
+# Weight of the latest job run time in the mean run time per job type used to
+# estimate job start times
+RUN_TIME_SMOOTHING = 0.2
+
+# Retry-After value in seconds returned by admission control if job start
+# times cannot be estimated
+DEFAULT_RETRY_AFTER = 10
+
+# Pause in seconds between job retention batches while there are more jobs
+# to delete, to let the job server write state updates in between
+RETENTION_BATCH_PAUSE = 1
+
+# Extra CPU time in seconds given to a job that has exceeded its CPU time limit
+# before it is interrupted again if it ignored the first interruption
+CPU_TIME_LIMIT_GRACE = 5
+
+
+# Job server address: TCP port number or Unix socket path, depending on
+# transport; message encryption is used with TCP transport only
+job_server_transport = 'tcp'
+job_server_address = None
 job_server_key = b''
 job_server_iv = b''
 
@@ -262,39 +483,458 @@ def decrypt(msg: bytes) -> bytes:
     return AES.new(job_server_key, AES.MODE_CFB, job_server_iv).decrypt(msg)
 
 
-class JobWorkerProcess(Process):
+def get_job_server_transport() -> str:
     """
-    Job worker process class
+    Return the job server transport set by the JOB_SERVER_TRANSPORT option
+
+    :return: "unix" or "tcp"; by default, Unix domain sockets are used where
+        available
     """
-    abort_event = None
+    transport = app.config.get('JOB_SERVER_TRANSPORT')
+    if not transport:
+        if WINDOWS or ThreadingUnixStreamServer is None:
+            return 'tcp'
+        return 'unix'
+    transport = str(transport).lower()
+    if transport not in ('tcp', 'unix') or \
+            transport == 'unix' and ThreadingUnixStreamServer is None:
+        raise JobServerError(
+            reason='Unsupported job server transport "{}"'.format(transport))
+    return transport
 
-    def __init__(self, job_queue, result_queue):
-        if WINDOWS:
-            self.abort_event = Event()
 
-        super(JobWorkerProcess, self).__init__(
-            target=self.body, args=(job_queue, result_queue, self.abort_event))
-        self.daemon = True
+def pack_msg(msg: TDict[str, Any]) -> bytes:
+    """
+    Serialize a job server communication message
 
-        self.start()
+    Unix socket transport uses binary pickle serialization; the socket is
+    accessible to the owner only, so no encryption is needed. TCP transport
+    uses JSON with optional encryption.
+
+    :param msg: message to serialize
+
+    :return: serialized message
+    """
+    if job_server_transport == 'unix':
+        return pickle.dumps(msg, pickle.HIGHEST_PROTOCOL)
+    return encrypt(json.dumps(msg).encode('utf8'))
+
+
+def unpack_msg(msg: bytes) -> TDict[str, Any]:
+    """
+    Deserialize a job server communication message
+
+    :param msg: message serialized by :func:`pack_msg`
+
+    :return: message dictionary
+    """
+    if job_server_transport == 'unix':
+        msg = pickle.loads(msg)
+    else:
+        msg = json.loads(decrypt(msg))
+    if not isinstance(msg, dict):
+        raise ValueError('Message is not a dict')
+    return msg
+
+
+def get_rss() -> Optional[float]:
+    """
+    Return the resident set size of the current process
+
+    :return: RSS in megabytes or None if not available on this platform
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/(1 << 20)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    # Use peak RSS as an approximation on other systems
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss/(1 << 20)
+    return rss/(1 << 10)
+
+
+def read_proc_status(filename: str) -> TDict[str, int]:
+    """
+    Return numeric fields of a /proc/self status file
+
+    :param filename: file name, e.g. "status" or "io"
+
+    :return: dictionary {field name: value}, empty if not available on this
+        platform; values of /proc/self/status are in kilobytes
+    """
+    fields = {}
+    try:
+        with open(os.path.join('/proc/self', filename)) as f:
+            for line in f:
+                name, _, val = line.partition(':')
+                try:
+                    fields[name] = int(val.split()[0])
+                except (ValueError, IndexError):
+                    pass
+    except OSError:
+        pass
+    return fields
+
+
+class CPUTimeLimitExceeded(KeyboardInterrupt):
+    """
+    Raised in a job that has exceeded its CPU time limit; like cancellation,
+    it is not caught by the generic exception handlers of job plugins, so that
+    the whole job is stopped, and is converted to
+    :class:`JobResourceLimitError` by :class:`JobResourceMonitor`
+    """
+    pass
+
+
+class JobResourceMonitor(object):
+    """
+    Context manager that applies per-job resource limits to the current worker
+    process and measures the resources used by the job
+
+    The memory limit (JOB_MAX_ADDRESS_SPACE) is applied to the address space
+    allocated by the job on top of that already used by the worker process;
+    exceeding it makes allocations fail with MemoryError. The CPU time limit
+    (JOB_MAX_CPU_TIME) interrupts the whole job, which then fails with
+    :class:`JobResourceLimitError`.
+    Both can be overridden for individual job types via JOB_RESOURCE_LIMITS.
+    Limits are only supported on Unix systems.
+
+    Usage::
+        with JobResourceMonitor(job.type) as monitor:
+            job.run()
+        job.state.cpu_time = monitor.usage['cpu_time']
+    """
+    def __init__(self, job_type: str):
+        """
+        Create a resource monitor for a job
+
+        :param job_type: job type; used to look up per-type resource limits
+        """
+        limits = app.config.get('JOB_RESOURCE_LIMITS', {}).get(job_type, {})
+        self.max_memory = limits.get(
+            'address_space', app.config.get('JOB_MAX_ADDRESS_SPACE', 0))
+        self.max_cpu_time = limits.get(
+            'cpu_time', app.config.get('JOB_MAX_CPU_TIME', 0))
+        self.usage = {}
+        self._saved_limits = {}
+        self._saved_handler = None
+
+    @staticmethod
+    def _cpu_time() -> float:
+        """
+        Return CPU time used by the current process so far
+
+        :return: user + system CPU time in seconds
+        """
+        t = os.times()
+        return t.user + t.system
+
+    def __enter__(self) -> 'JobResourceMonitor':
+        # Reset the peak RSS counter (Linux only)
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            pass
+
+        self._io = read_proc_status('io')
+        self._start_cpu_time = self._cpu_time()
+        self._start_time = time.perf_counter()
+
+        try:
+            import resource
+        except ImportError:
+            return self
+
+        if self.max_memory:
+            vm_size = read_proc_status('status').get('VmSize', 0)*1024
+            try:
+                self._set_limit(
+                    resource.RLIMIT_AS,
+                    vm_size + int(self.max_memory*(1 << 20)))
+            except (ValueError, OSError, AttributeError):
+                app.logger.warning(
+                    'Could not set job address space limit', exc_info=True)
+
+        if self.max_cpu_time:
+            def sigxcpu_handler(*_):
+                # Postpone the next signal so that it is not resent while
+                # handling the interruption, but interrupt the job again if it
+                # keeps running
+                try:
+                    resource.setrlimit(resource.RLIMIT_CPU, (
+                        int(self._cpu_time() + CPU_TIME_LIMIT_GRACE + 1),
+                        resource.getrlimit(resource.RLIMIT_CPU)[1]))
+                except (ValueError, OSError):
+                    pass
+                raise CPUTimeLimitExceeded()
+
+            try:
+                self._saved_handler = signal.signal(
+                    signal.SIGXCPU, sigxcpu_handler)
+                self._set_limit(
+                    resource.RLIMIT_CPU,
+                    int(self._start_cpu_time + self.max_cpu_time + 1))
+            except (ValueError, OSError, AttributeError):
+                app.logger.warning(
+                    'Could not set job CPU time limit', exc_info=True)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._restore_limits()
+        if self._saved_handler is not None:
+            signal.signal(signal.SIGXCPU, self._saved_handler)
+            self._saved_handler = None
+
+        self.usage = dict(
+            wall_time=time.perf_counter() - self._start_time,
+            cpu_time=self._cpu_time() - self._start_cpu_time,
+        )
+        peak_rss = read_proc_status('status').get('VmHWM')
+        if peak_rss is not None:
+            self.usage['peak_rss'] = peak_rss/1024
+        else:
+            # Peak RSS of the worker process since it was started
+            rss = get_rss()
+            if rss is not None:
+                self.usage['peak_rss'] = rss
+        io = read_proc_status('io')
+        if io and self._io:
+            self.usage['bytes_read'] = io['rchar'] - self._io['rchar']
+            self.usage['bytes_written'] = io['wchar'] - self._io['wchar']
+
+        if exc_type is not None and issubclass(
+                exc_type, CPUTimeLimitExceeded):
+            raise JobResourceLimitError(
+                resource='CPU time', limit=self.max_cpu_time) from exc_val
+        if exc_type is MemoryError and self.max_memory:
+            # Report memory limit violation instead of a bare MemoryError
+            raise JobResourceLimitError(
+                resource='memory', limit=self.max_memory) from exc_val
+
+    def _set_limit(self, res: int, soft: int) -> None:
+        """
+        Lower the soft limit on the given resource, keeping the hard limit,
+        and remember the original limit
+
+        :param res: resource ID, e.g. `resource.RLIMIT_AS`
+        :param soft: new soft limit
+
+        :return: None
+        """
+        import resource
+        old_soft, hard = resource.getrlimit(res)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        if old_soft != resource.RLIM_INFINITY:
+            soft = min(soft, old_soft)
+        resource.setrlimit(res, (soft, hard))
+        self._saved_limits.setdefault(res, (old_soft, hard))
+
+    def _restore_limits(self, res: Optional[int] = None) -> None:
+        """
+        Restore the original resource limits
+
+        :param res: optional resource ID; default: all resources limited by
+            :meth:`_set_limit`
+
+        :return: None
+        """
+        import resource
+        for r in [res] if res is not None else list(self._saved_limits):
+            limits = self._saved_limits.pop(r, None)
+            if limits is not None:
+                try:
+                    resource.setrlimit(r, limits)
+                except (ValueError, OSError):
+                    pass
+
+
+class JobProfiler(object):
+    """
+    Context manager that profiles the job run in the current process: records
+    a deterministic profile by :mod:`cProfile` and periodically samples
+    the call stack of the main thread (Unix only), then saves both as job files
+
+    Usage::
+        profiler = JobProfiler()
+        with profiler:
+            job.run()
+        profiler.save(job)
+    """
+    def __init__(self, interval: float = 0.01):
+        """
+        Create a job profiler
+
+        :param interval: call stack sampling interval in seconds of CPU time;
+            0 = do not sample
+        """
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self._saved_handler = None
+
+    def __enter__(self) -> 'JobProfiler':
+        if self.interval and hasattr(signal, 'setitimer') and \
+                threading.current_thread() is threading.main_thread():
+            self._saved_handler = signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.profile.disable()
+        if self._saved_handler is not None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._saved_handler)
+            self._saved_handler = None
+
+    def _sample(self, _, frame) -> None:
+        """
+        SIGPROF handler: record the call stack of the interrupted frame
+
+        :param frame: current stack frame
+
+        :return: None
+        """
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{} ({}:{:d})'.format(
+                code.co_name, os.path.basename(code.co_filename),
+                code.co_firstlineno).replace(';', ':'))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+    def save(self, job: Job) -> None:
+        """
+        Save the profile to the job files "profile" (marshalled
+        :class:`pstats.Stats` data, load with `pstats.Stats(filename)`) and
+        "profile_stacks" (collapsed stacks for flame graph tools, one line per
+        unique call stack: "frame;frame;... number_of_samples")
+
+        :param job: profiled job
+
+        :return: None
+        """
+        self.profile.create_stats()
+        with job.open_job_file(
+                'profile', 'application/octet-stream',
+                {'Content-Disposition':
+                 'attachment; filename=job_{}.pstats'.format(job.id)}) as f:
+            marshal.dump(self.profile.stats, f)
+        with job.open_job_file('profile_stacks', 'text/plain') as f:
+            for stack, n in self.stacks.most_common():
+                f.write('{} {:d}\n'.format(stack, n).encode('utf8'))
+
+    def print_stats(self) -> None:
+        """
+        Print the profile sorted by the internal time
+
+        :return: None
+        """
+        pstats.Stats(self.profile).sort_stats('time').print_stats()
+
+
+class JobWorker(object):
+    """
+    Base job worker class that runs the jobs and subtasks received from the job
+    server; subclassed by :class:`JobWorkerProcess` for the local worker
+    processes started by the job server and by :class:`RemoteJobWorker` for
+    the standalone workers attached to the job server over the network
+    """
+    @staticmethod
+    def prewarm() -> None:
+        """
+        Import the modules listed in JOB_WORKER_PRELOAD so that the first job
+        run by the worker does not pay the import cost
+
+        :return: None
+        """
+        for module in app.config.get('JOB_WORKER_PRELOAD', []):
+            # noinspection PyBroadException
+            try:
+                import_module(module)
+            except Exception:
+                app.logger.warning(
+                    'Could not preload module %s', module, exc_info=True)
+
+    def run_subtask(self, subtask, result_queue, abort_event,
+                    set_current_user, close_data_file_session):
+        """
+        Run a subtask of a job running in another worker process and send
+        the subtask result to the job server
+
+        :param dict subtask: subtask description created by
+            :meth:`Job.run_subtasks`
+        :param multiprocessing.Queue result_queue: job state/result queue
+        :param multiprocessing.Event abort_event: job cancel event (Windows and
+            remote workers)
+        :param set_current_user: function that sets the current user for
+            the subtask
+        :param close_data_file_session: function that closes the user's data
+            file db session
+
+        :return: None
+        """
+        user_id = subtask['job'].get('user_id')
+        user_session = None
+        # Apply the job's resource limits to the subtask and report the used
+        # resources to the parent job
+        monitor = JobResourceMonitor(subtask['job'].get('type'))
+        try:
+            if abort_event is not None:
+                abort_event.clear()
+            user_session = set_current_user(user_id)
+            with monitor:
+                res = run_subtask(subtask, result_queue)
+        except KeyboardInterrupt:
+            # Parent job canceled
+            res = dict(
+                batch=subtask['batch'], index=subtask['index'],
+                errors=['Subtask canceled'])
+        except Exception as e:
+            res = dict(
+                batch=subtask['batch'], index=subtask['index'],
+                errors=[str(e)])
+        finally:
+            if user_session is not None:
+                user_session.remove()
+            close_data_file_session(user_id)
+        if monitor.usage:
+            res['usage'] = monitor.usage
+        result_queue.put(dict(
+            id=subtask['parent'], pid=self.ident, subtask_result=res))
 
     def body(self, job_queue, result_queue, abort_event):
         """
         Job worker process
 
-        :param multiprocessing.Queue job_queue: single-producer
-            multiple-consumer task queue; holds incoming jobs -- serialized Job
-            objects
+        :param multiprocessing.Queue job_queue: worker's own task queue; holds
+            incoming jobs -- serialized Job objects -- and subtasks dispatched
+            by the job server scheduler, as well as the results of subtasks
+            of the job run by the worker
         :param multiprocessing.Queue result_queue: multiple-producer
             single-consumer result queue; holds job state/result updates
         :param multiprocessing.Event abort_event: event object used to cancel
-            a job; only used on Windows, other systems use OS signals
+            a job; only used on Windows and by remote workers, local workers on
+            other systems are canceled by OS signals
 
-        :return: None
+        :return: True if the worker exits to be recycled (see
+            JOB_WORKER_MAX_JOBS and JOB_WORKER_MAX_RSS), False if it was told
+            to terminate
         """
         prefix = '[Job worker {}]'.format(os.getpid())
 
-        if WINDOWS:
+        if abort_event is not None:
             # Start an extra thread waiting for abort event and raising
             # KeyboardInterrupt in the main thread context
             stop_event = Event()
@@ -336,9 +976,61 @@ class JobWorkerProcess(Process):
             # noinspection PyProtectedMember
             users._init_users()
 
+        def set_current_user(user_id):
+            """
+            Set auth.current_user to the actual db user
+
+            :param int | None user_id: job user ID
+
+            :return: user db session to be removed after running the job
+            """
+            if user_id is None:
+                auth.current_user = auth.AnonymousUser()
+                return None
+
+            _user_session = users.db.create_scoped_session()
+            try:
+                auth.current_user = _user_session.query(users.DbUser) \
+                    .get(user_id)
+            except Exception:
+                print('!!! User db query error for user ID', user_id)
+                _user_session.remove()
+                raise
+            if auth.current_user is None:
+                print('!!! No user for user ID', user_id)
+                auth.current_user = auth.AnonymousUser()
+            return _user_session
+
+        def close_data_file_session(user_id):
+            """
+            Close the possible data file db session
+
+            :param int | None user_id: job user ID
+
+            :return: None
+            """
+            # noinspection PyBroadException
+            try:
+                with data_files.data_files_engine_lock:
+                    data_files.data_files_engine[
+                        data_files.get_root(user_id)
+                    ].remove()
+            except Exception:
+                pass
+
+        # Import heavy modules and initialize plugins before accepting jobs
+        self.prewarm()
+        result_queue.put(dict(id=None, pid=self.ident, ready=True))
+
+        max_jobs = app.config.get('JOB_WORKER_MAX_JOBS', 0)
+        max_rss = app.config.get('JOB_WORKER_MAX_RSS', 0)
+        jobs_done = 0
+        retire = False
+        subtask_job = None
+
         # Wait for an incoming job request
         app.logger.info('%s Waiting for jobs', prefix)
-        while True:
+        while not retire:
             # noinspection PyBroadException
             try:
                 job_descr = job_queue.get()
@@ -346,6 +1038,21 @@ class JobWorkerProcess(Process):
                     # Empty job request = terminate worker
                     app.logger.info('%s Terminating', prefix)
                     break
+                if 'subtask_result' in job_descr:
+                    # Late result of a subtask of a canceled job
+                    continue
+                if job_descr.get('subtask'):
+                    # Run a subtask of a job running in another worker
+                    # process; the job fields come with the first subtask of
+                    # each batch
+                    if 'job' in job_descr:
+                        subtask_job = job_descr['job']
+                    else:
+                        job_descr['job'] = subtask_job
+                    self.run_subtask(
+                        job_descr, result_queue, abort_event, set_current_user,
+                        close_data_file_session)
+                    continue
                 app.logger.debug('%s Got job request: %s', prefix, job_descr)
 
                 # Create job object from description; job_descr is guaranteed to
@@ -353,7 +1060,8 @@ class JobWorkerProcess(Process):
                 # job plugin is guaranteed to exist
                 try:
                     job = Job(
-                        _queue=result_queue, _set_defaults=True, **job_descr)
+                        _queue=result_queue, _task_queue=job_queue,
+                        _set_defaults=True, **job_descr)
                 except Exception as e:
                     # Report job creation error to job server
                     app.logger.warning(
@@ -366,41 +1074,30 @@ class JobWorkerProcess(Process):
                     continue
 
                 # Set auth.current_user to the actual db user
-                if job.user_id is not None:
-                    user_session = users.db.create_scoped_session()
-                    try:
-                        auth.current_user = user_session.query(users.DbUser) \
-                            .get(job.user_id)
-                    except Exception:
-                        print(
-                            '!!! User db query error for user ID', job.user_id)
-                        user_session.remove()
-                        raise
-                    if auth.current_user is None:
-                        print('!!! No user for user ID', job.user_id)
-                        auth.current_user = auth.AnonymousUser()
-                else:
-                    auth.current_user = auth.AnonymousUser()
-                    user_session = None
+                user_session = set_current_user(job.user_id)
 
                 # Clear the possible cancel request
-                if WINDOWS:
+                if abort_event is not None:
                     abort_event.clear()
 
                 # Notify the job server that the job is running and run it
-                result_queue.put(dict(id=job_descr['id'], pid=self.ident))
                 job.state.status = 'in_progress'
                 job.update()
+                monitor = JobResourceMonitor(job.type)
+                profiler = None
+                if job.profile or app.config.get('PROFILE'):
+                    # Profile the job if requested by the client or enabled
+                    # for all jobs
+                    profiler = JobProfiler(
+                        app.config.get('JOB_PROFILE_SAMPLING_INTERVAL', 0.01))
+                reset_job_phase_times()
                 try:
-                    if app.config.get('PROFILE'):
-                        # Profile the job if enabled
-                        print('{}\nProfiling job "{}" (ID {})'.format(
-                            '-'*80, job.type, job.id))
-                        cProfile.runctx(
-                            'job.run()', {}, {'job': job}, sort='time')
-                        print('-'*80)
-                    else:
-                        job.run()
+                    with monitor:
+                        if profiler is not None:
+                            with profiler:
+                                job.run()
+                        else:
+                            job.run()
                 except KeyboardInterrupt:
                     # Job canceled
                     job.state.status = 'canceled'
@@ -416,18 +1113,61 @@ class JobWorkerProcess(Process):
                         job.state.status = 'completed'
                         job.state.progress = 100
                     job.state.completed_on = datetime.utcnow()
-                    job.update()
-                    result_queue.put(dict(id=None, pid=self.ident))
+                    for name, val in monitor.usage.items():
+                        setattr(job.state, name, val)
+                    job.add_subtask_usage()
+                    phase_times = get_job_phase_times()
+                    if 'wall_time' in monitor.usage:
+                        job.state.compute_time = max(
+                            monitor.usage['wall_time'] -
+                            phase_times.get('load', 0) -
+                            phase_times.get('save', 0), 0)
+
+                    # Recycle the worker after the given number of jobs or
+                    # when using too much memory; must notify the job server
+                    # before reporting job completion so that it does not
+                    # dispatch more jobs to this worker
+                    jobs_done += 1
+                    if max_jobs and jobs_done >= max_jobs:
+                        retire = True
+                    elif max_rss:
+                        rss = get_rss()
+                        retire = rss is not None and rss > max_rss
+                    if retire:
+                        app.logger.info(
+                            '%s Recycling worker after %d job(s)', prefix,
+                            jobs_done)
+                        result_queue.put(
+                            dict(id=None, pid=self.ident, retire=True))
 
-                    # Close the possible data file db session
                     # noinspection PyBroadException
                     try:
-                        with data_files.data_files_engine_lock:
-                            data_files.data_files_engine[
-                                data_files.get_root(job.user_id)
-                            ].remove()
+                        job.store_result_tables()
                     except Exception:
-                        pass
+                        app.logger.warning(
+                            '%s Could not store job result tables', prefix,
+                            exc_info=True)
+                    if profiler is not None:
+                        if app.config.get('PROFILE'):
+                            print('{}\nProfile of job "{}" (ID {})'.format(
+                                '-'*80, job.type, job.id))
+                            profiler.print_stats()
+                            print('-'*80)
+                        # noinspection PyBroadException
+                        try:
+                            profiler.save(job)
+                        except Exception:
+                            app.logger.warning(
+                                '%s Could not save job profile', prefix,
+                                exc_info=True)
+
+                    # Save time includes storing result tables and profile
+                    phase_times = get_job_phase_times()
+                    job.state.load_time = phase_times.get('load', 0)
+                    job.state.save_time = phase_times.get('save', 0)
+                    job.update()
+
+                    close_data_file_session(job.user_id)
 
             except KeyboardInterrupt:
                 # Ignore interrupt signals occasionally sent before the job has
@@ -437,22 +1177,55 @@ class JobWorkerProcess(Process):
                 app.logger.warning(
                     '%s Internal job queue error', prefix, exc_info=True)
 
-        if WINDOWS:
+        if abort_event is not None:
             # Terminate abort event listener
             stop_event.set()
             abort_event.set()
             abort_event_listener.join()
 
+        return retire
+
+
+class JobWorkerProcess(JobWorker, Process):
+    """
+    Job worker process class
+    """
+    abort_event = None
+
+    def __init__(self, job_queue, result_queue):
+        if WINDOWS:
+            self.abort_event = Event()
+
+        super(JobWorkerProcess, self).__init__(
+            target=self.body, args=(job_queue, result_queue, self.abort_event))
+        self.daemon = True
+
+        self.start()
+
 
 class JobWorkerProcessWrapper(object):
     """
-    Wrapper class that holds a :class:`JobWorkerProcess` instance and a job ID
-    currently run by this process
+    Wrapper class that holds a :class:`JobWorkerProcess` instance, its job
+    queue, and a job ID currently run by this process
     """
     process = None
+    job_queue = None
+    ready = False  # worker has finished initialization and accepts jobs
+    retiring = False  # worker was told to exit or is exiting on its own
+    recycled = False  # worker is exiting after max jobs or memory exceeded
+    idle_since = None  # time of the last job completion
+    subtask = None  # subtask being run by the worker
+    subtask_batch = None  # subtask batch whose job fields the worker has
+    remote = False  # standalone worker attached over the network
+    busy_time = 0  # total time spent running jobs, in seconds
+    _busy_since = None
     _job_id_lock = None
     _job_id = None
 
+    # Serializes sending jobs and the termination request to the worker, so
+    # that no job is queued behind the termination request
+    send_lock = None
+
     @property
     def job_id(self):
         """Currently running job ID"""
@@ -462,6 +1235,11 @@ class JobWorkerProcessWrapper(object):
     @job_id.setter
     def job_id(self, value):
         with self._job_id_lock.acquire_write():
+            if value is not None and self._job_id is None:
+                self._busy_since = time.monotonic()
+            elif value is None and self._busy_since is not None:
+                self.busy_time += time.monotonic() - self._busy_since
+                self._busy_since = None
             self._job_id = value
 
     @property
@@ -469,9 +1247,28 @@ class JobWorkerProcessWrapper(object):
         """Worker process ID"""
         return self.process.ident
 
-    def __init__(self, job_queue, result_queue):
+    def __init__(self, result_queue):
         self._job_id_lock = RWLock()
-        self.process = JobWorkerProcess(job_queue, result_queue)
+        self.send_lock = threading.Lock()
+        self.job_queue = Queue()
+        self.idle_since = time.monotonic()
+        self.process = JobWorkerProcess(self.job_queue, result_queue)
+
+    @property
+    def is_idle(self) -> bool:
+        """Worker is ready to accept a job"""
+        return self.ready and not self.retiring and self.job_id is None and \
+            self.subtask is None
+
+    def retire(self) -> None:
+        """
+        Tell the worker process to exit after finishing the current job
+
+        :return: None
+        """
+        with self.send_lock:
+            self.retiring = True
+            self.job_queue.put(None)
 
     def cancel_current_job(self):
         """
@@ -492,13 +1289,1062 @@ class JobWorkerProcessWrapper(object):
             # noinspection PyTypeChecker
             os.kill(self.ident, s)
 
-    def join(self) -> None:
+    def is_alive(self) -> bool:
         """
-        Wait for the worker process completion
+        Is the worker process running?
+
+        :return: False if the worker process has terminated
+        """
+        return self.process.is_alive()
+
+    def join(self) -> None:
+        """
+        Wait for the worker process completion
         """
         self.process.join()
 
 
+class RemoteJobWorkerWrapper(JobWorkerProcessWrapper):
+    """
+    Job server-side counterpart of a standalone :class:`RemoteJobWorker`
+    attached to the job server; jobs are sent to the remote worker via its job
+    queue, which it reads over the network, and canceled by setting its abort
+    event
+    """
+    remote = True
+    detached = False  # remote worker has exited
+    name = None  # remote worker hostname and process ID
+
+    def __init__(self, ident: int, name: str):
+        """
+        Create a remote worker wrapper
+
+        :param ident: unique negative worker ID assigned by the job server;
+            does not clash with the process IDs of the local workers
+        :param name: remote worker description for logging
+        """
+        self._job_id_lock = RWLock()
+        self.send_lock = threading.Lock()
+        self._ident = ident
+        self.name = name
+        self.job_queue = queue.Queue()
+        self.abort_event = threading.Event()
+        self.idle_since = self.last_heartbeat = time.monotonic()
+
+    @property
+    def ident(self):
+        """Worker ID"""
+        return self._ident
+
+    def cancel_current_job(self):
+        """
+        Tell the remote worker to abort the current job
+
+        :return: None
+        """
+        self.abort_event.set()
+
+    def is_alive(self) -> bool:
+        """
+        Is the remote worker still attached?
+
+        :return: False if the worker has exited or has not sent a heartbeat
+            within REMOTE_WORKER_TIMEOUT seconds
+        """
+        return not self.detached and \
+            time.monotonic() - self.last_heartbeat < REMOTE_WORKER_TIMEOUT
+
+    def join(self) -> None:
+        """
+        Remote workers are not waited for
+        """
+        pass
+
+
+class JobWorkerRegistry(object):
+    """
+    Job server object accessed by the standalone job workers over the network
+    via :class:`JobWorkerManager`; lets the workers attach to the job server's
+    worker pool and obtain the queues for receiving jobs and sending job state
+    updates
+    """
+    def __init__(self, pool, pool_lock, result_queue):
+        """
+        Create the registry
+
+        :param list pool: worker process pool
+        :param RWLock pool_lock: pool access lock
+        :param multiprocessing.Queue result_queue: job state/result queue
+        """
+        self.pool = pool
+        self.pool_lock = pool_lock
+        self.result_queue = result_queue
+        self.lock = threading.Lock()
+        self.last_ident = 0
+
+    def _get_worker(self, ident: int) -> RemoteJobWorkerWrapper:
+        """
+        Return the remote worker with the given ID
+
+        :param ident: worker ID returned by :meth:`attach`
+
+        :return: remote worker wrapper
+        """
+        with self.pool_lock.acquire_read():
+            for w in self.pool:
+                if w.remote and w.ident == ident:
+                    return w
+        raise KeyError('Unknown remote job worker {}'.format(ident))
+
+    def attach(self, name: str) -> int:
+        """
+        Add a new remote worker to the pool; the worker starts receiving jobs
+        after it reports being ready via the result queue
+
+        :param name: remote worker description for logging
+
+        :return: worker ID
+        """
+        with self.lock:
+            self.last_ident -= 1
+            ident = self.last_ident
+        with self.pool_lock.acquire_write():
+            self.pool.append(RemoteJobWorkerWrapper(ident, name))
+        app.logger.info('Remote job worker %s (%s) attached', ident, name)
+        return ident
+
+    def detach(self, ident: int) -> None:
+        """
+        Called by a remote worker when it exits
+
+        :param ident: worker ID returned by :meth:`attach`
+
+        :return: None
+        """
+        try:
+            w = self._get_worker(ident)
+        except KeyError:
+            return
+        w.detached = True
+        app.logger.info('Remote job worker %s (%s) detached', ident, w.name)
+
+    def heartbeat(self, ident: int) -> bool:
+        """
+        Called periodically by a remote worker to indicate that it is alive
+
+        :param ident: worker ID returned by :meth:`attach`
+
+        :return: False if the worker was removed from the pool and should exit
+        """
+        try:
+            w = self._get_worker(ident)
+        except KeyError:
+            return False
+        w.last_heartbeat = time.monotonic()
+        return True
+
+    def get_job_queue(self, ident: int) -> queue.Queue:
+        """
+        Return the job queue of a remote worker
+
+        :param ident: worker ID returned by :meth:`attach`
+
+        :return: worker's job queue
+        """
+        return self._get_worker(ident).job_queue
+
+    def get_abort_event(self, ident: int) -> threading.Event:
+        """
+        Return the job cancel event of a remote worker
+
+        :param ident: worker ID returned by :meth:`attach`
+
+        :return: worker's abort event
+        """
+        return self._get_worker(ident).abort_event
+
+    def get_result_queue(self) -> Queue:
+        """
+        Return the job state/result queue
+
+        :return: result queue shared by all workers
+        """
+        return self.result_queue
+
+
+class JobWorkerManager(BaseManager):
+    """
+    Manager providing authenticated network access to
+    :class:`JobWorkerRegistry` and the queues it returns; the job server
+    registers the registry instance via the "get_registry" callable
+    """
+    pass
+
+
+JobWorkerManager.register('Queue')
+JobWorkerManager.register('Event')
+JobWorkerManager.register('get_registry', method_to_typeid=dict(
+    get_job_queue='Queue', get_abort_event='Event',
+    get_result_queue='Queue'))
+
+
+def get_job_worker_key() -> bytes:
+    """
+    Return the shared secret used to authenticate remote job workers
+
+    :return: JOB_SERVER_WORKER_KEY as bytes
+    """
+    key = app.config.get('JOB_SERVER_WORKER_KEY')
+    if not key:
+        raise JobServerError(
+            reason='JOB_SERVER_WORKER_KEY must be set to use remote job '
+            'workers')
+    if isinstance(key, str):
+        key = key.encode('utf8')
+    return key
+
+
+class RemoteJobWorker(JobWorker):
+    """
+    Standalone job worker process running on the same or another host and
+    attached to the job server over the network (see
+    JOB_SERVER_WORKER_ADDRESS); the worker must have access to the same data
+    file and job file storage as the job server, e.g. via a shared filesystem,
+    and must use the same configuration
+
+    Usage::
+        RemoteJobWorker(('jobserver.local', 2718)).run()
+    """
+    ident = None  # worker ID assigned by the job server
+
+    def __init__(self, address: Tuple[str, int], name: Optional[str] = None):
+        """
+        Connect to the job server and attach to its worker pool
+
+        :param address: job server (host, port) for remote workers
+        :param name: optional worker description shown in the job server log;
+            defaults to "hostname:pid"
+        """
+        self.manager = JobWorkerManager(
+            address=tuple(address), authkey=get_job_worker_key())
+        self.manager.connect()
+        self.registry = self.manager.get_registry()
+        self.ident = self.registry.attach(
+            name or '{}:{}'.format(socket.gethostname(), os.getpid()))
+
+    def run(self) -> bool:
+        """
+        Run jobs sent by the job server until told to terminate or recycle;
+        the process exits if the connection to the job server is lost
+
+        :return: True if the worker exits to be recycled
+        """
+        stop_event = threading.Event()
+
+        def heartbeat_body():
+            while not stop_event.wait(REMOTE_WORKER_HEARTBEAT):
+                # noinspection PyBroadException
+                try:
+                    alive = self.registry.heartbeat(self.ident)
+                except Exception:
+                    alive = False
+                if not alive:
+                    app.logger.error(
+                        '[Job worker %s] Lost connection to job server',
+                        os.getpid())
+                    # The main thread may be blocked waiting for a job
+                    os._exit(1)
+
+        # Shared memory segments created by remote workers could not be
+        # released by the job server
+        app.config['JOB_SHARED_MEMORY'] = False
+
+        heartbeat = threading.Thread(target=heartbeat_body, daemon=True)
+        heartbeat.start()
+        try:
+            return self.body(
+                self.registry.get_job_queue(self.ident),
+                self.registry.get_result_queue(),
+                self.registry.get_abort_event(self.ident))
+        finally:
+            stop_event.set()
+            # noinspection PyBroadException
+            try:
+                self.registry.detach(self.ident)
+            except Exception:
+                pass
+
+
+class JobScheduler(object):
+    """
+    Job server scheduler that keeps submitted jobs in per-user queues and
+    dispatches them to the worker processes as soon as a worker is idle
+
+    Jobs are dispatched by priority class first ("interactive" jobs are always
+    dispatched ahead of "normal" ones, and those are dispatched ahead of
+    "batch" jobs); within a class, users get their share of workers
+    proportional to their JOB_USER_WEIGHTS using stride scheduling, subject to
+    the JOB_USER_MAX_RUNNING per-user limit on the number of concurrently
+    running jobs. Jobs of the same user and priority are run in the order of
+    submission.
+
+    Subtasks created by the running jobs via :meth:`Job.run_subtasks` are
+    dispatched ahead of the queued jobs: to the worker running the parent job
+    while it is waiting for the subtask results and to the idle workers,
+    taking turns between the parent jobs.
+
+    The scheduler also estimates the queue position and start time of each
+    queued job by replaying the above dispatch order with the mean run times
+    of the previous jobs of each type.
+    """
+    priorities = ('interactive', 'normal', 'batch')
+
+    def __init__(self, pool, pool_lock, metrics=None):
+        """
+        Create a scheduler instance
+
+        :param list pool: worker process pool
+        :param RWLock pool_lock: pool access lock
+        :param JobServerMetrics metrics: optional job server metrics
+        """
+        self.pool = pool
+        self.pool_lock = pool_lock
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.queued_on = {}  # job ID -> time of submission
+        self.queues = {}  # user ID -> {priority: deque of jobs}
+        self.passes = {}  # user ID -> stride scheduling pass value
+        self.running = {}  # user ID -> number of dispatched jobs
+        self.dispatched = {}  # job ID -> (user ID, worker)
+        self.subtasks = {}  # parent job ID -> deque of queued subtasks
+        self.parents = {}  # parent job ID -> worker running the parent job
+        self.subtask_jobs = {}  # parent job ID -> job fields of its subtasks
+        self.started_on = {}  # job ID -> (job type, time of dispatching)
+        self.run_times = {}  # job type -> mean job run time
+        self.weights = app.config.get('JOB_USER_WEIGHTS', {})
+        self.max_running = app.config.get('JOB_USER_MAX_RUNNING', 0)
+
+    @property
+    def num_dispatched(self) -> int:
+        """Number of jobs dispatched to worker processes and not completed"""
+        with self.lock:
+            return len(self.dispatched)
+
+    def is_dispatched(self, job_id: int) -> bool:
+        """
+        Is the given job currently running?
+
+        :param job_id: job ID
+
+        :return: True if the job was dispatched to a worker process and has not
+            completed yet
+        """
+        with self.lock:
+            return job_id in self.dispatched
+
+    def num_pending(self) -> int:
+        """
+        Return the total number of queued jobs of all users
+
+        :return: number of jobs waiting to be dispatched
+        """
+        with self.lock:
+            return len(self.queued_on)
+
+    def num_user_pending(self, user_id: Optional[int]) -> int:
+        """
+        Return the number of queued jobs of the given user
+
+        :param user_id: user ID; None if authentication is disabled
+
+        :return: number of user's jobs waiting to be dispatched
+        """
+        with self.lock:
+            return sum(len(q) for q in self.queues.get(user_id, {}).values())
+
+    def record_run_time(self, job_type: str, run_time: float) -> None:
+        """
+        Update the mean run time of jobs of the given type
+
+        :param job_type: job type
+        :param run_time: run time of a completed job in seconds
+
+        :return: None
+        """
+        with self.lock:
+            mean = self.run_times.get(job_type)
+            self.run_times[job_type] = run_time if mean is None \
+                else mean + RUN_TIME_SMOOTHING*(run_time - mean)
+
+    def estimate_start(self) -> TDict[int, Tuple[int, Optional[float]]]:
+        """
+        Estimate the queue positions and start times of all queued jobs
+
+        :return: {job ID: (1-based position in the dispatch order, estimated
+            time in seconds until the job is dispatched or None if unknown),
+            ...}
+        """
+        estimates = {}
+        now = time.monotonic()
+        with self.lock:
+            with self.pool_lock.acquire_read():
+                num_workers = len([w for w in self.pool if not w.retiring])
+
+            default_run_time = None
+            if self.run_times:
+                default_run_time = sum(self.run_times.values()) / \
+                    len(self.run_times)
+
+            # Time left until each worker finishes its current job
+            free_in = []
+            if default_run_time is not None:
+                for job_type, started_on in self.started_on.values():
+                    free_in.append(max(self.run_times.get(
+                        job_type, default_run_time) - (now - started_on), 0))
+                free_in = sorted(free_in)[:num_workers]
+                free_in += [0]*(num_workers - len(free_in))
+                heapq.heapify(free_in)
+
+            # Replay the dispatch order of _next_job()
+            passes = dict(self.passes)
+            position = 0
+            for priority in self.priorities:
+                queues = {uid: deque(queues[priority])
+                          for uid, queues in self.queues.items()
+                          if queues[priority]}
+                while queues:
+                    uid = min(queues, key=passes.__getitem__)
+                    job = queues[uid].popleft()
+                    if not queues[uid]:
+                        del queues[uid]
+                    passes[uid] += 1/self.weights.get(uid, 1)
+                    position += 1
+
+                    wait = None
+                    if free_in:
+                        wait = heapq.heappop(free_in)
+                        heapq.heappush(free_in, wait + self.run_times.get(
+                            job['type'], default_run_time))
+                    estimates[job['id']] = (position, wait)
+
+        return estimates
+
+    def next_start(self) -> Optional[float]:
+        """
+        Estimate the time until the next queued job of any user is dispatched
+
+        :return: time in seconds or None if unknown or no jobs are queued
+        """
+        return min((wait for _, wait in self.estimate_start().values()
+                    if wait is not None), default=None)
+
+    def next_user_start(self, user_id: Optional[int]) -> Optional[float]:
+        """
+        Estimate the time until the next queued job of the given user is
+        dispatched
+
+        :param user_id: user ID; None if authentication is disabled
+
+        :return: time in seconds or None if unknown or no jobs are queued
+        """
+        estimates = self.estimate_start()
+        with self.lock:
+            job_ids = {job['id']
+                       for q in self.queues.get(user_id, {}).values()
+                       for job in q}
+        return min((estimates[job_id][1] for job_id in job_ids
+                    if job_id in estimates and
+                    estimates[job_id][1] is not None), default=None)
+
+    def get_priority(self, job: TDict[str, Any],
+                     priority: Optional[str] = None) -> str:
+        """
+        Return the effective priority class of a job being submitted
+
+        :param job: serialized job
+        :param priority: optional priority class requested by the client;
+            a client can lower, but not raise, the default job priority
+
+        :return: job priority class
+        """
+        # Pipeline jobs process the data files of all their stages
+        num_files = len(job.get('file_ids') or []) + sum(
+            len((stage.get('job') or {}).get('file_ids') or [])
+            for stage in job.get('stages') or [] if isinstance(stage, dict))
+        default_priority = 'interactive' if num_files <= 1 else 'normal'
+        if not priority:
+            return default_priority
+        if priority not in self.priorities:
+            raise ValidationError(
+                'priority', 'Priority must be one of: {}'.format(
+                    ', '.join(self.priorities)))
+        return self.priorities[max(
+            self.priorities.index(priority),
+            self.priorities.index(default_priority))]
+
+    def submit(self, job: TDict[str, Any], priority: str) -> None:
+        """
+        Add a job to the user's queue and dispatch jobs if possible
+
+        :param job: serialized job
+        :param priority: job priority class returned by :meth:`get_priority`
+
+        :return: None
+        """
+        user_id = job['user_id']
+        with self.lock:
+            if user_id not in self.queues:
+                self.queues[user_id] = {p: deque() for p in self.priorities}
+                # New users start at the current minimum pass value so that
+                # they do not get an unfair advantage over the existing users
+                self.passes[user_id] = min(self.passes.values(), default=0)
+            self.queues[user_id][priority].append(job)
+            self.queued_on[job['id']] = time.monotonic()
+        if self.metrics is not None:
+            self.metrics.job_submitted(job['type'])
+        self.dispatch()
+
+    def queue_depth(self) -> TDict[str, int]:
+        """
+        Return the number of queued jobs per job type
+
+        :return: dictionary {job type: number of jobs}
+        """
+        depth = {}
+        with self.lock:
+            for queues in self.queues.values():
+                for q in queues.values():
+                    for job in q:
+                        depth[job['type']] = depth.get(job['type'], 0) + 1
+        return depth
+
+    @property
+    def num_queued_subtasks(self) -> int:
+        """Number of subtasks waiting for an idle worker"""
+        with self.lock:
+            return sum(len(q) for q in self.subtasks.values())
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Remove a queued job that has not been dispatched yet
+
+        :param job_id: job ID
+
+        :return: True if the job was found in the queue and removed
+        """
+        with self.lock:
+            for user_id, queues in self.queues.items():
+                for q in queues.values():
+                    for job in q:
+                        if job['id'] == job_id:
+                            q.remove(job)
+                            self.queued_on.pop(job_id, None)
+                            self._cleanup(user_id)
+                            return True
+        return False
+
+    def abort(self, job_id: int) -> bool:
+        """
+        Send the abort signal to the worker process running the given job
+
+        :param job_id: job ID
+
+        :return: True if the job was dispatched to a worker and has not
+            completed yet
+        """
+        with self.lock:
+            try:
+                worker = self.dispatched[job_id][1]
+            except KeyError:
+                return False
+            worker.cancel_current_job()
+            return True
+
+    def job_done(self, job_id: int) -> None:
+        """
+        Called when a dispatched job is completed or canceled; dispatches
+        the next job
+
+        :param job_id: job ID
+
+        :return: None
+        """
+        with self.lock:
+            try:
+                user_id, worker = self.dispatched.pop(job_id)
+            except KeyError:
+                return
+            self.started_on.pop(job_id, None)
+            worker.job_id = None
+            worker.idle_since = time.monotonic()
+            self.running[user_id] -= 1
+            self._cleanup(user_id)
+            self._drop_subtasks(job_id)
+        self.dispatch()
+
+    def worker_lost(self, worker: JobWorkerProcessWrapper) -> Optional[int]:
+        """
+        Called when a worker process has terminated unexpectedly
+
+        :param worker: terminated worker
+
+        :return: ID of the job that was dispatched to the worker, if any
+        """
+        with self.lock:
+            subtask, worker.subtask = worker.subtask, None
+            if subtask is not None:
+                parent = self.parents.get(subtask['parent'])
+                if parent is not None and parent is not worker:
+                    # Report subtask failure to the parent job
+                    parent.job_queue.put(dict(subtask_result=dict(
+                        batch=subtask['batch'], index=subtask['index'],
+                        errors=['Job worker process terminated '
+                                'unexpectedly'])))
+
+            for job_id, (user_id, w) in self.dispatched.items():
+                if w is worker:
+                    del self.dispatched[job_id]
+                    self.started_on.pop(job_id, None)
+                    self.running[user_id] -= 1
+                    self._cleanup(user_id)
+                    self._drop_subtasks(job_id)
+                    return job_id
+        return None
+
+    def submit_subtasks(self, job_id: int,
+                        subtasks: TList[TDict[str, Any]],
+                        job: TDict[str, Any]) -> None:
+        """
+        Queue subtasks of a running job and dispatch them if possible
+
+        :param job_id: parent job ID
+        :param subtasks: subtask descriptions created by
+            :meth:`Job.run_subtasks`
+        :param job: serialized job fields shared by all subtasks
+
+        :return: None
+        """
+        with self.lock:
+            try:
+                worker = self.dispatched[job_id][1]
+            except KeyError:
+                # Parent job already completed or canceled
+                return
+            self.parents[job_id] = worker
+            self.subtask_jobs[job_id] = job
+            self.subtasks.setdefault(job_id, deque()).extend(subtasks)
+        self.dispatch()
+
+    def subtask_done(self, job_id: int, pid: int,
+                     result: TDict[str, Any]) -> None:
+        """
+        Called when a subtask is completed; forwards the subtask result to
+        the worker running the parent job and dispatches the next subtask or
+        job
+
+        :param job_id: parent job ID
+        :param pid: ID of the worker process that ran the subtask
+        :param result: subtask result returned by :func:`run_subtask`
+
+        :return: None
+        """
+        with self.lock:
+            with self.pool_lock.acquire_read():
+                worker = None
+                for w in self.pool:
+                    if w.ident == pid:
+                        worker = w
+                        break
+            if worker is not None and worker.subtask is not None and \
+                    worker.subtask['parent'] == job_id:
+                worker.subtask = None
+                if worker.job_id is None:
+                    worker.idle_since = time.monotonic()
+
+            parent = self.parents.get(job_id)
+            if parent is not None and parent is not worker:
+                # The worker running the parent job already has the results
+                # of the subtasks it ran itself
+                parent.job_queue.put(dict(subtask_result=result))
+        self.dispatch()
+
+    def cancel_subtasks(self, job_id: int) -> None:
+        """
+        Cancel all queued and running subtasks of the given job
+
+        :param job_id: parent job ID
+
+        :return: None
+        """
+        with self.lock:
+            self._drop_subtasks(job_id)
+
+    def _drop_subtasks(self, job_id: int) -> None:
+        """
+        Remove queued subtasks of the given job and cancel its subtasks that
+        are being run by other workers; must be called with the scheduler lock
+        held
+
+        :param job_id: parent job ID
+
+        :return: None
+        """
+        self.subtasks.pop(job_id, None)
+        self.subtask_jobs.pop(job_id, None)
+        parent = self.parents.pop(job_id, None)
+        if parent is None:
+            return
+        with self.pool_lock.acquire_read():
+            for worker in self.pool:
+                if worker is not parent and worker.subtask is not None and \
+                        worker.subtask['parent'] == job_id:
+                    # noinspection PyBroadException
+                    try:
+                        worker.cancel_current_job()
+                    except Exception:
+                        pass
+
+    def dispatch(self) -> None:
+        """
+        Send jobs to idle worker processes
+
+        :return: None
+        """
+        # Keep the pool locked until all jobs are sent, so that the pool
+        # manager does not retire the selected idle workers in the meantime
+        with self.lock, self.pool_lock.acquire_read():
+            idle_workers = [w for w in self.pool if w.is_idle]
+
+            # Workers running the parent jobs run their own subtasks while
+            # waiting for the other subtasks
+            for job_id, worker in self.parents.items():
+                if worker.subtask is None and self.subtasks.get(job_id):
+                    self._send_subtask(worker, job_id)
+
+            # Idle workers run the remaining subtasks, taking turns between
+            # the parent jobs, then the queued jobs
+            parents = deque(
+                job_id for job_id, q in self.subtasks.items() if q)
+            for worker in idle_workers:
+                with worker.send_lock:
+                    # The worker may have started exiting on its own
+                    if not worker.is_idle:
+                        continue
+
+                    while parents and not self.subtasks.get(parents[0]):
+                        parents.popleft()
+                    if parents:
+                        self._send_subtask(worker, parents[0])
+                        parents.rotate(-1)
+                        continue
+
+                    job = self._next_job()
+                    if job is None:
+                        break
+                    queued_on = self.queued_on.pop(job['id'], None)
+                    if self.metrics is not None and queued_on is not None:
+                        self.metrics.job_dispatched(
+                            job['type'], time.monotonic() - queued_on)
+                    self.dispatched[job['id']] = (job['user_id'], worker)
+                    self.started_on[job['id']] = (
+                        job['type'], time.monotonic())
+                    worker.job_id = job['id']
+                    worker.job_queue.put(job)
+
+    def _send_subtask(self, worker: JobWorkerProcessWrapper,
+                      job_id: int) -> None:
+        """
+        Send the next queued subtask of the given job to a worker; must be
+        called with the scheduler lock held
+
+        :param worker: worker process to run the subtask
+        :param job_id: parent job ID
+
+        :return: None
+        """
+        subtask = self.subtasks[job_id].popleft()
+        worker.subtask = subtask
+        if worker is not self.parents.get(job_id) and \
+                worker.subtask_batch != subtask['batch']:
+            # Send the job fields only with the first subtask of the batch
+            # run by the worker; the worker keeps them for the next subtasks.
+            # The parent job worker has its own job.
+            worker.subtask_batch = subtask['batch']
+            subtask = dict(subtask, job=self.subtask_jobs[job_id])
+        worker.job_queue.put(subtask)
+
+    def _next_job(self) -> Optional[TDict[str, Any]]:
+        """
+        Pick the next job to dispatch and update the scheduler state except
+        the job-worker assignment; must be called with the scheduler lock held
+
+        :return: serialized job or None if no jobs can be dispatched
+        """
+        for priority in self.priorities:
+            # User ID is None for all jobs if auth is disabled, so it cannot be
+            # used to indicate that no user was found
+            found, user_id = False, None
+            for uid, queues in self.queues.items():
+                if not queues[priority] or self.max_running and \
+                        self.running.get(uid, 0) >= self.max_running:
+                    continue
+                if not found or self.passes[uid] < self.passes[user_id]:
+                    found, user_id = True, uid
+            if not found:
+                continue
+
+            job = self.queues[user_id][priority].popleft()
+            self.passes[user_id] += 1/self.weights.get(user_id, 1)
+            self.running[user_id] = self.running.get(user_id, 0) + 1
+            return job
+
+        return None
+
+    def _cleanup(self, user_id: int) -> None:
+        """
+        Forget users having no queued or running jobs; must be called with the
+        scheduler lock held
+
+        :param user_id: user ID
+
+        :return: None
+        """
+        if self.running.get(user_id) or \
+                any(self.queues.get(user_id, {}).values()):
+            return
+        self.queues.pop(user_id, None)
+        self.passes.pop(user_id, None)
+        self.running.pop(user_id, None)
+
+
+class JobServerMetrics(object):
+    """
+    Job server performance counters returned by GET /jobs/metrics in
+    the Prometheus text exposition format
+
+    Queue wait times are measured by the scheduler from job submission to
+    dispatching the job to a worker process; run times are measured by the
+    worker process (see :class:`JobResourceMonitor`) and reported along with
+    the job completion.
+    """
+    # Histogram bucket upper bounds, in seconds
+    buckets = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue_wait = {}  # job type -> ([bucket counts], sum, count)
+        self.run_time = {}  # job type -> ([bucket counts], sum, count)
+        self.outcomes = {}  # (job type, outcome) -> number of jobs
+        self.submitted = {}  # job type -> number of jobs
+
+    def _observe(self, hist: TDict[str, Any], job_type: str,
+                 value: float) -> None:
+        """
+        Add a value to a histogram
+
+        :param hist: histogram dictionary
+        :param job_type: job type
+        :param value: observed value
+
+        :return: None
+        """
+        with self.lock:
+            counts, total, n = hist.get(
+                job_type, ([0]*len(self.buckets), 0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            hist[job_type] = (counts, total + value, n + 1)
+
+    def job_submitted(self, job_type: str) -> None:
+        """
+        Count a job submitted to the scheduler
+
+        :param job_type: job type
+
+        :return: None
+        """
+        with self.lock:
+            self.submitted[job_type] = self.submitted.get(job_type, 0) + 1
+
+    def job_dispatched(self, job_type: str, wait_time: float) -> None:
+        """
+        Record the queue wait time of a job dispatched to a worker process
+
+        :param job_type: job type
+        :param wait_time: time in seconds the job spent in the queue
+
+        :return: None
+        """
+        self._observe(self.queue_wait, job_type, wait_time)
+
+    def job_finished(self, job_type: str, outcome: str,
+                     run_time: Optional[float] = None) -> None:
+        """
+        Record the completion of a job
+
+        :param job_type: job type
+        :param outcome: "succeeded", "failed" (completed with errors), or
+            "canceled"
+        :param run_time: job run time in seconds reported by the worker
+            process, if any
+
+        :return: None
+        """
+        with self.lock:
+            key = (job_type, outcome)
+            self.outcomes[key] = self.outcomes.get(key, 0) + 1
+        if run_time is not None:
+            self._observe(self.run_time, job_type, run_time)
+
+    def render(self, gauges: TList[Tuple[str, str, TDict[str, Any], float]]) \
+            -> str:
+        """
+        Return all metrics in the Prometheus text exposition format
+
+        :param gauges: current values of the job server state metrics:
+            [(name, help, {label: value, ...}, value), ...]; samples of the same
+            metric must be adjacent
+
+        :return: metrics text
+        """
+        lines = []
+
+        def labels(d):
+            if not d:
+                return ''
+            return '{' + ','.join(
+                '{}="{}"'.format(
+                    name, str(val).replace('\\', '\\\\')
+                    .replace('"', '\\"').replace('\n', '\\n'))
+                for name, val in d.items()) + '}'
+
+        def header(name, help_text, kind):
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        last_name = None
+        for name, help_text, label_dict, value in gauges:
+            if name != last_name:
+                header(name, help_text, 'gauge')
+                last_name = name
+            lines.append('{}{} {}'.format(name, labels(label_dict), value))
+
+        with self.lock:
+            header(
+                'afterglow_jobs_submitted_total',
+                'Number of jobs submitted to the job scheduler', 'counter')
+            for job_type, n in sorted(self.submitted.items()):
+                lines.append('afterglow_jobs_submitted_total{} {}'.format(
+                    labels(dict(type=job_type)), n))
+
+            header(
+                'afterglow_jobs_finished_total',
+                'Number of finished jobs by outcome', 'counter')
+            for (job_type, outcome), n in sorted(self.outcomes.items()):
+                lines.append('afterglow_jobs_finished_total{} {}'.format(
+                    labels(dict(type=job_type, outcome=outcome)), n))
+
+            for name, help_text, hist in (
+                    ('afterglow_job_queue_wait_seconds',
+                     'Time from job submission to dispatching to a worker',
+                     self.queue_wait),
+                    ('afterglow_job_run_seconds', 'Job run time',
+                     self.run_time)):
+                header(name, help_text, 'histogram')
+                for job_type, (counts, total, n) in sorted(hist.items()):
+                    for bound, count in zip(self.buckets, counts):
+                        lines.append('{}_bucket{} {}'.format(
+                            name, labels(dict(type=job_type, le=bound)),
+                            count))
+                    lines.append('{}_bucket{} {}'.format(
+                        name, labels(dict(type=job_type, le='+Inf')), n))
+                    lines.append('{}_sum{} {}'.format(
+                        name, labels(dict(type=job_type)), total))
+                    lines.append('{}_count{} {}'.format(
+                        name, labels(dict(type=job_type)), n))
+
+        return '\n'.join(lines) + '\n'
+
+
+class JobStateNotifier(object):
+    """
+    Job server registry of job state changes used to wake up the clients
+    waiting for state changes of the given jobs (long polling)
+
+    Each state change increments a global sequence number; the client passes
+    the sequence number returned by the previous request to receive only
+    the changes that happened since then.
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        # Start with a time-based sequence number so that clients resuming
+        # after a job server restart do not skip the new changes
+        self.seq = int(time.time()*1000)
+        self.versions = {}  # job ID -> (user ID, seq of the last state change)
+
+    def notify(self, changes: TList[Tuple[int, Optional[int]]]) -> None:
+        """
+        Register job state changes and wake up the waiting clients
+
+        :param changes: list of (job ID, user ID) pairs
+
+        :return: None
+        """
+        if not changes:
+            return
+        with self.cond:
+            self.seq += 1
+            for job_id, user_id in changes:
+                self.versions[job_id] = (user_id, self.seq)
+            self.cond.notify_all()
+
+    def forget(self, job_id: int) -> None:
+        """
+        Remove a deleted job from the registry
+
+        :param job_id: job ID
+
+        :return: None
+        """
+        with self.cond:
+            self.versions.pop(job_id, None)
+
+    def wait(self, user_id: Optional[int], job_ids: Optional[TList[int]],
+             since: int, timeout: float) -> Tuple[int, TList[int]]:
+        """
+        Wait until the state of any of the given user's jobs changes after
+        the given sequence number
+
+        :param user_id: user ID
+        :param job_ids: IDs of jobs to watch; None = all user's jobs
+        :param since: sequence number returned by the previous request
+        :param timeout: maximum waiting time in seconds
+
+        :return: current sequence number and IDs of the changed jobs; empty
+            list on timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                if job_ids is None:
+                    changed = [
+                        job_id for job_id, (uid, seq) in self.versions.items()
+                        if uid == user_id and seq > since]
+                else:
+                    changed = []
+                    for job_id in job_ids:
+                        uid, seq = self.versions.get(job_id, (None, 0))
+                        if uid == user_id and seq > since:
+                            changed.append(job_id)
+                if changed:
+                    return self.seq, changed
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self.seq, []
+                self.cond.wait(remaining)
+
+
 db_field_type_mapping = {
     fields.Boolean: Boolean,
     fields.Date: Date,
@@ -584,39 +2430,532 @@ def db_from_schema(base_class, schema: AfterglowSchema,
     )
 
 
-msg_hdr = '!i'
+def collect_file_ids(obj: Any, file_ids: set) -> None:
+    """
+    Find data file IDs referenced by a serialized job, including those in
+    nested structures (e.g. sources)
+
+    :param obj: serialized job or its part
+    :param file_ids: set of data file IDs to update
+
+    :return: None
+    """
+    if isinstance(obj, dict):
+        for name, val in obj.items():
+            if name == 'file_id' and isinstance(val, int):
+                file_ids.add(val)
+            elif name == 'file_ids' and isinstance(val, list):
+                file_ids.update(
+                    file_id for file_id in val if isinstance(file_id, int))
+            else:
+                collect_file_ids(val, file_ids)
+    elif isinstance(obj, list):
+        for item in obj:
+            collect_file_ids(item, file_ids)
+
+
+def get_job_cache_key(job: TDict[str, Any]) -> Optional[str]:
+    """
+    Return the key used to find an identical job submitted earlier: a hash of
+    the job type, user ID, client session ID, normalized job parameters, and
+    versions (modification times and sizes) of all data files referenced by
+    the job; jobs are listed per session, so a job is never reused in another
+    session
+
+    :param job: serialized job with defaults set
+
+    :return: job cache key or None if the job type does not allow reusing
+        the results or any of the input data files does not exist
+    """
+    if not getattr(job_types.get(job.get('type')), 'cacheable', False):
+        return None
+
+    user_id = job.get('user_id')
+    params = {
+        name: val for name, val in job.items()
+        if name not in ('id', 'type', 'user_id', 'session_id', 'group_id',
+                        'profile', 'state', 'result')}
+
+    file_ids = set()
+    collect_file_ids(params, file_ids)
+    versions = {}
+    for file_id in sorted(file_ids):
+        try:
+            st = os.stat(get_data_file_path(user_id, file_id))
+        except OSError:
+            return None
+        versions[str(file_id)] = [st.st_mtime_ns, st.st_size]
+
+    return hashlib.sha256(json.dumps(
+        dict(type=job['type'], user_id=user_id,
+             session_id=job.get('session_id'), params=params,
+             files=versions),
+        sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+
+def get_cached_job(session, key: Optional[str]) -> Optional[DbJob]:
+    """
+    Return an identical job submitted earlier that is either still queued or
+    running or has completed without errors
+
+    :param session: job db session
+    :param key: job cache key returned by :func:`get_job_cache_key`
+
+    :return: db job instance or None if not found
+    """
+    if key is None:
+        return None
+
+    entry = session.query(DbJobCacheEntry).get(key)
+    if entry is None:
+        return None
+
+    db_job = entry.job
+    try:
+        if db_job.state.status in ('pending', 'in_progress') or \
+                db_job.state.status == 'completed' and \
+                not db_job.result.errors:
+            entry.last_used_on = datetime.utcnow()
+        else:
+            # Failed or canceled job; run the new job instead
+            session.delete(entry)
+            db_job = None
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return db_job
+
+
+def add_cached_jobs(session, jobs: TList[Tuple[Optional[str], int]],
+                    max_size: int) -> None:
+    """
+    Remember the newly submitted jobs for reuse by identical jobs; forget
+    the least recently used jobs in excess of the given cache size
+
+    :param session: job db session
+    :param jobs: list of pairs (job cache key returned by
+        :func:`get_job_cache_key`, new job ID)
+    :param max_size: maximum number of cached jobs
+
+    :return: None
+    """
+    jobs = [(key, job_id) for key, job_id in jobs if key is not None]
+    if not jobs:
+        return
+
+    # noinspection PyBroadException
+    try:
+        for key, job_id in jobs:
+            session.merge(DbJobCacheEntry(
+                key=key, job_id=job_id, last_used_on=datetime.utcnow()))
+        session.flush()
+        n = session.query(DbJobCacheEntry).count()
+        if n > max_size:
+            for entry in session.query(DbJobCacheEntry).order_by(
+                    DbJobCacheEntry.last_used_on).limit(n - max_size):
+                session.delete(entry)
+        session.commit()
+    except Exception:
+        session.rollback()
+        app.logger.warning(
+            'Could not add jobs %s to job cache',
+            ', '.join(str(job_id) for _, job_id in jobs), exc_info=True)
+
+
+msg_hdr = '!I'
 msg_hdr_size = struct.calcsize(msg_hdr)
 
 
+def send_msg(sock: socket.socket, msg: bytes) -> None:
+    """
+    Send a length-prefixed job server message
+
+    :param sock: connected socket
+    :param msg: serialized message
+
+    :return: None
+    """
+    sock.sendall(struct.pack(msg_hdr, len(msg)) + msg)
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    """
+    Receive the given number of bytes from a socket
+
+    :param sock: connected socket
+    :param size: number of bytes to receive
+
+    :return: received data
+    """
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = sock.recv_into(view[pos:])
+        if not n:
+            raise EOFError('Connection closed by peer')
+        pos += n
+    return buf
+
+
+def recv_msg(sock: socket.socket) -> bytearray:
+    """
+    Receive a length-prefixed job server message
+
+    :param sock: connected socket
+
+    :return: serialized message
+    """
+    return recv_exactly(
+        sock, struct.unpack(msg_hdr, recv_exactly(sock, msg_hdr_size))[0])
+
+
 class JobRequestHandler(BaseRequestHandler):
     """
-    Job TCP server request handler class
+    Job server request handler class; serves requests over a persistent
+    connection until the client disconnects
     """
 
-    # noinspection PyUnresolvedReferences
     def handle(self):
+        while True:
+            try:
+                msg = recv_msg(self.request)
+            except (EOFError, OSError):
+                break
+            if not self.handle_msg(msg):
+                break
+
+    @staticmethod
+    def list_jobs(session, user_id: Optional[int], msg: TDict[str, Any]) \
+            -> TDict[str, Any]:
+        """
+        Return the summaries of user's jobs matching the given filters,
+        without loading job parameters and results
+
+        :param session: job db session
+        :param user_id: current user ID
+        :param msg: optional client session ID (None = anonymous session),
+            lists of job types and statuses, ordering by job ID ("asc" or
+            "desc"), maximum number of jobs to return, and the last job ID
+            returned by the previous request
+
+        :return: {"jobs": [job summary, ...], "next": cursor}, where job
+            summary is the serialized job state plus job ID, type, session ID,
+            and group ID, and cursor is the value of "after" that returns
+            the next page, or None if this is the last page
+        """
+        query = session.query(
+            DbJob.id, DbJob.type, DbJob.session_id, DbJob.group_id,
+            DbJobState.status, DbJobState.progress, DbJobState.created_on,
+            DbJobState.completed_on,
+        ).join(DbJobState, DbJobState.id == DbJob.id).filter(
+            DbJob.user_id == user_id,
+            DbJob.session_id == msg.get('session_id'))
+
+        for name, col in (('type', DbJob.type), ('status', DbJobState.status)):
+            values = msg.get(name)
+            if values:
+                if isinstance(values, str):
+                    values = [values]
+                query = query.filter(col.in_(values))
+
+        order = (msg.get('order') or 'asc').lower()
+        if order not in ('asc', 'desc'):
+            raise ValidationError('order', 'Order must be "asc" or "desc"')
+        try:
+            after = msg.get('after')
+            if after is not None:
+                after = int(after)
+            limit = msg.get('limit')
+            if limit is not None:
+                limit = int(limit)
+                if limit <= 0:
+                    raise ValueError()
+        except (TypeError, ValueError):
+            raise ValidationError(
+                'after', 'Cursor must be a job ID and limit must be '
+                'a positive integer')
+
+        # Keyset pagination: continue from the last job ID returned
+        if order == 'asc':
+            if after is not None:
+                query = query.filter(DbJob.id > after)
+            query = query.order_by(DbJob.id)
+        else:
+            if after is not None:
+                query = query.filter(DbJob.id < after)
+            query = query.order_by(DbJob.id.desc())
+        if limit is not None:
+            # Fetch one extra row to tell whether there are more jobs
+            query = query.limit(limit + 1)
+
+        jobs = []
+        for row in query:
+            summary = JobState(
+                status=row.status, progress=row.progress,
+                created_on=row.created_on, completed_on=row.completed_on,
+            ).to_dict()
+            summary.update(
+                id=row.id, type=row.type, session_id=row.session_id,
+                group_id=row.group_id)
+            jobs.append(summary)
+        cursor = None
+        if limit is not None and len(jobs) > limit:
+            del jobs[limit:]
+            cursor = jobs[-1]['id']
+        return dict(jobs=jobs, next=cursor)
+
+    # noinspection PyUnresolvedReferences
+    def prepare_job(self, session, user_id: Optional[int],
+                    msg: TDict[str, Any]) \
+            -> Tuple[TDict[str, Any], str, Optional[str], Optional[DbJob]]:
+        """
+        Validate a job being submitted
+
+        :param session: job db session
+        :param user_id: current user ID
+        :param msg: job type, job-specific parameters, and optional session ID,
+            group ID, and priority
+
+        :return: serialized job with defaults set, job priority class, job
+            cache key, and an identical job submitted earlier that can be
+            returned instead of running a new one, if any
+        """
+        try:
+            job_type = msg['type']
+        except KeyError:
+            raise MissingFieldError(field='type')
+        if job_type not in self.server.db_job_types:
+            raise UnknownJobTypeError(type=job_type)
+
+        # Check that the specified session exists
+        session_id = msg.get('session_id')
+        if session_id is not None:
+            get_session(user_id, session_id)
+
+        # Convert message arguments to polymorphic job model
+        job_args = Job(_set_defaults=True, **msg).to_dict()
+        del job_args['state'], job_args['result']
+        priority = self.server.scheduler.get_priority(
+            job_args, msg.get('priority'))
+
+        # Find an identical job submitted earlier, either completed or still
+        # running; profiled jobs always run
+        cache_key = get_job_cache_key(job_args) \
+            if self.server.cache_size and not job_args.get('profile') else None
+        return job_args, priority, cache_key, get_cached_job(
+            session, cache_key)
+
+    # noinspection PyUnresolvedReferences
+    def admit(self, user_id: Optional[int], num_jobs: int) -> None:
+        """
+        Check that the user and the job server can accept more jobs: the total
+        number of queued jobs must not exceed JOB_MAX_PENDING, and the number
+        of user's queued jobs must not exceed JOB_USER_MAX_PENDING; must be
+        called with the server's admission lock held until the admitted jobs
+        are submitted
+
+        :param user_id: current user ID
+        :param num_jobs: number of jobs being submitted
+
+        :return: None
+        """
+        scheduler = self.server.scheduler
+        for limit, num_pending, next_start, error_class in (
+                (app.config.get('JOB_MAX_PENDING', 0),
+                 scheduler.num_pending, scheduler.next_start,
+                 JobServerBusyError),
+                (app.config.get('JOB_USER_MAX_PENDING', 0),
+                 lambda: scheduler.num_user_pending(user_id),
+                 lambda: scheduler.next_user_start(user_id),
+                 TooManyPendingJobsError)):
+            if limit and num_pending() + num_jobs > limit:
+                wait = next_start()
+                e = error_class(limit=limit)
+                e.headers = [(
+                    'Retry-After',
+                    str(max(int(ceil(wait)), 1)) if wait is not None
+                    else str(DEFAULT_RETRY_AFTER))]
+                raise e
+
+    # noinspection PyUnresolvedReferences
+    def add_queue_info(self, states: TList[Tuple[int, TDict[str, Any]]]) \
+            -> None:
+        """
+        Add the queue position and estimated start time to the serialized
+        states of pending jobs
+
+        :param states: list of pairs (job ID, serialized job state)
+
+        :return: None
+        """
+        states = [(job_id, state) for job_id, state in states
+                  if state.get('status') == 'pending']
+        if not states:
+            return
+        estimates = self.server.scheduler.estimate_start()
+        now = datetime.utcnow()
+        for job_id, state in states:
+            try:
+                position, wait = estimates[job_id]
+            except KeyError:
+                continue
+            info = dict(queue_position=position)
+            if wait is not None:
+                info['estimated_start'] = now + timedelta(seconds=wait)
+            state.update(
+                (name, val) for name, val in JobState(**info).to_dict().items()
+                if name in info)
+
+    # noinspection PyUnresolvedReferences
+    @staticmethod
+    def grow_pool(server, num_jobs: int) -> None:
+        """
+        Start extra worker processes if there are not enough workers to run
+        the newly submitted or resumed jobs immediately, up to JOB_POOL_MAX
+
+        :param server: job server instance
+        :param num_jobs: number of jobs being submitted
+
+        :return: None
+        """
+        with server.pool_lock.acquire_read():
+            pool_size = len([p for p in server.pool if not p.retiring])
+            local_pool_size = len(
+                [p for p in server.pool if not p.retiring and not p.remote])
+        num_new = server.scheduler.num_dispatched + num_jobs - pool_size
+        if num_new <= 0:
+            return
+
+        # All workers are currently busy
+        if server.max_pool_size:
+            num_new = min(num_new, server.max_pool_size - local_pool_size)
+        if num_new <= 0:
+            app.logger.warning(
+                'All job worker processes are busy; consider increasing '
+                'JOB_POOL_MAX')
+            return
+        app.logger.info(
+            'Adding %d more worker%s to job pool', num_new,
+            '' if num_new == 1 else 's')
+        with server.pool_lock.acquire_write():
+            for _ in range(num_new):
+                server.pool.append(
+                    JobWorkerProcessWrapper(server.result_queue))
+
+    # noinspection PyUnresolvedReferences
+    def create_jobs(self, session, user_id: Optional[int],
+                    jobs: TList[Tuple[TDict[str, Any], str, Optional[str]]]) \
+            -> TList[TDict[str, Any]]:
+        """
+        Add new jobs to the job database in a single transaction and queue them
+
+        :param session: job db session
+        :param user_id: current user ID
+        :param jobs: list of (serialized job, priority, cache key) returned by
+            :meth:`prepare_job`
+
+        :return: list of serialized new jobs
+        """
+        server = self.server
+        self.grow_pool(server, len(jobs))
+        try:
+            db_jobs = []
+            for job_args, priority, _ in jobs:
+                # Create an appropriate db job class instance
+                db_job = server.db_job_types[job_args['type']](
+                    state=DbJobState(),
+                    result=server.db_job_result_types[job_args['type']](),
+                    priority=priority,
+                    **job_args
+                )
+                session.add(db_job)
+                db_jobs.append(db_job)
+            session.flush()
+            result = [Job(db_job).to_dict() for db_job in db_jobs]
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        add_cached_jobs(
+            session, [(cache_key, job['id'])
+                      for (_, _, cache_key), job in zip(jobs, result)],
+            server.cache_size)
+        server.state_notifier.notify([(job['id'], user_id) for job in result])
+        for (_, priority, _), job in zip(jobs, result):
+            # The returned job states are updated with the queue info, which
+            # must not be sent to the worker and saved along with the job
+            server.scheduler.submit(
+                dict(job, state=dict(job['state'])), priority)
+        return result
+
+    # noinspection PyUnresolvedReferences
+    def cancel_job(self, db_job: DbJob) -> bool:
+        """
+        Cancel a pending or running job; must be followed by a commit if
+        the job state was changed
+
+        :param db_job: job to cancel
+
+        :return: True if the job was removed from the queue and its state was
+            set to "canceled"; False if the job was already dispatched to
+            a worker and was sent the cancel signal; its state will be updated
+            by the worker
+        """
+        if db_job.state.status not in ('pending', 'in_progress'):
+            raise CannotCancelJobError(status=db_job.state.status)
+
+        if self.server.scheduler.cancel(db_job.id):
+            # Job has not been dispatched yet, just remove it from the queue
+            db_job.state.status = 'canceled'
+            db_job.state.completed_on = datetime.utcnow()
+            return True
+
+        # The job has been dispatched, though its state may still be "pending"
+        # if the worker has not started it yet; send abort signal to the worker
+        # process running the job. If no such process found, the job has been
+        # already completed; do nothing in this case.
+        self.server.scheduler.abort(db_job.id)
+        return False
+
+    def requeue_jobs(self, db_jobs: TList[DbJob]) -> None:
+        """
+        Put back the jobs removed from the queue by :meth:`cancel_job` if their
+        canceled state could not be committed
+
+        :param db_jobs: jobs to requeue
+
+        :return: None
+        """
+        scheduler = self.server.scheduler
+        for db_job in db_jobs:
+            job = Job(db_job).to_dict()
+            scheduler.submit(
+                job, db_job.priority or scheduler.get_priority(job))
+
+    # noinspection PyUnresolvedReferences
+    def handle_msg(self, msg: bytearray) -> bool:
+        """
+        Process a single job server request and send the response
+
+        :param msg: serialized request message
+
+        :return: False if the connection should be closed
+        """
         server = self.server
         # noinspection PyUnresolvedReferences
         session = self.server.session_factory()
 
         http_status = 200
+        headers = None
 
         try:
-            msg_len = bytearray()
-            while len(msg_len) < msg_hdr_size:
-                msg_len += self.request.recv(msg_hdr_size - len(msg_len))
-            msg_len = struct.unpack(msg_hdr, msg_len)[0]
-
-            msg = bytearray()
-            while len(msg) < msg_len:
-                msg += self.request.recv(msg_len - len(msg))
-
             try:
-                msg = json.loads(decrypt(msg))
-                if not isinstance(msg, dict):
-                    raise Exception()
+                msg = unpack_msg(msg)
             except Exception:
-                raise JobServerError(reason='JSON dict expected')
+                raise JobServerError(reason='Message dict expected')
 
             try:
                 method = msg.pop('method').lower()
@@ -624,10 +2963,16 @@ class JobRequestHandler(BaseRequestHandler):
                 raise JobServerError(reason='Missing request method')
 
             if method == 'terminate':
-                # Server shutdown request
+                # Server shutdown request; acknowledge and stop serving
+                # noinspection PyBroadException
+                try:
+                    send_msg(self.request, pack_msg(
+                        {'json': {}, 'status': http_status}))
+                except Exception:
+                    pass
                 self.server.shutdown()
                 self.server.server_close()
-                return
+                return False
 
             try:
                 resource = msg.pop('resource').lower()
@@ -643,72 +2988,33 @@ class JobRequestHandler(BaseRequestHandler):
                 if method == 'get':
                     job_id = msg.get('id')
                     if job_id is None:
-                        # Return all user's jobs for the given client session;
-                        # hide user id/name and result
-                        result = [
-                            Job(db_job, exclude=['result']).to_dict()
-                            for db_job in session.query(DbJob).filter(
-                                    DbJob.user_id == user_id,
-                                    DbJob.session_id == msg.get('session_id'))
-                        ]
+                        # Return a page of user's jobs for the given client
+                        # session
+                        result = self.list_jobs(session, user_id, msg)
+                        self.add_queue_info(
+                            [(job['id'], job) for job in result['jobs']])
                     else:
                         # Return the given job
                         db_job = session.query(DbJob).get(job_id)
                         if db_job is None or db_job.user_id != user_id:
                             raise UnknownJobError(id=job_id)
                         result = Job(db_job, exclude=['result']).to_dict()
+                        self.add_queue_info([(job_id, result['state'])])
 
                 elif method == 'post':
-                    # Submit a job
-                    try:
-                        job_type = msg['type']
-                    except KeyError:
-                        raise MissingFieldError(field='type')
-                    if job_type not in server.db_job_types:
-                        raise UnknownJobTypeError(type=job_type)
-
-                    # Check that the specified session exists
-                    session_id = msg.get('session_id')
-                    if session_id is not None:
-                        get_session(user_id, session_id)
-
-                    # Need an extra worker?
-                    with server.pool_lock.acquire_read():
-                        pool_size = len(server.pool)
-                        busy_workers = len(
-                            [p for p in server.pool if p.job_id is not None])
-                    if busy_workers == pool_size:
-                        # All workers are currently busy
-                        if server.max_pool_size and \
-                                pool_size >= server.max_pool_size:
-                            app.logger.warning(
-                                'All job worker processes are busy; '
-                                'consider increasing JOB_POOL_MAX')
-                        else:
-                            app.logger.info(
-                                'Adding one more worker to job pool')
-                            with server.pool_lock.acquire_write():
-                                server.pool.append(JobWorkerProcessWrapper(
-                                    server.job_queue, server.result_queue))
-
-                    try:
-                        # Convert message arguments to polymorphic job model
-                        # and create an appropriate db job class instance
-                        job_args = Job(_set_defaults=True, **msg).to_dict()
-                        del job_args['state'], job_args['result']
-                        db_job = server.db_job_types[job_type](
-                            state=DbJobState(),
-                            result=server.db_job_result_types[job_type](),
-                            **job_args
-                        )
-                        session.add(db_job)
-                        session.flush()
+                    # Submit a job; return an identical job submitted earlier
+                    # instead of recomputing if possible
+                    job_args, priority, cache_key, db_job = self.prepare_job(
+                        session, user_id, msg)
+                    if db_job is not None:
                         result = Job(db_job).to_dict()
-                        server.job_queue.put(result)
-                        session.commit()
-                    except Exception:
-                        session.rollback()
-                        raise
+                    else:
+                        with server.admission_lock:
+                            self.admit(user_id, 1)
+                            result = self.create_jobs(
+                                session, user_id,
+                                [(job_args, priority, cache_key)])[0]
+                    self.add_queue_info([(result['id'], result['state'])])
 
                     http_status = 201
 
@@ -723,31 +3029,246 @@ class JobRequestHandler(BaseRequestHandler):
                     if db_job is None or db_job.user_id != user_id:
                         raise UnknownJobError(id=job_id)
 
-                    if db_job.state.status not in ('completed', 'canceled'):
-                        raise CannotDeleteJobError(status=db_job.state.status)
+                    if db_job.state.status not in ('completed', 'canceled'):
+                        raise CannotDeleteJobError(status=db_job.state.status)
+
+                    # Delete job files
+                    delete_job_files(user_id, job_id)
+
+                    try:
+                        session.query(DbJob).filter(DbJob.id == job_id).delete()
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        raise
+                    server.state_notifier.forget(job_id)
+
+                    result = ''
+                    http_status = 204
+
+                else:
+                    raise InvalidMethodError(
+                        resource=resource, method=method.upper())
+
+            elif resource == 'jobs/batch':
+                # Submit multiple jobs sharing the same group ID
+                if method != 'post':
+                    raise InvalidMethodError(
+                        resource=resource, method=method.upper())
+
+                job_list = msg.get('jobs')
+                if not job_list:
+                    raise MissingFieldError(field='jobs')
+                if not isinstance(job_list, list) or \
+                        not all(isinstance(job, dict) for job in job_list):
+                    raise ValidationError(
+                        'jobs', 'Jobs must be a list of objects')
+                group_id = msg.get('group_id') or str(uuid.uuid4())
+
+                # Validate all jobs before submitting any of them; job-specific
+                # session ID and priority override those of the whole batch
+                new_jobs, ids = [], []
+                for i, job in enumerate(job_list):
+                    job = dict(job, user_id=user_id, group_id=group_id)
+                    for name in ('session_id', 'priority'):
+                        if name not in job and msg.get(name) is not None:
+                            job[name] = msg[name]
+                    try:
+                        job_args, priority, cache_key, db_job = \
+                            self.prepare_job(session, user_id, job)
+                    except AfterglowError as e:
+                        e.payload = dict(e.payload or {}, job_index=i)
+                        raise
+                    except Exception as e:
+                        raise ValidationError(
+                            'jobs', 'Job #{}: {}'.format(i, e))
+                    if db_job is not None:
+                        # Identical job submitted earlier; keeps its group
+                        ids.append(db_job.id)
+                    else:
+                        # Placeholder for the ID of a new job
+                        ids.append(None)
+                        new_jobs.append((job_args, priority, cache_key))
+
+                if new_jobs:
+                    with server.admission_lock:
+                        self.admit(user_id, len(new_jobs))
+                        new_ids = iter([
+                            job['id'] for job in self.create_jobs(
+                                session, user_id, new_jobs)])
+                    ids = [next(new_ids) if job_id is None else job_id
+                           for job_id in ids]
+                else:
+                    # All jobs are cache hits that keep their original groups,
+                    # so the new group would be empty
+                    group_id = None
+                result = dict(group_id=group_id, ids=ids)
+                http_status = 201
+
+            elif resource == 'jobs/group/state':
+                # Get/update the state of all jobs in a group
+                try:
+                    group_id = msg['group_id']
+                except KeyError:
+                    raise MissingFieldError(field='group_id')
 
-                    # Delete job files
-                    for jf in db_job.files:
+                db_jobs = session.query(DbJob).filter(
+                    DbJob.user_id == user_id,
+                    DbJob.group_id == group_id).order_by(DbJob.id).all()
+                if not db_jobs:
+                    raise UnknownJobGroupError(group_id=group_id)
+
+                if method == 'put':
+                    # Cancel all pending and running jobs of the group
+                    status = getattr(
+                        JobState(_set_defaults=True, **msg), 'status', None)
+                    if status is None:
+                        raise MissingFieldError(field='status')
+                    if status != 'canceled':
+                        raise CannotSetJobStatusError(status=status)
+
+                    # Cancel jobs one by one, recording the outcome for each
+                    # job instead of aborting the whole group on the first
+                    # job that cannot be canceled, e.g. because it has just
+                    # completed
+                    canceled, signaled = [], []
+                    for db_job in db_jobs:
+                        if db_job.state.status not in (
+                                'pending', 'in_progress'):
+                            continue
                         try:
-                            os.unlink(
-                                job_file_path(user_id, job_id, jf.file_id))
-                        except OSError:
+                            if self.cancel_job(db_job):
+                                canceled.append(db_job)
+                            else:
+                                signaled.append(db_job.id)
+                        except CannotCancelJobError:
                             pass
+                    if canceled:
+                        try:
+                            session.commit()
+                        except Exception:
+                            session.rollback()
+                            self.requeue_jobs(canceled)
+                            raise
+                        server.state_notifier.notify(
+                            [(db_job.id, user_id) for db_job in canceled])
 
-                    try:
-                        session.query(DbJob).filter(DbJob.id == job_id).delete()
-                        session.commit()
-                    except Exception:
-                        session.rollback()
-                        raise
+                elif method != 'get':
+                    raise InvalidMethodError(
+                        resource=resource, method=method.upper())
 
-                    result = ''
-                    http_status = 204
+                # Return the per-status job counts and individual job states
+                counts, jobs = {}, []
+                for db_job in db_jobs:
+                    state = JobState(db_job.state).to_dict()
+                    state['id'] = db_job.id
+                    jobs.append(state)
+                    status = state['status']
+                    counts[status] = counts.get(status, 0) + 1
+                self.add_queue_info([(job['id'], job) for job in jobs])
+                result = dict(group_id=group_id, counts=counts, jobs=jobs)
+                if method == 'put':
+                    result['canceled'] = [db_job.id for db_job in canceled]
+                    result['signaled'] = signaled
+
+            elif resource == 'jobs/metrics':
+                if method != 'get':
+                    raise InvalidMethodError(
+                        resource=resource, method=method.upper())
 
+                gauges = []
+                depth = server.scheduler.queue_depth()
+                for job_type in sorted(depth):
+                    gauges.append((
+                        'afterglow_job_queue_depth',
+                        'Number of jobs waiting for a worker',
+                        dict(type=job_type), depth[job_type]))
+                gauges.append((
+                    'afterglow_job_subtask_queue_depth',
+                    'Number of job subtasks waiting for a worker', {},
+                    server.scheduler.num_queued_subtasks))
+                with server.pool_lock.acquire_read():
+                    workers = [w for w in server.pool if not w.retiring]
+                    busy = sum(
+                        1 for w in workers
+                        if w.job_id is not None or w.subtask is not None)
+                    busy_time = sum(w.busy_time for w in server.pool)
+                gauges += [
+                    ('afterglow_job_workers', 'Number of job worker processes',
+                     {}, len(workers)),
+                    ('afterglow_job_workers_busy',
+                     'Number of job worker processes running a job or subtask',
+                     {}, busy),
+                    ('afterglow_job_workers_busy_ratio',
+                     'Fraction of job worker processes running a job or '
+                     'subtask', {}, busy/len(workers) if workers else 0),
+                    ('afterglow_job_workers_busy_seconds',
+                     'Total time spent running jobs by the current job worker '
+                     'processes', {}, busy_time),
+                ]
+                try:
+                    backlog = server.result_queue.qsize()
+                except NotImplementedError:
+                    # Not available on macOS
+                    pass
                 else:
+                    gauges.append((
+                        'afterglow_job_state_update_queue_backlog',
+                        'Number of job state updates waiting to be written to '
+                        'the job database', {}, backlog))
+
+                result = server.metrics.render(gauges)
+                http_status = 200
+
+            elif resource == 'jobs/state/watch':
+                # Wait for state changes of multiple jobs (long polling)
+                if method != 'get':
                     raise InvalidMethodError(
                         resource=resource, method=method.upper())
 
+                job_ids = msg.get('ids')
+                if job_ids is not None:
+                    try:
+                        job_ids = [int(job_id) for job_id in job_ids]
+                    except (TypeError, ValueError):
+                        raise ValidationError(
+                            'ids', 'Job IDs must be a list of integers')
+                since = msg.get('since')
+                try:
+                    timeout = min(
+                        float(msg.get('timeout') or 0),
+                        app.config.get('JOB_STATE_WATCH_TIMEOUT', 30))
+                    if since is not None:
+                        since = int(since)
+                except (TypeError, ValueError):
+                    raise ValidationError(
+                        'since', 'Sequence number and timeout must be numbers')
+
+                if since is None:
+                    # Initial request: return the current state of all
+                    # requested jobs
+                    seq = server.state_notifier.seq
+                    changed = job_ids
+                else:
+                    seq, changed = server.state_notifier.wait(
+                        user_id, job_ids, since, max(timeout, 0))
+
+                jobs = []
+                if changed is None or changed:
+                    query = session.query(DbJob).filter(
+                        DbJob.user_id == user_id)
+                    if changed is not None:
+                        query = query.filter(DbJob.id.in_(changed))
+                    if job_ids is None:
+                        query = query.filter(
+                            DbJob.session_id == msg.get('session_id'))
+                    for db_job in query:
+                        state = JobState(db_job.state).to_dict()
+                        state['id'] = db_job.id
+                        jobs.append(state)
+                    self.add_queue_info([(job['id'], job) for job in jobs])
+                result = dict(seq=seq, jobs=jobs)
+
             elif resource == 'jobs/state':
                 # Get/update job state
                 try:
@@ -762,6 +3283,7 @@ class JobRequestHandler(BaseRequestHandler):
                 if method == 'get':
                     # Return job state
                     result = JobState(db_job.state).to_dict()
+                    self.add_queue_info([(job_id, result)])
 
                 elif method == 'put':
                     # Cancel job
@@ -770,24 +3292,22 @@ class JobRequestHandler(BaseRequestHandler):
                     if status is None:
                         raise MissingFieldError(field='status')
                     if status != 'canceled':
-                        raise CannotSetJobStatusError(status=msgstatus)
-
-                    # Find worker process that is currently running the job
-                    if db_job.state.status != 'in_progress':
-                        raise CannotCancelJobError(status=db_job.state.status)
-
-                    # Send abort signal to worker process running the given job.
-                    # If no such process found, this means that the job either
-                    # has not been dispatched yet or has been already completed;
-                    # do nothing in both cases.
-                    with server.pool_lock.acquire_read():
-                        for p in server.pool:
-                            if p.job_id == job_id:
-                                p.cancel_current_job()
-                                break
+                        raise CannotSetJobStatusError(status=status)
+
+                    canceled = self.cancel_job(db_job)
+                    if canceled:
+                        try:
+                            session.commit()
+                        except Exception:
+                            session.rollback()
+                            self.requeue_jobs([db_job])
+                            raise
+                    if canceled:
+                        server.state_notifier.notify([(job_id, user_id)])
 
                     # Return the current job state
                     result = JobState(db_job.state).to_dict()
+                    self.add_queue_info([(job_id, result)])
 
                 else:
                     raise InvalidMethodError(
@@ -805,12 +3325,49 @@ class JobRequestHandler(BaseRequestHandler):
                     if db_job is None or db_job.user_id != user_id:
                         raise UnknownJobError(id=job_id)
 
+                    try:
+                        offset = int(msg.get('offset') or 0)
+                        limit = msg.get('limit')
+                        if limit is not None:
+                            limit = int(limit)
+                        if offset < 0 or limit is not None and limit < 0:
+                            raise ValueError()
+                    except ValueError:
+                        raise ValidationError(
+                            'offset', 'Offset and limit must be non-negative '
+                            'integers')
+                    columns = msg.get('columns')
+                    if isinstance(columns, str):
+                        columns = columns.split(',')
+                    stop = None if limit is None else offset + limit
+
                     # Deduce the polymorphic job result type from the parent
                     # job model; add job type info for the /jobs/[id]/result
                     # view to be able to find the appropriate schema as well
                     result = job_types[db_job.type].fields['result'].nested(
                         db_job.result).to_dict()
+
+                    # Return the requested range of rows and columns of
+                    # the lists of records stored in the database or in
+                    # columnar job files
+                    totals = {}
+                    for name, val in result.items():
+                        if isinstance(val, list) and val and \
+                                isinstance(val[0], dict):
+                            totals[name] = len(val)
+                            val = val[offset:stop]
+                            if columns is not None:
+                                val = [{c: v for c, v in rec.items()
+                                        if c in columns} for rec in val]
+                            result[name] = val
+                    for name, table in (db_job.result.tables or {}).items():
+                        totals[name] = table['rows']
+                        result[name] = load_result_table(
+                            job_file_path(user_id, job_id, table['file_id']),
+                            table['columns'], columns, offset, limit)
+
                     result['type'] = db_job.type
+                    result['totals'] = totals
 
                 else:
                     raise InvalidMethodError(
@@ -864,6 +3421,8 @@ class JobRequestHandler(BaseRequestHandler):
             if getattr(e, 'code', 400) == 500:
                 result['traceback'] = traceback.format_tb(sys.exc_info()[-1])
             http_status = int(e.code) if hasattr(e, 'code') and e.code else 400
+            if getattr(e, 'headers', None):
+                headers = dict(e.headers)
 
         except Exception as e:
             # Wrap other exceptions in JobServerError
@@ -885,13 +3444,14 @@ class JobRequestHandler(BaseRequestHandler):
         except Exception:
             pass
 
-        # Format response message, encrypt and send back to Flask
+        # Format response message, serialize and send back to Flask
         msg = {'json': result, 'status': http_status}
+        if headers:
+            msg['headers'] = headers
 
         # noinspection PyBroadException
         try:
-            msg = encrypt(json.dumps(msg).encode('utf8'))
-            self.request.sendall(struct.pack(msg_hdr, len(msg)) + msg)
+            send_msg(self.request, pack_msg(msg))
         except Exception:
             # noinspection PyBroadException
             try:
@@ -899,9 +3459,12 @@ class JobRequestHandler(BaseRequestHandler):
                     'Error sending job server response', exc_info=True)
             except Exception:
                 pass
+            return False
+
+        return True
 
 
-def job_server(notify_queue, key, iv):
+def job_server(notify_queue, key, iv, transport='tcp'):
     """
     Main job server process
 
@@ -909,16 +3472,18 @@ def job_server(notify_queue, key, iv):
         the main process on the job server process initialization and errors
     :param bytes key: message encryption key
     :param bytes iv: message encryption initialization vector
+    :param str transport: "tcp" or "unix"
 
     :return: None
     """
-    global job_server_key, job_server_iv
+    global job_server_transport, job_server_key, job_server_iv
 
     # Create sync structures
-    job_queue = Queue()
     result_queue = Queue()
     terminate_listener_event = threading.Event()
-    state_update_listener = None
+    terminate_pool_manager_event = threading.Event()
+    terminate_retention_event = threading.Event()
+    state_update_listener = pool_manager = retention = worker_server = None
 
     # Initialize worker process pool
     min_pool_size = app.config.get('JOB_POOL_MIN', 1)
@@ -927,16 +3492,21 @@ def job_server(notify_queue, key, iv):
         app.logger.info(
             'Starting %d job worker process%s', min_pool_size,
             '' if min_pool_size == 1 else 'es')
-        pool = [JobWorkerProcessWrapper(job_queue, result_queue)
+        pool = [JobWorkerProcessWrapper(result_queue)
                 for _ in range(min_pool_size)]
     else:
         pool = []
     pool_lock = RWLock()
+    metrics = JobServerMetrics()
+    scheduler = JobScheduler(pool, pool_lock, metrics)
+    state_notifier = JobStateNotifier()
+    socket_path = socket_dir = None
 
     try:
         app.logger.info('Starting Afterglow job server (pid %d)', os.getpid())
 
-        # Inherit encryption key/IV from the parent process
+        # Inherit transport and encryption key/IV from the parent process
+        job_server_transport = transport
         job_server_key, job_server_iv = key, iv
 
         # Initialize job database
@@ -961,29 +3531,202 @@ def job_server(notify_queue, key, iv):
                 cursor.execute('PRAGMA journal_mode=WAL')
                 cursor.close()
 
-        # Recreate the job db on startup; also erase shared memory and journal
-        # files
+        # Open the job db; jobs and job files persist across job server
+        # restarts, the interrupted jobs are resumed below
         db_path = os.path.join(
             os.path.abspath(app.config['DATA_ROOT']), 'jobs.db')
-        for fp in glob(db_path + '*'):
-            try:
-                os.remove(fp)
-            except OSError:
-                pass
         engine = create_engine(
             'sqlite:///{}'.format(db_path),
             connect_args={'check_same_thread': False, 'isolation_level': None,
                           'timeout': 10},
         )
+
+        def schema_changed() -> bool:
+            """
+            Check whether the existing job db is incompatible with the current
+            job models: any existing table lacks a column or has a column of
+            a different SQL type; new tables and indexes are created below,
+            and extra columns are ignored. Constraints, defaults, and
+            nullability are not compared, so changing them requires
+            removing the job db manually.
+
+            :return: True if the job db must be recreated
+            """
+            def type_name(t) -> Optional[str]:
+                # Types of columns reflected from unknown declarations cannot
+                # be compiled
+                # noinspection PyBroadException
+                try:
+                    return t.compile(dialect=engine.dialect).upper()
+                except Exception:
+                    return None
+
+            insp = inspect(engine)
+            existing_tables = set(insp.get_table_names())
+            for table in JobBase.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                existing_types = {
+                    c['name']: type_name(c['type'])
+                    for c in insp.get_columns(table.name)}
+                for c in table.columns:
+                    if c.name not in existing_types or \
+                            existing_types[c.name] != type_name(c.type):
+                        return True
+            return False
+
+        # Recreate the job db if it was created by a version having
+        # an incompatible schema; also erase shared memory and journal files
+        if schema_changed():
+            app.logger.warning('Job db schema changed; existing jobs discarded')
+            engine.dispose()
+            for fp in glob(db_path + '*'):
+                try:
+                    os.remove(fp)
+                except OSError:
+                    pass
+            shutil.rmtree(job_file_dir, ignore_errors=True)
+
         JobBase.metadata.create_all(bind=engine)
+
+        # Let the retention task return the space freed by deleted jobs
+        # to the filesystem; converting an existing db requires a full vacuum
+        with engine.connect() as conn:
+            if conn.execute(text('PRAGMA auto_vacuum')).scalar() != 2:
+                conn.execute(text('PRAGMA auto_vacuum=INCREMENTAL'))
+                conn.execute(text('VACUUM'))
+
+        # Add indexes missing from the job db created by an earlier version
+        insp = inspect(engine)
+        for table in JobBase.metadata.sorted_tables:
+            existing_indexes = {
+                index['name'] for index in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=engine)
         session_factory = scoped_session(sessionmaker(bind=engine))
 
-        # Erase old job files
-        try:
-            shutil.rmtree(job_file_dir)
-        except OSError as e:
-            if e.errno != errno.ENOENT:
+        # Shared memory segments created by the running jobs, released when
+        # the job is done
+        shared_memory = {}  # job ID -> set of shared memory names
+        shared_memory_lock = threading.Lock()
+
+        def keep_shared_memory(job_id: int, name: str) -> None:
+            """
+            Register a shared memory segment created by a job
+
+            :param job_id: job ID
+            :param name: shared memory name
+
+            :return: None
+            """
+            with shared_memory_lock:
+                if scheduler.is_dispatched(job_id):
+                    shared_memory.setdefault(job_id, set()).add(name)
+                    return
+            # Created by a late subtask of a finished job
+            unlink_shared_arrays([name])
+
+        def release_shared_memory(job_id: Optional[int] = None) -> None:
+            """
+            Remove shared memory segments of a job
+
+            :param job_id: job ID; default: all jobs
+
+            :return: None
+            """
+            with shared_memory_lock:
+                if job_id is None:
+                    names = set().union(*shared_memory.values())
+                    shared_memory.clear()
+                else:
+                    names = shared_memory.pop(job_id, ())
+            unlink_shared_arrays(names)
+
+        def write_state_updates(
+                job_files: TList[Tuple[int, TDict[str, Any]]],
+                updates: TDict[int, Tuple[TDict[str, Any], TDict[str, Any]]],
+                finished_jobs: TList[int]) \
+                -> Tuple[TList[Tuple[int, Optional[int]]],
+                         TList[Tuple[str, str, bool, Optional[float]]]]:
+            """
+            Write a batch of job file creation messages and job state/result
+            updates to the job database in a single transaction
+
+            :param job_files: list of pairs (job ID, job file description)
+            :param updates: {job ID: (job state changes, job result changes)}
+            :param finished_jobs: IDs of the jobs completed or canceled by
+                the updates
+
+            :return: list of (job ID, user ID) of the jobs whose state changed,
+                and list of (job type, status, has errors, run time) of
+                the finished jobs
+            """
+            state_changes, finished = [], []
+            sess = session_factory()
+            try:
+                # The engine runs in autocommit mode; start an explicit
+                # transaction and isolate individual updates by savepoints;
+                # acquire the write lock immediately so that the transaction
+                # does not fail midway when upgrading its read lock
+                sess.execute(text('BEGIN IMMEDIATE'))
+
+                for job_id, job_file in job_files:
+                    # noinspection PyBroadException
+                    try:
+                        with sess.begin_nested():
+                            sess.add(DbJobFile(
+                                job_id=job_id,
+                                file_id=job_file['id'],
+                                mimetype=job_file.get('mimetype'),
+                                headers=job_file.get('headers')))
+                    except OperationalError:
+                        raise
+                    except Exception:
+                        app.logger.warning(
+                            'Could not add job file "%s" to database',
+                            job_file, exc_info=True)
+
+                for job_id, (job_state, job_result) in updates.items():
+                    # noinspection PyBroadException
+                    try:
+                        with sess.begin_nested():
+                            job = sess.query(DbJob).get(job_id)
+                            if job is None:
+                                # State update for a job that was already
+                                # deleted; silently ignore
+                                continue
+
+                            # Update job state
+                            for name, val in job_state.items():
+                                setattr(job.state, name, val)
+
+                            # Update job result
+                            for name, val in job_result.items():
+                                setattr(job.result, name, val)
+
+                            if job_state:
+                                state_changes.append((job_id, job.user_id))
+                            if job_id in finished_jobs:
+                                finished.append((
+                                    job.type, job.state.status,
+                                    bool(job.result.errors),
+                                    job_state.get('wall_time')))
+                    except OperationalError:
+                        raise
+                    except Exception:
+                        app.logger.warning(
+                            'Could not update job state/result "%s"',
+                            dict(id=job_id, state=job_state,
+                                 result=job_result), exc_info=True)
+
+                sess.commit()
+            except Exception:
+                sess.rollback()
                 raise
+            finally:
+                sess.close()
+            return state_changes, finished
 
         # Listen for job state updates in a separate thread
         def state_update_listener_body():
@@ -994,108 +3737,461 @@ def job_server(notify_queue, key, iv):
             :return: None
             """
             while not terminate_listener_event.is_set():
-                msg = result_queue.get()
-                if not msg:
-                    continue
-                if not isinstance(msg, dict) or 'id' not in msg or \
-                        'state' in msg and \
-                        not isinstance(msg['state'], dict) or \
-                        'result' in msg and not isinstance(msg['result'], dict):
-                    app.logger.warning(
-                        'Job state listener got unexpected message "%s"', msg)
-                    continue
-
-                job_id = msg['id']
-                job_state = msg.get('state', {})
-                job_result = msg.get('result', {})
-                job_pid = msg.get('pid')
-                job_file = msg.get('file')
+                # Wait for the next message, then grab all messages that are
+                # already queued to write them to the database in a single
+                # transaction
+                msgs = [result_queue.get()]
+                while len(msgs) < STATE_UPDATE_BATCH_SIZE:
+                    try:
+                        msgs.append(result_queue.get_nowait())
+                    except queue.Empty:
+                        break
 
-                if job_pid is not None:
-                    # Worker process assignment message
-                    found = False
-                    with pool_lock.acquire_read():
-                        for _p in pool:
-                            if _p.ident == job_pid:
-                                _p.job_id = job_id
-                                found = True
-                                break
-                    if not found:
+                # Merge state/result updates for the same job
+                job_files, updates = [], {}
+                workers_ready = False
+                for msg in msgs:
+                    if not msg:
+                        continue
+                    if not isinstance(msg, dict) or 'id' not in msg or \
+                            'state' in msg and \
+                            not isinstance(msg['state'], dict) or \
+                            'result' in msg and \
+                            not isinstance(msg['result'], dict):
                         app.logger.warning(
-                            'Job state listener got a job assignment message '
-                            'for non-existent worker process %s', job_pid)
-                    continue
+                            'Job state listener got unexpected message "%s"',
+                            msg)
+                        continue
+
+                    job_id = msg['id']
+                    job_state = msg.get('state', {})
+                    job_result = msg.get('result', {})
+                    job_pid = msg.get('pid')
+                    job_file = msg.get('file')
+
+                    if 'subtasks' in msg:
+                        # Job split into subtasks
+                        scheduler.submit_subtasks(
+                            job_id, msg['subtasks'], msg['job'])
+                        continue
+                    if 'subtask_result' in msg:
+                        scheduler.subtask_done(
+                            job_id, job_pid, msg['subtask_result'])
+                        continue
+                    if msg.get('cancel_subtasks'):
+                        scheduler.cancel_subtasks(job_id)
+                        continue
+                    if 'shared_memory' in msg:
+                        # Shared memory segment created by a running job
+                        keep_shared_memory(job_id, msg['shared_memory'])
+                        continue
+
+                    if job_pid is not None:
+                        # Worker process status message
+                        found = False
+                        with pool_lock.acquire_read():
+                            for _p in pool:
+                                if _p.ident == job_pid:
+                                    if msg.get('ready'):
+                                        _p.ready = True
+                                        workers_ready = True
+                                    if msg.get('retire'):
+                                        _p.retiring = _p.recycled = True
+                                    found = True
+                                    break
+                        if not found:
+                            app.logger.warning(
+                                'Job state listener got a status message '
+                                'for non-existent worker process %s', job_pid)
+                        continue
 
-                sess = session_factory()
-                try:
                     if job_file is not None:
                         # Job file creation message
-                        # noinspection PyBroadException
-                        try:
-                            sess.add(DbJobFile(
-                                job_id=job_id,
-                                file_id=job_file['id'],
-                                mimetype=job_file.get('mimetype'),
-                                headers=job_file.get('headers')))
-                            sess.commit()
-                        except Exception:
-                            sess.rollback()
-                            app.logger.warning(
-                                'Could not add job file "%s" to database',
-                                exc_info=True)
+                        job_files.append((job_id, job_file))
                         continue
 
                     if not job_state and not job_result:
                         # Empty message, nothing to do
                         continue
 
-                    job = sess.query(DbJob).get(job_id)
-                    if job is None:
-                        # State update for a job that was already deleted;
-                        # silently ignore
-                        continue
+                    state, result = updates.setdefault(job_id, ({}, {}))
+                    state.update(job_state)
+                    result.update(job_result)
 
-                    # noinspection PyBroadException
-                    try:
-                        # Update job state
-                        for name, val in job_state.items():
-                            setattr(job.state, name, val)
+                if workers_ready:
+                    # Dispatch queued jobs to the new workers
+                    scheduler.dispatch()
+
+                if not job_files and not updates:
+                    continue
 
-                        # Update job result
-                        for name, val in job_result.items():
-                            setattr(job.result, name, val)
+                finished_jobs = [
+                    job_id for job_id, (job_state, _) in updates.items()
+                    if job_state.get('status') in ('completed', 'canceled')]
 
-                        sess.commit()
+                for attempt in range(STATE_UPDATE_MAX_ATTEMPTS):
+                    try:
+                        state_changes, finished = write_state_updates(
+                            job_files, updates, finished_jobs)
+                        break
+                    except OperationalError:
+                        # Job db locked by a concurrent writer; retry the whole
+                        # batch rather than losing individual updates
+                        if attempt == STATE_UPDATE_MAX_ATTEMPTS - 1 or \
+                                terminate_listener_event.is_set():
+                            app.logger.warning(
+                                'Could not write job state updates',
+                                exc_info=True)
+                            state_changes, finished = [], []
+                            break
+                        time.sleep(STATE_UPDATE_RETRY_DELAY*2**attempt)
                     except Exception:
-                        sess.rollback()
                         app.logger.warning(
-                            'Could not update job state/result "%s"',
-                            msg, exc_info=True)
-                finally:
-                    sess.close()
+                            'Could not write job state updates', exc_info=True)
+                        state_changes, finished = [], []
+                        break
+
+                for job_type, status, failed, wall_time in finished:
+                    if status == 'completed' and wall_time:
+                        scheduler.record_run_time(job_type, wall_time)
+                    metrics.job_finished(
+                        job_type,
+                        'canceled' if status == 'canceled'
+                        else 'failed' if failed else 'succeeded',
+                        wall_time)
+
+                # Wake up the clients waiting for job state changes
+                state_notifier.notify(state_changes)
+
+                # Free scheduler slots and shared memory of the finished jobs
+                for job_id in finished_jobs:
+                    scheduler.job_done(job_id)
+                    release_shared_memory(job_id)
 
         state_update_listener = threading.Thread(
             target=state_update_listener_body)
         state_update_listener.start()
 
-        # Start TCP server, listen on any available port
-        tcp_server = ThreadingTCPServer(('localhost', 0), JobRequestHandler)
-        tcp_server.db_job_types = db_job_types
-        tcp_server.db_job_result_types = db_job_result_types
-        tcp_server.session_factory = session_factory
-        tcp_server.job_queue = job_queue
-        tcp_server.result_queue = result_queue
-        tcp_server.pool = pool
-        tcp_server.pool_lock = pool_lock
-        tcp_server.min_pool_size = min_pool_size
-        tcp_server.max_pool_size = max_pool_size
-
-        # Send the actual port number to the main process
-        notify_queue.put(('success', tcp_server.server_address[1]))
+        def fail_job(job_id: int, error: str) -> None:
+            """
+            Mark the job as completed with the given error
+
+            :param job_id: job ID
+            :param error: error message
+
+            :return: None
+            """
+            sess = session_factory()
+            try:
+                job = sess.query(DbJob).get(job_id)
+                if job is not None:
+                    job.state.status = 'completed'
+                    job.state.progress = 100
+                    job.state.completed_on = datetime.utcnow()
+                    job.result.errors = list(job.result.errors or []) + [error]
+                    sess.commit()
+                    state_notifier.notify([(job_id, job.user_id)])
+                    metrics.job_finished(job.type, 'failed')
+                release_shared_memory(job_id)
+            except Exception:
+                sess.rollback()
+                app.logger.warning(
+                    'Could not update job %s state', job_id, exc_info=True)
+            finally:
+                sess.close()
+
+        # Manage the worker pool in a separate thread
+        def pool_manager_body():
+            """
+            Thread that replaces the crashed and recycled worker processes and
+            shrinks the pool by stopping the workers that stayed idle for
+            longer than JOB_POOL_IDLE_TIMEOUT
+
+            :return: None
+            """
+            idle_timeout = app.config.get('JOB_POOL_IDLE_TIMEOUT', 0)
+            while not terminate_pool_manager_event.wait(
+                    POOL_MANAGER_INTERVAL):
+                lost_workers, num_new_workers = [], 0
+                with pool_lock.acquire_write():
+                    # Reap terminated workers
+                    for _p in list(pool):
+                        if _p.is_alive():
+                            continue
+                        pool.remove(_p)
+                        _p.join()
+                        if not _p.retiring:
+                            lost_workers.append(_p)
+                            if not _p.remote:
+                                num_new_workers += 1
+                        elif _p.recycled and not _p.remote:
+                            num_new_workers += 1
+
+                    # Stop idle local workers in excess of JOB_POOL_MIN;
+                    # remote workers are managed separately and don't count
+                    # towards JOB_POOL_MIN and JOB_POOL_MAX
+                    if idle_timeout:
+                        t = time.monotonic()
+                        num_active = len([_p for _p in pool
+                                          if not _p.retiring and
+                                          not _p.remote])
+                        for _p in pool:
+                            if num_active <= min_pool_size:
+                                break
+                            if not _p.remote and _p.is_idle and \
+                                    t - _p.idle_since > idle_timeout:
+                                app.logger.info(
+                                    'Stopping idle job worker process %s',
+                                    _p.ident)
+                                _p.retire()
+                                num_active -= 1
+                    else:
+                        num_active = len([_p for _p in pool
+                                          if not _p.retiring and
+                                          not _p.remote])
+
+                    # Replace crashed and recycled workers, keep at least
+                    # JOB_POOL_MIN workers
+                    num_new_workers = max(
+                        num_new_workers, min_pool_size - num_active)
+                    if max_pool_size:
+                        num_new_workers = min(
+                            num_new_workers, max_pool_size - num_active)
+                    for _ in range(num_new_workers):
+                        pool.append(JobWorkerProcessWrapper(result_queue))
+
+                for _p in lost_workers:
+                    job_id = scheduler.worker_lost(_p)
+                    app.logger.warning(
+                        'Job worker process %s terminated unexpectedly%s',
+                        _p.ident, ' while running job {}'.format(job_id)
+                        if job_id is not None else '')
+                    if job_id is not None:
+                        fail_job(
+                            job_id, 'Job worker process terminated '
+                            'unexpectedly')
+                if lost_workers:
+                    scheduler.dispatch()
+
+        pool_manager = threading.Thread(target=pool_manager_body)
+        pool_manager.start()
+
+        def delete_jobs(jobs: TList[Tuple[int, Optional[int]]]) -> None:
+            """
+            Delete finished jobs along with their job files
+
+            :param jobs: list of pairs (job ID, user ID)
+
+            :return: None
+            """
+            sess = session_factory()
+            try:
+                # Make sure that the jobs were not resubmitted in the meantime
+                job_ids = [job_id for job_id, in sess.query(DbJob.id)
+                           .join(DbJobState, DbJobState.id == DbJob.id)
+                           .filter(DbJob.id.in_([j for j, _ in jobs]),
+                                   DbJobState.status.in_(
+                                       ('completed', 'canceled')))]
+                if job_ids:
+                    sess.query(DbJob).filter(DbJob.id.in_(job_ids)) \
+                        .delete(synchronize_session=False)
+                    sess.commit()
+            except Exception:
+                sess.rollback()
+                raise
+            finally:
+                sess.close()
+            job_ids = set(job_ids)
+            for job_id, job_user_id in jobs:
+                if job_id in job_ids:
+                    delete_job_files(job_user_id, job_id)
+                    state_notifier.forget(job_id)
+
+        # Delete expired jobs and job files in excess of the user quota in
+        # a separate thread, in small batches so that the job db is not locked
+        # for long
+        def retention_body():
+            """
+            Thread that deletes completed and canceled jobs past their
+            retention time and the oldest jobs of users exceeding their job
+            file quota
+
+            :return: None
+            """
+            interval = app.config.get('JOB_RETENTION_INTERVAL', 3600)
+            batch_size = app.config.get('JOB_RETENTION_BATCH_SIZE', 100)
+            timeout = 0
+            while not terminate_retention_event.wait(timeout):
+                timeout = interval
+                # noinspection PyBroadException
+                try:
+                    sess = session_factory()
+                    try:
+                        expired = get_expired_jobs(sess, batch_size)
+                        excess, orphans = get_excess_job_files(
+                            sess, batch_size - len(expired))
+                    finally:
+                        sess.close()
+
+                    if expired:
+                        delete_jobs(expired)
+                        app.logger.info(
+                            'Removed %d expired job(s)', len(expired))
+                    if excess:
+                        delete_jobs(excess)
+                        app.logger.info(
+                            'Removed %d job(s) exceeding job file quota',
+                            len(excess))
+                    for job_id, job_user_id in orphans:
+                        delete_job_files(job_user_id, job_id)
+
+                    if expired or excess:
+                        # Each step of incremental_vacuum frees a single page,
+                        # run it to completion
+                        conn = engine.raw_connection()
+                        try:
+                            conn.cursor().executescript(
+                                'PRAGMA incremental_vacuum')
+                        finally:
+                            conn.close()
+                    if len(expired) + len(excess) + len(orphans) >= \
+                            batch_size:
+                        # More jobs to delete
+                        timeout = RETENTION_BATCH_PAUSE
+                except Exception:
+                    app.logger.warning(
+                        'Error in job retention task', exc_info=True)
+
+        if app.config.get('JOB_RETENTION') or \
+                app.config.get('JOB_RETENTION_PER_TYPE') or \
+                app.config.get('JOB_FILE_QUOTA') or \
+                app.config.get('JOB_FILE_QUOTA_PER_USER'):
+            retention = threading.Thread(target=retention_body, daemon=True)
+            retention.start()
+
+        # Accept connections from remote job workers
+        worker_address = app.config.get('JOB_SERVER_WORKER_ADDRESS')
+        if worker_address:
+            registry = JobWorkerRegistry(pool, pool_lock, result_queue)
+
+            class JobWorkerServerManager(JobWorkerManager):
+                pass
+
+            JobWorkerServerManager.register(
+                'get_registry', callable=lambda: registry,
+                method_to_typeid=dict(
+                    get_job_queue='Queue', get_abort_event='Event',
+                    get_result_queue='Queue'))
+            worker_server = JobWorkerServerManager(
+                address=tuple(worker_address),
+                authkey=get_job_worker_key()).get_server()
+            threading.Thread(
+                target=worker_server.serve_forever, daemon=True).start()
+            app.logger.info(
+                'Accepting remote job workers at %s:%s', *worker_address)
+
+        # Collect the jobs that were pending or running when the job server
+        # stopped; they are queued once the server is set up
+        resumed_jobs = []
+        sess = session_factory()
+        try:
+            # Initialize the mean job run times used to estimate the job
+            # start times from the previous jobs
+            for job_type, run_time in sess.query(
+                    DbJob.type, func.avg(DbJobState.wall_time)) \
+                    .join(DbJobState, DbJobState.id == DbJob.id) \
+                    .filter(DbJobState.status == 'completed',
+                            DbJobState.wall_time.isnot(None)) \
+                    .group_by(DbJob.type):
+                scheduler.record_run_time(job_type, run_time)
+
+            for db_job in sess.query(DbJob) \
+                    .join(DbJobState, DbJobState.id == DbJob.id) \
+                    .filter(DbJobState.status.in_(('pending', 'in_progress'))) \
+                    .order_by(DbJob.id):
+                # Restart the interrupted jobs from the beginning; jobs using
+                # subtasks skip the files completed before the restart
+                if db_job.state.status == 'in_progress':
+                    db_job.state.status = 'pending'
+                    db_job.state.progress = 0
+                    db_job.result.errors = []
+                    db_job.result.warnings = []
+                # noinspection PyBroadException
+                try:
+                    job = Job(db_job).to_dict()
+                except Exception as e:
+                    # Job plugin no longer available
+                    db_job.state.status = 'completed'
+                    db_job.state.progress = 100
+                    db_job.state.completed_on = datetime.utcnow()
+                    db_job.result.errors = [
+                        'Cannot resume job: {}'.format(e)]
+                    continue
+                resumed_jobs.append(
+                    (job, db_job.priority or scheduler.get_priority(job)))
+            sess.commit()
+        except Exception:
+            sess.rollback()
+            raise
+        finally:
+            sess.close()
+
+        if transport == 'unix':
+            # Start Unix socket server; the socket is only accessible to the
+            # user running Afterglow
+            socket_path = app.config.get('JOB_SERVER_SOCKET')
+            if socket_path:
+                try:
+                    os.remove(socket_path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+            else:
+                socket_dir = tempfile.mkdtemp(prefix='afterglow-jobs-')
+                socket_path = os.path.join(socket_dir, 'jobs.sock')
+            old_umask = os.umask(0o177)
+            try:
+                server = ThreadingUnixStreamServer(
+                    socket_path, JobRequestHandler)
+            finally:
+                os.umask(old_umask)
+            address = socket_path
+        else:
+            # Start TCP server, listen on any available port
+            server = ThreadingTCPServer(('localhost', 0), JobRequestHandler)
+            address = server.server_address[1]
+
+        # Do not wait for idle persistent connections on shutdown
+        server.daemon_threads = True
+
+        server.db_job_types = db_job_types
+        server.db_job_result_types = db_job_result_types
+        server.session_factory = session_factory
+        server.result_queue = result_queue
+        server.pool = pool
+        server.pool_lock = pool_lock
+        server.scheduler = scheduler
+        server.admission_lock = threading.Lock()
+        server.state_notifier = state_notifier
+        server.metrics = metrics
+        server.min_pool_size = min_pool_size
+        server.max_pool_size = max_pool_size
+        server.cache_size = app.config.get('JOB_CACHE_SIZE', 0)
+
+        # Queue the resumed jobs, starting extra workers for them as for
+        # the newly submitted jobs
+        if resumed_jobs:
+            JobRequestHandler.grow_pool(server, len(resumed_jobs))
+            for job, priority in resumed_jobs:
+                scheduler.submit(job, priority)
+            app.logger.info('Resumed %d job(s)', len(resumed_jobs))
+
+        # Send the actual port number or socket path to the main process
+        notify_queue.put(('success', address))
         app.logger.info('Afterglow job server started')
 
         # Serve job resource requests until requested to terminate
-        tcp_server.serve_forever()
+        server.serve_forever()
 
     except (KeyboardInterrupt, SystemExit):
         pass
@@ -1105,10 +4201,21 @@ def job_server(notify_queue, key, iv):
         notify_queue.put(('exception', e))
         app.logger.warning('Error in job server process', exc_info=True)
     finally:
-        # Stop all worker processes
+        # Stop pool manager and all worker processes; remote workers exit
+        # when told to terminate
+        terminate_retention_event.set()
+        terminate_pool_manager_event.set()
+        if pool_manager is not None:
+            pool_manager.join()
+        if retention is not None:
+            retention.join()
+        if worker_server is not None and \
+                getattr(worker_server, 'stop_event', None) is not None:
+            worker_server.stop_event.set()
         with pool_lock.acquire_write():
-            for _ in range(len(pool)):
-                job_queue.put(None)
+            for p in pool:
+                if not p.retiring:
+                    p.retire()
             for p in pool:
                 p.join()
 
@@ -1117,10 +4224,115 @@ def job_server(notify_queue, key, iv):
         terminate_listener_event.set()
         if state_update_listener is not None:
             state_update_listener.join()
+        release_shared_memory()
+
+        # Remove Unix socket
+        if socket_path:
+            try:
+                os.remove(socket_path)
+            except OSError:
+                pass
+        if socket_dir:
+            shutil.rmtree(socket_dir, ignore_errors=True)
 
         app.logger.info('Job server terminated')
 
 
+class JobServerConnectionPool(object):
+    """
+    Persistent connections to the job server shared by all request handling
+    threads of a Flask process
+
+    Each request checks out a connection for exclusive use and returns it to
+    the pool afterwards, so that concurrent requests run over separate
+    connections without paying the connection setup cost every time.
+    Connections are not shared with forked child processes.
+    """
+    def __init__(self, max_idle: int = 8):
+        """
+        Create an empty connection pool
+
+        :param max_idle: maximum number of idle connections kept open;
+            0 = close connection after each request
+        """
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle = []
+        self.pid = os.getpid()
+
+    def acquire(self) -> Tuple[socket.socket, bool]:
+        """
+        Get an idle connection from the pool or open a new one
+
+        :return: connected socket and flag indicating whether the connection
+            has been used before
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked; never use the parent's connections
+                self.idle, self.pid = [], os.getpid()
+            if self.idle:
+                return self.idle.pop(), True
+
+        if job_server_transport == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            sock.connect(job_server_address)
+        except Exception:
+            sock.close()
+            raise
+        return sock, False
+
+    def release(self, sock: socket.socket) -> None:
+        """
+        Return a connection to the pool after successful request
+
+        :param sock: connection returned by :meth:`acquire`
+
+        :return: None
+        """
+        with self.lock:
+            if self.pid == os.getpid() and len(self.idle) < self.max_idle:
+                self.idle.append(sock)
+                return
+        sock.close()
+
+    def clear(self) -> None:
+        """
+        Close all idle connections
+
+        :return: None
+        """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for sock in idle:
+            # noinspection PyBroadException
+            try:
+                sock.close()
+            except Exception:
+                pass
+
+
+job_server_connection_pool = JobServerConnectionPool()
+
+
+def terminate_job_server() -> None:
+    """
+    Shut down the job server started by :func:`init_jobs`
+
+    :return: None
+    """
+    # noinspection PyBroadException
+    try:
+        job_server_request('', 'terminate')
+    except Exception:
+        pass
+    job_server_connection_pool.clear()
+
+
 @app.before_first_request
 def init_jobs():
     """
@@ -1128,17 +4340,28 @@ def init_jobs():
 
     :return: None
     """
-    global job_server_port, job_server_key, job_server_iv
+    global job_server_transport, job_server_address, job_server_key, \
+        job_server_iv
+
+    job_server_transport = get_job_server_transport()
+    job_server_connection_pool.clear()
+    job_server_connection_pool.max_idle = app.config.get(
+        'JOB_SERVER_POOL_SIZE', 8)
 
     # Initialize message encryption
-    if app.config.get('JOB_SERVER_ENCRYPTION', True):
+    if job_server_transport == 'tcp' and \
+            app.config.get('JOB_SERVER_ENCRYPTION', True):
         job_server_key = os.urandom(32)
         job_server_iv = Random.new().read(AES.block_size)
+    else:
+        job_server_key = job_server_iv = b''
 
     # Start job server process
     notify_queue = Queue()
     p = Process(
-        target=job_server, args=(notify_queue, job_server_key, job_server_iv))
+        target=job_server,
+        args=(notify_queue, job_server_key, job_server_iv,
+              job_server_transport))
     p.start()
 
     # Wait for initialization
@@ -1148,10 +4371,10 @@ def init_jobs():
         raise msg[1]
 
     # Terminate job server on Flask shutdown
-    atexit.register(lambda: job_server_request('', 'terminate'))
+    atexit.register(terminate_job_server)
 
     if msg[0] == 'success':
-        job_server_port = msg[1]
+        job_server_address = msg[1]
     else:
         raise JobServerError(
             reason='Invalid job server initialization message "{}"'.format(msg))
@@ -1161,8 +4384,9 @@ def job_server_request(resource: str, method: str, **args) -> TDict[str, Any]:
     """
     Make a request to job server and return response
 
-    :param resource: resource ID: "jobs", "jobs/state", "jobs/result",
-        "jobs/result/files"
+    :param resource: resource ID: "jobs", "jobs/batch", "jobs/state",
+        "jobs/state/watch", "jobs/group/state", "jobs/result",
+        "jobs/result/files", "jobs/metrics"
     :param method: request method: "get", "post", "put", or "delete"
     :param args: extra request-specific arguments
 
@@ -1177,26 +4401,35 @@ def job_server_request(resource: str, method: str, **args) -> TDict[str, Any]:
             method=method,
             user_id=getattr(auth.current_user, 'id', None),
         ))
-        msg = encrypt(json.dumps(msg).encode('utf8'))
-
-        # Send message
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect(('localhost', job_server_port))
-        try:
-            sock.sendall(struct.pack(msg_hdr, len(msg)) + msg)
-
-            # Get response
-            msg_len = bytearray()
-            while len(msg_len) < msg_hdr_size:
-                msg_len += sock.recv(msg_hdr_size - len(msg_len))
-            msg_len = struct.unpack(msg_hdr, msg_len)[0]
-
-            msg = bytearray()
-            while len(msg) < msg_len:
-                msg += sock.recv(msg_len - len(msg))
-        finally:
-            # sock.shutdown(socket.SHUT_RDWR)
-            sock.close()
+        msg = pack_msg(msg)
+
+        # Retrying a request after it has been sent is only safe if repeating
+        # it has no extra effect (i.e. not for POST, which creates new jobs).
+        # Each retry discards a stale pooled connection, so there cannot be
+        # more of them than the pool size.
+        idempotent = method.lower() != 'post'
+        retries = job_server_connection_pool.max_idle
+        while True:
+            sock, reused = job_server_connection_pool.acquire()
+            sent = False
+            try:
+                send_msg(sock, msg)
+                sent = True
+                response = recv_msg(sock)
+            except (EOFError, OSError):
+                sock.close()
+                if reused and retries > 0 and (not sent or idempotent):
+                    # Pooled connection went stale (e.g. the job server
+                    # closed it); retry with the next one
+                    retries -= 1
+                    continue
+                raise
+            except BaseException:
+                sock.close()
+                raise
+            job_server_connection_pool.release(sock)
+            msg = response
+            break
     except AfterglowError:
         raise
     except Exception as e:
@@ -1206,10 +4439,8 @@ def job_server_request(resource: str, method: str, **args) -> TDict[str, Any]:
             else ', '.join(str(arg) for arg in e.args) if e.args else str(e))
 
     try:
-        msg = json.loads(decrypt(msg))
-        if not isinstance(msg, dict):
-            raise Exception()
+        msg = unpack_msg(msg)
     except Exception:
-        raise JobServerError(reason='JSON structure expected')
+        raise JobServerError(reason='Message dict expected')
 
     return msg
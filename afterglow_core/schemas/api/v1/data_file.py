@@ -76,6 +76,8 @@ class SessionSchema(Resource):
             the session
         name: unique session name
         data: arbitrary user data associated with the session
+        version: session version incremented on each update; if passed on
+            update, the session must not have been modified since then
         data_file_ids: list of data file IDs associated with the session
     """
     __get_view__ = 'sessions'
@@ -83,6 +85,7 @@ class SessionSchema(Resource):
     id: int = Integer(default=None)
     name: str = String(default=None)
     data: str = String()
+    version: int = Integer()
     data_file_ids: TList[int] = List(Integer(), default=[], dump_only=True)
 
     def __init__(self, _obj: Optional[Session] = None, **kwargs):
@@ -3,14 +3,17 @@ Afterglow Core: common job schema defs
 """
 
 from datetime import datetime
-from typing import List as TList, Optional
+from typing import Dict as TDict, List as TList, Optional
 
-from marshmallow.fields import Integer, List, Nested, String
+from marshmallow.fields import Dict, Integer, List, Nested, String
 
-from ... import AfterglowSchema, DateTime, Float, Resource
+from ... import AfterglowSchema, Boolean, DateTime, Float, Resource
 
 
-__all__ = ['JobResultSchema', 'JobSchema', 'JobStateSchema']
+__all__ = [
+    'JobGroupStateSchema', 'JobResultSchema', 'JobSchema', 'JobStateSchema',
+    'JobStateUpdateSchema', 'JobSummarySchema',
+]
 
 
 class JobStateSchema(AfterglowSchema):
@@ -25,11 +28,81 @@ class JobStateSchema(AfterglowSchema):
         created_on: time of job creation (UTC "YYYY-MM-DD HH:MM:SS.SSSSSS")
         completed_on: time of completion or cancellation
         progress: current job progress, a number from 0 to 100
+        peak_rss: peak resident memory size of the worker processes while
+            running the job and its subtasks, in megabytes
+        cpu_time: CPU time (user + system) used by the job and its subtasks,
+            in seconds
+        wall_time: job run time, in seconds
+        bytes_read: number of bytes read by the job and its subtasks
+        bytes_written: number of bytes written by the job and its subtasks
+        load_time: time spent by the job loading data files, in seconds
+        compute_time: job run time excluding loading and saving data, in
+            seconds
+        save_time: time spent by the job saving data files and job files,
+            including result tables, in seconds
+        queue_position: estimated position of a pending job in the job queue,
+            starting from 1
+        estimated_start: estimated time when a pending job starts running,
+            based on the mean run times of the previous jobs of each type
     """
     status: str = String(default='in_progress')
     created_on: datetime = DateTime()
     completed_on: datetime = DateTime()
     progress: float = Float(default=0)
+    peak_rss: float = Float()
+    cpu_time: float = Float()
+    wall_time: float = Float()
+    bytes_read: int = Integer()
+    bytes_written: int = Integer()
+    load_time: float = Float()
+    compute_time: float = Float()
+    save_time: float = Float()
+    queue_position: int = Integer()
+    estimated_start: datetime = DateTime()
+
+
+class JobStateUpdateSchema(JobStateSchema):
+    """
+    Job state change returned by GET /jobs/state
+
+    Fields::
+        id: job ID
+    """
+    id: int = Integer()
+
+
+class JobSummarySchema(JobStateUpdateSchema):
+    """
+    Brief job description returned by GET /jobs
+
+    Fields::
+        type: job type name
+        session_id: ID of the client session the job was submitted from
+        group_id: ID shared by the jobs submitted together via POST /jobs/batch
+    """
+    type: str = String()
+    session_id: Optional[int] = Integer()
+    group_id: Optional[str] = String()
+
+
+class JobGroupStateSchema(AfterglowSchema):
+    """
+    Combined state of jobs submitted together via POST /jobs/batch
+
+    Fields::
+        group_id: job group ID
+        counts: number of jobs in the group by status
+        jobs: individual job states
+        canceled: IDs of pending jobs removed from the queue by the last
+            cancel request
+        signaled: IDs of running jobs sent the cancel signal by the last
+            cancel request
+    """
+    group_id: str = String()
+    counts: TDict[str, int] = Dict(keys=String(), values=Integer())
+    jobs: TList[JobStateUpdateSchema] = List(Nested(JobStateUpdateSchema))
+    canceled: TList[int] = List(Integer())
+    signaled: TList[int] = List(Integer())
 
 
 class JobResultSchema(AfterglowSchema):
@@ -55,6 +128,11 @@ class JobSchema(Resource):
         user_id: ID of the user who submitted the job
         session_id: ID of the client session (None = default anonymous session);
             new data files will be created with this session ID
+        group_id: optional ID shared by the jobs submitted together via
+            POST /jobs/batch
+        profile: profile the job; the profile is saved in the job files
+            "profile" (:mod:`pstats` format) and "profile_stacks" (sampled call
+            stacks in the collapsed format used by flame graph tools)
         state: current job state, an instance of JobState
         result: job result structure, an instance of JobResult or its subclass
     """
@@ -65,5 +143,7 @@ class JobSchema(Resource):
     type: str = String()
     user_id: int = Integer(default=None)
     session_id: Optional[int] = Integer(default=None)
+    group_id: Optional[str] = String(default=None)
+    profile: bool = Boolean(default=False)
     state: JobStateSchema = Nested(JobStateSchema, default={})
     result: JobResultSchema = Nested(JobResultSchema, default={})
@@ -9,6 +9,7 @@ from .catalog_query_job import *
 from .cropping_job import *
 from .field_cal_job import *
 from .photometry_job import *
+from .pipeline_job import *
 from .pixel_ops_job import *
 from .sonification_job import *
 from .source_extraction_job import *
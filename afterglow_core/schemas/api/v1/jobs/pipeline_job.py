@@ -0,0 +1,36 @@
+"""
+Afterglow Core: job pipeline schemas
+"""
+
+from typing import Any, Dict as TDict, List as TList
+
+from marshmallow.fields import Dict, List, Nested, String
+
+from .... import AfterglowSchema, Boolean
+from ..job import JobSchema, JobResultSchema
+
+
+__all__ = [
+    'PipelineStageSchema', 'PipelineJobResultSchema', 'PipelineJobSchema',
+]
+
+
+class PipelineStageSchema(AfterglowSchema):
+    name: str = String()
+    job: TDict[str, Any] = Dict(default={})
+    inputs: TDict[str, str] = Dict(default={})
+    depends_on: TList[str] = List(String(), default=[])
+    keep: bool = Boolean(default=False)
+
+
+class PipelineJobResultSchema(JobResultSchema):
+    stages: TDict[str, TDict[str, Any]] = Dict(default={})
+
+
+class PipelineJobSchema(JobSchema):
+    type = 'pipeline'
+
+    result: PipelineJobResultSchema = Nested(
+        PipelineJobResultSchema, default={})
+    stages: TList[PipelineStageSchema] = List(
+        Nested(PipelineStageSchema), default=[])
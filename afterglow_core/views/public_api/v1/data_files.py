@@ -3,7 +3,6 @@ Afterglow Core: API v1 data file views
 """
 
 import sys
-import os
 import astropy.io.fits as pyfits
 import gzip
 from io import BytesIO
@@ -215,9 +214,7 @@ def data_files_header(id: int) -> Response:
     if request.method == 'GET':
         hdr = get_data_file_data(auth.current_user.id, id)[1]
     else:
-        with pyfits.open(get_data_file_path(auth.current_user.id, id),
-                         'update') as fits:
-            hdr = fits[0].header
+        with update_data_file_header(auth.current_user.id, id) as hdr:
             modified = False
             for name, val in request.args.items():
                 if val is None:
@@ -239,9 +236,10 @@ def data_files_header(id: int) -> Response:
         if modified:
             update_data_file(auth.current_user.id, id, DataFile(), force=True)
 
+    # Skip blank cards, including those reserved for future header updates
     return json_response([
         dict(key=key, value=value, comment=hdr.comments[i])
-        for i, (key, value) in enumerate(hdr.items())])
+        for i, (key, value) in enumerate(hdr.items()) if key or value])
 
 
 @app.route(resource_prefix + '<int:id>/wcs', methods=['GET', 'PUT'])
@@ -267,9 +265,7 @@ def data_files_wcs(id: int) -> Response:
     if request.method == 'GET':
         hdr = get_data_file_data(auth.current_user.id, id)[1]
     else:
-        with pyfits.open(get_data_file_path(auth.current_user.id, id),
-                         'update') as fits:
-            hdr = fits[0].header
+        with update_data_file_header(auth.current_user.id, id) as hdr:
             modified = False
             for name, val in request.args.items():
                 if val is None:
@@ -331,15 +327,14 @@ def data_files_phot_cal(id: int) -> Response:
         phot_cal = {}
         with pyfits.open(get_data_file_path(auth.current_user.id, id),
                          'readonly') as fits:
-            hdr = fits[0].header
+            hdr = get_data_file_hdu(fits).header
             for field, name in PHOT_CAL_MAPPING:
                 try:
                     phot_cal[name] = float(hdr[field])
                 except (KeyError, ValueError):
                     pass
     else:
-        with pyfits.open(get_data_file_path(auth.current_user.id, id),
-                         'update') as fits:
+        with update_data_file_header(auth.current_user.id, id) as hdr:
             phot_cal = {}
             try:
                 phot_cal['m0'] = (float(request.args['m0']),
@@ -360,7 +355,6 @@ def data_files_phot_cal(id: int) -> Response:
                 raise errors.ValidationError(
                     'm0_err', 'Positive floating-point m0_err expected')
 
-            hdr = fits[0].header
             modified = False
             for field, name in PHOT_CAL_MAPPING:
                 try:
@@ -402,14 +396,12 @@ def data_files_hist(id: int) -> Response:
         containing the integer-valued histogram data array and the
         floating-point left and right histogram limits set from the data
     """
-    root = get_root(auth.current_user.id)
-
     # noinspection PyBroadException
     try:
         # First try using the cached histogram
         with pyfits.open(
-                os.path.join(root, '{}.fits.hist'.format(id)), 'readonly',
-                uint=True) as hist:
+                get_data_file_path(auth.current_user.id, id, 'fits.hist'),
+                'readonly', uint=True) as hist:
             hdr = hist[0].header
             min_bin, max_bin = hdr['MINBIN'], hdr['MAXBIN']
             data = hist[0].data
@@ -419,7 +411,8 @@ def data_files_hist(id: int) -> Response:
     except Exception:
         # Cached histogram not found or outdated, (re)calculate and return
         try:
-            data = get_data_file_data(auth.current_user.id, id)[0]
+            data = get_data_file_data(
+                auth.current_user.id, id, as_float=False)[0]
             if isinstance(data, numpy.ma.MaskedArray):
                 data = data.compressed()
             if data.size:
@@ -452,7 +445,7 @@ def data_files_hist(id: int) -> Response:
             hist.header['DATE'] = (datetime.utcnow().isoformat(),
                                    'UTC timestamp of the histogram')
             hist.writeto(
-                os.path.join(root, '{}.fits.hist'.format(id)),
+                get_data_file_path(auth.current_user.id, id, 'fits.hist'),
                 overwrite=True)
         except errors.AfterglowError:
             raise
@@ -615,7 +608,8 @@ def sessions() -> Response:
                     _set_defaults=True))), 201)
 
 
-@app.route(url_prefix + 'sessions/<id>', methods=['GET', 'PUT', 'DELETE'])
+@app.route(url_prefix + 'sessions/<id>',
+           methods=['GET', 'PUT', 'PATCH', 'DELETE'])
 @auth.auth_required('user')
 def session(id: Union[int, str]) -> Response:
     """
@@ -624,8 +618,18 @@ def session(id: Union[int, str]) -> Response:
     GET /sessions/[id]
         - return the given session info by ID or name
 
-    PUT /sessions/[id]?name=...&data=...
-        - rename session with the given ID or name or change session data
+    PUT /sessions/[id]?name=...&data=...[&version=...]
+        - rename session with the given ID or name or change session data;
+          if version is passed, fail with 409 if the session has been modified
+          since then
+
+    PATCH /sessions/[id]
+    Content-Type: application/merge-patch+json | application/json-patch+json
+    [If-Match: version]
+        - update session data, which must be a JSON document, by applying
+          JSON Merge Patch (RFC 7396, default) or JSON Patch (RFC 6902) passed
+          in the request body; returns the session without data, with the new
+          version also returned in the ETag header
 
     DELETE /sessions/[id]
         - delete the given session
@@ -637,6 +641,7 @@ def session(id: Union[int, str]) -> Response:
             when no id/name supplied or a single session otherwise
         POST: JSON-serialized new session object
         PUT: JSON-serialized updated session object
+        PATCH: JSON-serialized updated session object without data
         DELETE: empty response
     """
     # When getting, updating, or deleting specific session, check that it
@@ -654,6 +659,29 @@ def session(id: Union[int, str]) -> Response:
             Session(SessionSchema(**request.args.to_dict()),
                     only=list(request.args.keys())))))
 
+    if request.method == 'PATCH':
+        # Patch session data
+        version = request.headers.get('If-Match')
+        if version is not None:
+            try:
+                version = int(version.strip('W/"'))
+            except ValueError:
+                raise errors.ValidationError(
+                    'If-Match', 'Integer session version expected')
+        if request.mimetype == 'application/json-patch+json':
+            patch_type = 'json'
+        else:
+            patch_type = 'merge'
+        try:
+            patch = request.get_json(force=True)
+        except Exception:
+            raise errors.ValidationError('data', 'JSON patch expected')
+        sess = patch_session(
+            auth.current_user.id, sess.id, patch, patch_type, version)
+        return json_response(
+            SessionSchema(sess, exclude=['data']),
+            headers={'ETag': '"{}"'.format(sess.version)})
+
     if request.method == 'DELETE':
         # Delete data file
         delete_session(auth.current_user.id, id)
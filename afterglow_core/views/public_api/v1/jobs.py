@@ -2,13 +2,20 @@
 Afterglow Core: API v1 job views
 """
 
+import json
+from io import BytesIO
 from typing import Any, Dict as TDict, Union
+from urllib.parse import urlencode
 
-from flask import Response, request, send_file
+from flask import Response, request, send_file, stream_with_context
 
 from .... import app, auth, json_response
+from ....errors import ValidationError
+from ....models import save_result_table
 from ....resources.jobs import job_server_request
-from ....schemas.api.v1 import JobSchema, JobStateSchema
+from ....schemas.api.v1 import (
+    JobGroupStateSchema, JobSchema, JobStateSchema, JobStateUpdateSchema,
+    JobSummarySchema)
 from . import url_prefix
 
 
@@ -35,40 +42,124 @@ def jobs() -> Response:
     """
     Return user's jobs or submit a job
 
-    GET /jobs?session_id=... -> [Job, Job...]
-        - return a list of all user's jobs submitted from the given session
-          (anonymous session by default)
-
-    POST /jobs?type=...&session_id=...&... -> Job
+    GET /jobs?session_id=...&type=...&status=...&order=...&limit=...&after=...
+            -> [JobSummary, JobSummary...]
+        - return the IDs, types, and states of user's jobs submitted from
+          the given session (anonymous session by default), optionally
+          restricted to the given comma-separated job types and statuses;
+          jobs are ordered by ID ("asc" by default, or "desc" for newest
+          first); if `limit` is given, at most this number of jobs is returned,
+          and the URL of the next page is returned in the Link header
+          (rel="next"); the next page starts after the job ID given by `after`;
+          use GET /jobs/[id] to retrieve job parameters
+
+    POST /jobs?type=...&session_id=...&priority=...&... -> Job
         - submit a new job of the given type with the given job-specific
           parameters; if session_id is provided, the job is associated with
-          the given client session
+          the given client session; jobs processing at most one data file
+          are run ahead of other jobs; optional priority ("normal" or "batch")
+          may be used to lower the job priority; for job types without side
+          effects, an identical job submitted earlier (same parameters and
+          unmodified input data files) may be returned instead of a new job;
+          fails with 429 if the user has too many pending jobs
+          (JOB_USER_MAX_PENDING) or with 503 if the job queue is full
+          (JOB_MAX_PENDING), the Retry-After header contains the estimated
+          number of seconds until a queued job starts; the state of a pending
+          job includes its estimated queue position and start time
 
     :return:
-        GET: list of serialized job objects
+        GET: list of serialized job summaries
         POST: serialized new job object
     """
     method = request.method
     if method == 'GET':
-        # Return all user's jobs, optionally for the given session only
-        args = {}
+        # Return user's jobs, optionally for the given session only
+        args = {
+            name: request.args[name]
+            for name in ('order', 'limit', 'after')
+            if request.args.get(name)}
         if 'session_id' in request.args:
             args['session_id'] = request.args['session_id']
+        for name in ('type', 'status'):
+            if request.args.get(name):
+                args[name] = request.args[name].split(',')
         msg = job_server_request('jobs', method, **args)
         if msg['status'] != 200:
             return error_response(msg)
-        return json_response([JobSchema(**j) for j in msg['json']])
+        headers = None
+        if msg['json']['next'] is not None:
+            query = dict(request.args.items())
+            query['after'] = msg['json']['next']
+            headers = {'Link': '<{}?{}>; rel="next"'.format(
+                request.base_url, urlencode(query))}
+        return json_response(
+            [JobSummarySchema(**j) for j in msg['json']['jobs']],
+            headers=headers)
 
     if method == 'POST':
         # Submit a job
-        msg = job_server_request(
-            'jobs', method,
-            **JobSchema(_set_defaults=True, **request.args.to_dict()).to_dict())
+        args = JobSchema(
+            _set_defaults=True, **request.args.to_dict()).to_dict()
+        if request.args.get('priority'):
+            args['priority'] = request.args['priority']
+        msg = job_server_request('jobs', method, **args)
         if msg['status'] != 201:
             return error_response(msg)
         return json_response(JobSchema(**msg['json']))
 
 
+@app.route(resource_prefix + 'batch', methods=['POST'])
+@auth.auth_required('user')
+def jobs_batch() -> Response:
+    """
+    Submit multiple jobs at once
+
+    POST /jobs/batch?jobs=[...]&session_id=...&priority=...&group_id=...
+            -> {"group_id": group_id, "ids": [id, ...]}
+        - submit the given list of jobs, each having the same fields as in
+          POST /jobs, in a single transaction; either all jobs are submitted,
+          or none of them if any job is invalid (the index of the offending job
+          is returned as "job_index" in the error response); the optional
+          session ID and priority apply to all jobs that do not specify their
+          own; all new jobs share the given or automatically generated group ID
+          that can be used to query or cancel them collectively via
+          /jobs/groups/[group_id]/state; for each job, returns the ID of
+          the new job or of an identical job submitted earlier, which keeps
+          its original group; if no new jobs were created, the returned group
+          ID is null; pending job limits apply to the whole batch as in
+          POST /jobs
+
+    :return: job group ID and job IDs in the order of submission
+    """
+    jobs = request.args.get('jobs')
+    if isinstance(jobs, str):
+        try:
+            jobs = json.loads(jobs)
+        except ValueError:
+            raise ValidationError('jobs', 'Jobs must be a JSON list')
+    if not isinstance(jobs, list):
+        raise ValidationError('jobs', 'Jobs must be a list')
+
+    job_list = []
+    for i, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise ValidationError(
+                'jobs', 'Job #{} must be an object'.format(i))
+        args = JobSchema(_set_defaults=True, **job).to_dict()
+        if job.get('priority'):
+            args['priority'] = job['priority']
+        job_list.append(args)
+
+    args = {
+        name: request.args[name]
+        for name in ('session_id', 'priority', 'group_id')
+        if request.args.get(name)}
+    msg = job_server_request('jobs/batch', 'POST', jobs=job_list, **args)
+    if msg['status'] != 201:
+        return error_response(msg)
+    return json_response(msg['json'], 201)
+
+
 @app.route(resource_prefix + '<int:id>', methods=('GET', 'DELETE'))
 @auth.auth_required('user')
 def job(id: Union[int, str]) -> Response:
@@ -99,6 +190,117 @@ def job(id: Union[int, str]) -> Response:
         return json_response()
 
 
+@app.route(resource_prefix + 'state')
+@auth.auth_required('user')
+def jobs_state_watch() -> Response:
+    """
+    Wait for state changes of multiple jobs
+
+    GET /jobs/state?ids=...&session_id=...&since=...&timeout=...
+            -> {"seq": seq, "jobs": [JobStateUpdate, ...]}
+        - long polling: if `since` is omitted, return the current state of
+          the given jobs (comma-separated IDs; all user's jobs submitted from
+          the given session by default); otherwise, wait at most `timeout`
+          seconds (up to JOB_STATE_WATCH_TIMEOUT) until any of the jobs changes
+          its state and return the changed jobs only; `since` is the value of
+          `seq` returned by the previous request
+
+    GET /jobs/state?ids=...&session_id=... with Accept: text/event-stream
+        - Server-Sent Events: stream the current state of the jobs, then
+          the subsequent state changes, as "state" events; the event ID is
+          the sequence number, so that the client resumes the stream without
+          missing changes when reconnecting with Last-Event-ID; the stream
+          ends when all explicitly requested jobs are completed or canceled
+
+    :return: serialized job state changes or event stream
+    """
+    args = {}
+    if request.args.get('ids'):
+        try:
+            args['ids'] = [
+                int(job_id) for job_id in request.args['ids'].split(',')]
+        except ValueError:
+            raise ValidationError(
+                'ids', 'Job IDs must be comma-separated integers')
+    if 'session_id' in request.args:
+        args['session_id'] = request.args['session_id']
+    since = request.args.get('since', request.headers.get('Last-Event-ID'))
+
+    if 'text/event-stream' not in request.headers.get('Accept', ''):
+        # Long polling
+        if since is not None:
+            args['since'] = since
+        msg = job_server_request(
+            'jobs/state/watch', 'GET',
+            timeout=request.args.get(
+                'timeout', app.config.get('JOB_STATE_WATCH_TIMEOUT', 30)),
+            **args)
+        if msg['status'] != 200:
+            return error_response(msg)
+        return json_response(dict(
+            seq=msg['json']['seq'],
+            jobs=[JobStateUpdateSchema(**state)
+                  for state in msg['json']['jobs']]))
+
+    def events(seq):
+        # Watched jobs that are not completed yet; None = watching all user's
+        # jobs, or the initial state of the jobs has not been received yet
+        active = set(args['ids']) if 'ids' in args and seq is not None \
+            else None
+        initial = seq is None
+        while True:
+            resp = job_server_request(
+                'jobs/state/watch', 'GET', since=seq,
+                timeout=app.config.get('JOB_STATE_WATCH_TIMEOUT', 30),
+                **args)
+            if resp['status'] != 200:
+                yield 'event: error\ndata: {}\n\n'.format(
+                    json.dumps(resp.get('json')))
+                return
+            seq = resp['json']['seq']
+            states = resp['json']['jobs']
+            if initial and 'ids' in args:
+                # Ignore unknown job IDs
+                active = {state['id'] for state in states}
+            initial = False
+            if not states:
+                # Keep the connection open through proxies
+                yield ': keepalive\n\n'
+                continue
+            for state in states:
+                yield 'id: {}\nevent: state\ndata: {}\n\n'.format(
+                    seq, JobStateUpdateSchema(**state).json())
+                if active is not None and \
+                        state.get('status') in ('completed', 'canceled'):
+                    active.discard(state['id'])
+            if active is not None and not active:
+                return
+
+    return Response(
+        stream_with_context(events(since)), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route(resource_prefix + 'metrics')
+@auth.auth_required('admin')
+def jobs_metrics() -> Response:
+    """
+    Return job server metrics for monitoring
+
+    GET /jobs/metrics
+        - return queue depth per job type, queue wait and run time histograms,
+          worker pool size and utilization, job state update backlog, and
+          job outcome counters in the Prometheus text exposition format
+
+    :return: metrics text
+    """
+    msg = job_server_request('jobs/metrics', request.method)
+    if msg['status'] != 200:
+        return error_response(msg)
+    return Response(
+        msg['json'], 200, mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route(resource_prefix + '<int:id>/state', methods=['GET', 'PUT'])
 @auth.auth_required('user')
 def jobs_state(id: Union[int, str]) -> Response:
@@ -131,22 +333,82 @@ def jobs_state(id: Union[int, str]) -> Response:
     return json_response(JobStateSchema(**msg['json']))
 
 
+@app.route(resource_prefix + 'groups/<group_id>/state',
+           methods=['GET', 'PUT'])
+@auth.auth_required('user')
+def jobs_group_state(group_id: str) -> Response:
+    """
+    Return or modify the state of jobs submitted together via POST /jobs/batch
+
+    GET /jobs/groups/[group_id]/state -> JobGroupState
+        - get the number of jobs in the group by status and the current state
+          of each job
+
+    PUT /jobs/groups/[group_id]/state?status=canceled -> JobGroupState
+        - cancel all pending and running jobs in the group; jobs that have
+          already completed are left intact; the IDs of jobs removed from
+          the queue and of running jobs sent the cancel signal are returned
+          in "canceled" and "signaled", respectively
+
+    :param group_id: job group ID
+
+    :return: serialized job group state structure
+    """
+    args = {}
+    if request.method == 'PUT' and 'status' in request.args:
+        args['status'] = request.args['status']
+    msg = job_server_request(
+        'jobs/group/state', request.method, group_id=group_id, **args)
+    if msg['status'] != 200:
+        return error_response(msg)
+    return json_response(JobGroupStateSchema(**msg['json']))
+
+
 @app.route(resource_prefix + '<int:id>/result')
 @auth.auth_required('user')
 def jobs_result(id: Union[int, str]) -> Response:
     """
     Return job result
 
-    GET /jobs/[id]/result -> JobResult
+    GET /jobs/[id]/result?offset=...&limit=...&columns=...&format=...
+        -> JobResult
+
+    Long lists of records in the job result (like photometry or source
+    extraction data) may be retrieved in chunks by supplying the optional
+    index of the first record ("offset") and the maximum number of records
+    ("limit"); "columns" is an optional comma-separated list of record fields
+    to return. The total number of records is returned in the X-Total-Count
+    header. With format=npz, the selected rows and columns of the record list
+    given by the "table" argument ("data" by default) are returned as a numpy
+    .npz file with one array per column.
 
     :param id: job ID
 
-    :return: serialized job result structure
+    :return: serialized job result structure or .npz file
     """
-    msg = job_server_request('jobs/result', 'GET', id=id)
+    args = {
+        name: request.args[name] for name in ('offset', 'limit', 'columns')
+        if request.args.get(name)}
+    msg = job_server_request('jobs/result', 'GET', id=id, **args)
     if msg['status'] != 200:
         return error_response(msg)
 
+    totals = msg['json'].pop('totals', None) or {}
+    fmt = request.args.get('format', 'json').lower()
+    if fmt == 'npz':
+        table = request.args.get('table', 'data')
+        records = msg['json'].get(table)
+        if not isinstance(records, list):
+            raise ValidationError('table', 'Unknown result table', 404)
+        buf = BytesIO()
+        save_result_table(buf, records)
+        return Response(
+            buf.getvalue(), 200, mimetype='application/x-npz',
+            headers={'X-Total-Count': str(totals.get(table, len(records)))})
+    if fmt != 'json':
+        raise ValidationError('format', 'Format must be "json" or "npz"')
+    headers = {'X-Total-Count': str(max(totals.values()))} if totals else None
+
     # Find the appropriate job result type from the job schema's "result" field
     job_type = msg['json'].pop('type')
     try:
@@ -155,7 +417,7 @@ def jobs_result(id: Union[int, str]) -> Response:
     except IndexError:
         job_schema = JobSchema
     return json_response(
-        job_schema().fields['result'].nested(**msg['json']))
+        job_schema().fields['result'].nested(**msg['json']), headers=headers)
 
 
 @app.route(resource_prefix + '<int:id>/result/files/<file_id>')
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""
+Measure Afterglow Core job server request throughput for different transports
+"""
+
+from __future__ import absolute_import, division, print_function
+import argparse
+import threading
+import time
+
+from afterglow_core import app
+from afterglow_core.resources import jobs
+
+
+# (label, transport, encryption, pool size)
+CONFIGS = [
+    ('tcp+aes, connection per request', 'tcp', True, 0),
+    ('tcp+aes, pooled', 'tcp', True, 8),
+    ('unix, connection per request', 'unix', False, 0),
+    ('unix, pooled', 'unix', False, 8),
+]
+
+
+def run(transport, encryption, pool_size, num_requests, num_threads):
+    """
+    Start job server with the given options and time job list requests
+
+    :return: requests per second
+    """
+    app.config['JOB_SERVER_TRANSPORT'] = transport
+    app.config['JOB_SERVER_ENCRYPTION'] = encryption
+    app.config['JOB_SERVER_POOL_SIZE'] = max(pool_size, num_threads) \
+        if pool_size else 0
+    jobs.init_jobs()
+    try:
+        def worker(n):
+            with app.test_request_context():
+                for _ in range(n):
+                    jobs.job_server_request('jobs', 'get')
+
+        # Warm up
+        worker(10)
+
+        threads = [
+            threading.Thread(target=worker, args=(num_requests//num_threads,))
+            for _ in range(num_threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        dt = time.perf_counter() - t0
+    finally:
+        jobs.terminate_job_server()
+
+    return num_requests//num_threads*num_threads/dt
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    # noinspection PyTypeChecker
+    parser.add_argument(
+        '-n', '--requests', metavar='N', type=int, default=10000,
+        help='total number of requests per configuration')
+    # noinspection PyTypeChecker
+    parser.add_argument(
+        '-t', '--threads', metavar='N', type=int, default=4,
+        help='number of concurrent client threads')
+    parser.add_argument(
+        '--tcp-only', action='store_true',
+        help='skip Unix socket transport (e.g. on Windows)')
+    args = parser.parse_args()
+
+    for label, transport, encryption, pool_size in CONFIGS:
+        if args.tcp_only and transport != 'tcp':
+            continue
+        rate = run(
+            transport, encryption, pool_size, args.requests, args.threads)
+        print('{:<35} {:10.1f} req/s'.format(label, rate))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""
+Start a local Afterglow Core job server, scrape its metrics the way Prometheus
+does, and check that the output is valid Prometheus text exposition format
+"""
+
+from __future__ import absolute_import, division, print_function
+import argparse
+import re
+import sys
+import time
+
+from afterglow_core import app
+from afterglow_core.resources import jobs
+
+
+SAMPLE_RE = re.compile(
+    r'^([a-zA-Z_:][a-zA-Z0-9_:]*)'
+    r'(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*"'
+    r'(,[a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*")*)?\})?'
+    r' ([-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?|[-+]?Inf|NaN)$')
+
+
+def check(text):
+    """
+    Validate metrics text
+
+    :return: list of errors
+    """
+    errors, declared = [], set()
+    for line_no, line in enumerate(text.splitlines(), 1):
+        if line.startswith('# TYPE '):
+            declared.add(line.split()[2])
+        elif line.startswith('#') or not line:
+            continue
+        else:
+            m = SAMPLE_RE.match(line)
+            if m is None:
+                errors.append('Line {}: malformed sample "{}"'.format(
+                    line_no, line))
+            elif re.sub('_(bucket|sum|count)$', '', m.group(1)) not in \
+                    declared and m.group(1) not in declared:
+                errors.append('Line {}: undeclared metric "{}"'.format(
+                    line_no, m.group(1)))
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    # noinspection PyTypeChecker
+    parser.add_argument(
+        '-w', '--wait', metavar='SECONDS', type=float, default=2,
+        help='time to wait for the worker pool to start')
+    parser.add_argument(
+        '-q', '--quiet', action='store_true', help='do not print the metrics')
+    args = parser.parse_args()
+
+    app.config['AUTH_ENABLED'] = False
+    jobs.init_jobs()
+    try:
+        time.sleep(args.wait)
+        with app.test_request_context():
+            msg = jobs.job_server_request('jobs/metrics', 'get')
+    finally:
+        jobs.terminate_job_server()
+
+    if msg['status'] != 200:
+        print('Metrics request failed: {}'.format(msg.get('json')))
+        sys.exit(1)
+    if not args.quiet:
+        print(msg['json'], end='')
+    errs = check(msg['json'])
+    for err in errs:
+        print(err, file=sys.stderr)
+    sys.exit(1 if errs else 0)
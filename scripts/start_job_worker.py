@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""
+Start a standalone Afterglow Core job worker process that attaches to a running
+job server listening for remote workers (see JOB_SERVER_WORKER_ADDRESS)
+"""
+
+from __future__ import absolute_import, division, print_function
+import argparse
+import sys
+from multiprocessing import Process
+
+from afterglow_core import app
+
+
+def worker(host, port, name):
+    """
+    Run a single job worker until it is recycled or told to terminate; exit
+    code 0 = recycled, 1 = terminated
+    """
+    from afterglow_core.resources.jobs import RemoteJobWorker
+    sys.exit(0 if RemoteJobWorker((host, port), name).run() else 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    address = app.config.get('JOB_SERVER_WORKER_ADDRESS') or ('localhost', None)
+    parser.add_argument(
+        '--host', metavar='HOSTNAME', default=address[0],
+        help='job server hostname or IP address')
+    # noinspection PyTypeChecker
+    parser.add_argument(
+        '-o', '--port', metavar='PORT', type=int, default=address[1],
+        help='job server port for remote workers')
+    parser.add_argument(
+        '-n', '--name', help='worker name shown in the job server log')
+    args = parser.parse_args()
+    if args.port is None:
+        parser.error('Job server port is not set in JOB_SERVER_WORKER_ADDRESS')
+
+    # Run each worker in a child process and start a fresh one when the worker
+    # is recycled after JOB_WORKER_MAX_JOBS jobs or JOB_WORKER_MAX_RSS exceeded
+    while True:
+        p = Process(target=worker, args=(args.host, args.port, args.name))
+        p.start()
+        p.join()
+        if p.exitcode:
+            break